@@ -1,11 +1,44 @@
+import os
+import uuid
+
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 
-from src.data import load_data
-from src.filters import render_filters, apply_filters
+from src.backend import BACKEND, get_backend
+from src.cache import FIGURE_CACHE, RESULT_CACHE
+from src.cube import load_cube
+from src.data import load_data, dataset_hash, APP_COLUMNS
+from src.diskcache import get_disk_cache
+from src.compare import render_comparison
+from src.filters import render_filters
 from src.charts import plot_response_trend, plot_demo_bar
-from src.layouts import header_metrics, body_layout_tabs
+from src.layouts import header_metrics, body_layout_tabs, timing_panel
+from src.table import render_table
+from src.timing import TRACE_LOG, finish_trace, span, start_trace
+from src.views import get_view_store
+from src.prewarm import start_prewarm
+from src.refresh import apply_refresh_log
+from src.snapshot import load_snapshot, shows_default
+
+# a CSV export, or a directory or glob of extracts that are loaded concurrently and combined
+DATA_PATH = os.environ.get("DASHBOARD_DATA_PATH", "data/sample.csv")
+
+COMPARE_TAB = "Compare Periods"
+
+
+def load_backend(content_hash: str):
+    """The configured backend (src.backend); only the pandas one needs the dataset and cube in memory."""
+    df = cube = None
+    if BACKEND == "pandas":
+        with span("load_data", memoized=True) as s:
+            df = load_data(DATA_PATH, columns=APP_COLUMNS, content_hash=content_hash)
+            s.rows_out = len(df)
+        with span("load_cube", memoized=True) as s:
+            cube = load_cube(DATA_PATH, content_hash)
+            s.rows_out = len(cube)
+    # DASHBOARD_BACKEND=duckdb answers selections with SQL over the Parquet files instead
+    return get_backend(DATA_PATH, content_hash, df, cube)
 
 
 def main() -> None:
@@ -209,7 +242,26 @@ def main() -> None:
         st.caption(
             "Dataset last updated on: [February 14th, 2025](https://data.cdc.gov/Healthy-Aging/Alzheimer-s-Disease-and-Healthy-Aging-Data/hfr9-rurv/about_data)")
 
-    df = load_data("data/sample.csv")
+    # spans are only recorded when the sidebar timing panel is on or DASHBOARD_TRACE_LOG is set
+    session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+    start_trace(st.session_state.get("show_timings", False) or TRACE_LOG is not None)
+
+    # shared with the other workers through a directory next to the dataset, opened on the first rerun
+    RESULT_CACHE.disk = get_disk_cache(DATA_PATH)
+
+    # the content hash keys every cache, so `python -m src.refresh` is picked up on the next rerun
+    content_hash = dataset_hash(DATA_PATH)
+    apply_refresh_log(DATA_PATH, content_hash)
+    # a prebuilt default view (python -m src.snapshot) is served until the session changes a filter
+    # or opens the comparison, which reads other years than the default view's
+    snapshot = load_snapshot(DATA_PATH, content_hash)
+    if snapshot is not None and shows_default(snapshot) and st.session_state.get("main_tab") != COMPARE_TAB:
+        backend = None
+    else:
+        snapshot = None
+        backend = load_backend(content_hash)
+        # once per dataset version: compute the most used saved views in the background
+        start_prewarm(content_hash, backend, get_view_store())
     st.header("Key Performance Indicators")
     st.caption(
         "Metrics of the indicators will change based on selected filters.  \n"
@@ -224,12 +276,27 @@ def main() -> None:
     # Filters (sidebar by default)
     # -------------------------
     # render_filters returns a dictionary of user selections
-    selections = render_filters(df)
-
-    # apply_filters returns a filtered dataframe based on selections
-    df_f = apply_filters(df, selections)
+    with span("render_filters"):
+        selections = render_filters(backend, snapshot.options if snapshot is not None else None)
 
-    header_metrics(df_f)
+    # KPIs and charts roll up the pre-aggregated cube unless the selection needs raw rows
+    if snapshot is not None:
+        measures, source = snapshot.measures, snapshot.source
+    else:
+        with span("select_measures") as s:
+            measures, source = backend.measures(selections)
+            s.rows_out = len(measures)
+
+    with span("header_metrics", rows_in=len(measures)):
+        header_metrics(measures)
+    if source == "raw":
+        cutoff, rank_error = backend.cap_cutoff(selections)
+        st.caption(
+            ":material/info: The percentile cap can't be answered from pre-aggregated data, "
+            "so metrics and charts are computed from the filtered raw rows. "
+            f"Rows with a confidence-interval width above {cutoff:.2f} are dropped "
+            f"(99th percentile from merged slice sketches, rank error ≤ {rank_error:.2%})."
+        )
     st.divider()
 
     # -------------------------
@@ -238,39 +305,54 @@ def main() -> None:
     # Tabs layout by default (3 tabs)
     tab_choice = st.radio(
         "Please select a tab:",
-        ["Data Visualizations (4)", "Table"],
+        ["Data Visualizations (4)", "Table", COMPARE_TAB],
         horizontal=True,
+        key="main_tab",
         help="Graphs and table are both interactive"
     )
 
     if tab_choice == "Data Visualizations (4)":
-        body_layout_tabs(df_f)
+        body_layout_tabs(measures)
+    elif tab_choice == COMPARE_TAB:
+        st.subheader("Compare Periods")
+        st.write("Average reported percentage of every state, topic and demographic in two year ranges, and the change.")
+        st.write("Tip: The sidebar's age group, demographic, topic and outlier filters apply; its year range does not.")
+        with span("compare"):
+            render_comparison(backend, selections, backend.year_bounds())
     else:
         st.subheader("Table")
         st.write("Condensed table view displaying row counts along with location, time period, class, and topic.")
-        st.write("Tip: Hover over table to view options for download, searching specific values, or full screen views.")
-
-        #only important rows
-        cols_to_show = [
-            "YearStart",
-            "YearEnd",
-            "LocationDesc",
-            "Class",
-            "Topic",
-            "Data_Value",
-            "AgeGroup",
-            "DemographicCategory",
-            "Demographic"
-        ]
-
-        df_table = df_f[[col for col in cols_to_show if col in df_f.columns]].copy()
-
-        st.dataframe(df_table, use_container_width=True, height=420)
-
+        st.write("Tip: Search and sort apply to every matching row, not just the page shown.")
 
+        if snapshot is not None:
+            # the backend is only loaded if the download is clicked
+            render_table(lambda: load_backend(content_hash), selections, snapshot.table_page)
+        else:
+            with span("table"):
+                render_table(backend, selections)
 
     st.divider()
 
+    cache_stats = RESULT_CACHE.stats()
+    st.sidebar.caption(
+        f"Result cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses, "
+        f"{cache_stats['bytes'] / 2**20:.1f} of {cache_stats['max_bytes'] / 2**20:.0f} MB"
+    )
+    figure_stats = FIGURE_CACHE.stats()
+    st.sidebar.caption(
+        f"Figure cache: {figure_stats['hit_rate']:.0%} hit rate, "
+        f"{figure_stats['bytes'] / 2**20:.1f} of {figure_stats['max_bytes'] / 2**20:.0f} MB"
+    )
+    disk = RESULT_CACHE.disk
+    if disk is not None and disk.available:
+        disk_stats = disk.stats()
+        st.sidebar.caption(
+            f"Disk cache (all workers): {disk_stats['entries']} entries, "
+            f"{disk_stats['bytes'] / 2**20:.1f} of {disk_stats['max_bytes'] / 2**20:.0f} MB"
+        )
+
+    timing_panel(finish_trace(session_id))
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
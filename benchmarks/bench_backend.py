@@ -0,0 +1,129 @@
+"""pandas and DuckDB backends on the same selections: timings, and whether their results are identical.
+
+    python -m benchmarks.bench_backend data/sample.csv
+    python -m benchmarks.bench_backend benchmarks/data/synthetic-1000000-s0.csv --repeat 5
+
+Every selection in benchmarks.suite.SELECTIONS is run through both backends.
+Filtered rows, measure records summed per cube cell, KPIs, the chart aggregates
+and the sidebar's options must hold the same values in the same dtypes; the exit status is 1 if
+any of them differ. Category dictionaries are not compared (DuckDB builds them
+from the result), and floats may differ by FLOAT_RTOL, the last bits a
+different summation order changes. Needs the duckdb package.
+"""
+import argparse
+import dataclasses
+import json
+import math
+import sys
+import time
+
+import pandas as pd
+
+from benchmarks.suite import SELECTIONS
+from src.backend import DuckDBBackend, PandasBackend
+from src.cache import RESULT_CACHE
+from src.cube import CUBE_DIMENSIONS, MEASURE_COLUMNS, read_cube
+from src.data import APP_COLUMNS, compact_frame, dataset_hash, read_dataset
+from src.figures import VALID_STATES, demographic_counts, state_counts, state_percentage, yearly_trend
+from src.kpis import compute_kpis
+
+FLOAT_RTOL = 1e-12
+
+
+def _cells(measures: pd.DataFrame) -> pd.DataFrame:
+    # a capped selection's records are one per row from pandas and one per cube cell from DuckDB
+    cells = measures.groupby(CUBE_DIMENSIONS, observed=True, dropna=False)[MEASURE_COLUMNS].sum()
+    return cells.reset_index()
+
+
+def outputs(backend, selections: dict) -> dict:
+    """Everything the app reads from a backend for one selection, aggregated as the app does."""
+    rows = backend.filter_rows(selections)
+    measures, source = backend.measures(selections)
+    return {
+        "rows": rows,
+        "measures": _cells(measures),
+        "source": source,
+        "kpis": compute_kpis(measures),
+        "yearly_trend": yearly_trend(measures),
+        "race_counts": demographic_counts(measures, "Race/Ethnicity"),
+        "sex_counts": demographic_counts(measures, "Sex"),
+        "state_counts": state_counts(measures),
+        "state_percentage": state_percentage(measures, VALID_STATES),
+        "year_bounds": backend.year_bounds(),
+        "filter_options": backend.filter_options(selections),
+    }
+
+
+def _same(x, y) -> bool:
+    if isinstance(x, pd.DataFrame):
+        # labels instead of codes: the dictionaries differ, the values must not
+        def _values(frame: pd.DataFrame) -> pd.DataFrame:
+            frame = frame.reset_index(drop=True)
+            categorical = [col for col in frame.columns if isinstance(frame[col].dtype, pd.CategoricalDtype)]
+            return frame.astype({col: object for col in categorical})
+
+        categorical = [col for col in x.columns if isinstance(x[col].dtype, pd.CategoricalDtype)]
+        if categorical != [col for col in y.columns if isinstance(y[col].dtype, pd.CategoricalDtype)]:
+            return False
+        try:
+            pd.testing.assert_frame_equal(_values(x), _values(y), check_exact=False, rtol=FLOAT_RTOL, atol=0)
+        except AssertionError:
+            return False
+        return True
+    if dataclasses.is_dataclass(x):
+        return type(x) is type(y) and _same(dataclasses.astuple(x), dataclasses.astuple(y))
+    if isinstance(x, (tuple, list)):
+        return type(x) is type(y) and len(x) == len(y) and all(_same(a, b) for a, b in zip(x, y))
+    if isinstance(x, float) and isinstance(y, float):
+        return (math.isnan(x) and math.isnan(y)) or math.isclose(x, y, rel_tol=FLOAT_RTOL)
+    return x == y
+
+
+def differences(a: dict, b: dict) -> list[str]:
+    """Names of the outputs that differ between two backends' outputs()."""
+    return [name for name in a if not _same(a[name], b[name])]
+
+
+def _timed(fn, repeat: int) -> tuple[float, object]:
+    best = float("inf")
+    for _ in range(repeat):
+        # time the backend itself, not a hit on the shared result cache
+        RESULT_CACHE.clear()
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    content_hash = dataset_hash(args.path)
+    # the frame load_data gives the app
+    df = compact_frame(read_dataset(args.path, APP_COLUMNS))
+    df.attrs["content_hash"] = content_hash
+    backends = [PandasBackend(df, read_cube(args.path)), DuckDBBackend(args.path, content_hash)]
+
+    mismatched = False
+    for name, selections in SELECTIONS.items():
+        line = {"selection": name}
+        results = []
+        for backend in backends:
+            seconds, result = _timed(lambda: outputs(backend, selections), args.repeat)
+            line[f"{backend.name}_ms"] = round(seconds * 1000, 2)
+            results.append(result)
+        line["rows"] = len(results[0]["rows"])
+        line["differences"] = differences(*results)
+        mismatched |= bool(line["differences"])
+        print(json.dumps(line))
+
+    if mismatched:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Fused KPI engine against the per-metric passes header_metrics used to make.
+
+    python -m benchmarks.bench_kpis data/sample.csv [--rows 100000 1000000 10000000]
+
+The dataset is tiled up to each row count. Both paths see the raw filtered rows,
+the worst case for the engine (cube slices are far smaller). That both give the
+same KPIs is checked in tests/test_kpis.py.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.cube import to_measures
+from src.data import APP_COLUMNS, read_dataset
+from src.kpis import COGNITIVE_CLASSES, SMOKING_CLASSES, KPIResult, compute_kpis
+
+
+def _per_metric_kpis(df: pd.DataFrame) -> KPIResult:
+    # the pre-engine implementation: one pass over the rows per metric
+    kpis = {"total": len(df)}
+
+    dv = pd.to_numeric(df["Data_Value"], errors="coerce")
+    dff = df.assign(Data_Value=dv).dropna(subset=["YearEnd", "Data_Value"])
+    if not dff.empty:
+        yearly_avg = dff.groupby("YearEnd", observed=True)["Data_Value"].mean().reset_index(name="YearAvg")
+        best = yearly_avg.loc[yearly_avg["YearAvg"].idxmax()]
+        kpis.update(
+            best_year=int(best["YearEnd"]),
+            best_year_mean=float(best["YearAvg"]),
+            year_delta=float(best["YearAvg"]) - dff["Data_Value"].mean(),
+        )
+
+    q_avg = df.groupby("Topic", observed=True)["Data_Value"].mean()
+    if not q_avg.empty:
+        kpis.update(top_topic=q_avg.idxmax(), top_topic_mean=q_avg.max())
+
+    demo_avg = df.groupby("Demographic", observed=True)["Data_Value"].mean()
+    if not demo_avg.empty:
+        kpis.update(top_demographic=demo_avg.idxmax(), top_demographic_mean=demo_avg.max())
+
+    smokealc = df[df["Class"].isin(SMOKING_CLASSES)]["Data_Value"].dropna().reset_index(drop=True)
+    cog = df[df["Class"].isin(COGNITIVE_CLASSES)]["Data_Value"].dropna().reset_index(drop=True)
+    sample = min(len(smokealc), len(cog))
+    if sample:
+        kpis.update(corr=smokealc[:sample].corr(cog[:sample]), corr_sample=sample)
+
+    return KPIResult(**kpis)
+
+
+def _best_of(fn, repeat: int) -> tuple[float, object]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = read_dataset(args.path, APP_COLUMNS)
+    for n in args.rows:
+        rows = df.take(np.resize(np.arange(len(df)), n)).reset_index(drop=True)
+        measures_s, measures = _best_of(lambda: to_measures(rows), 1)
+        old_s, _ = _best_of(lambda: _per_metric_kpis(rows), args.repeat)
+        new_s, _ = _best_of(lambda: compute_kpis(measures), args.repeat)
+        print(json.dumps({
+            "rows": n,
+            "per_metric_ms": round(old_s * 1000, 2),
+            "fused_ms": round(new_s * 1000, 2),
+            "speedup": round(old_s / new_s, 1),
+            "to_measures_ms": round(measures_s * 1000, 2),
+        }))
+        del rows, measures
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Compare the old CSV load against the Parquet-backed and streaming load paths.
+
+    python -m benchmarks.bench_load data/sample.csv [--chunk-rows 50000]
+
+Each mode runs in a fresh interpreter so peak resident memory is not shared.
+"compact" is the columnar load plus compact_frame, what load_data holds; its
+per-column memory before and after compaction is printed last.
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+from src.data import (
+    APP_COLUMNS,
+    CHUNK_ROWS,
+    TARGET_CLASSES,
+    columnar_path,
+    compact_frame,
+    ingest_csv,
+    memory_report,
+    read_csv_streaming,
+    read_dataset,
+    read_snapshot,
+    snapshot_parts,
+)
+
+MODES = ("ingest", "csv", "streaming", "columnar", "compact")
+
+
+def _load_csv(path: str) -> pd.DataFrame:
+    # the pre-Parquet implementation of load_data
+    df = pd.read_csv(path)
+    df = df[df["AgeGroup"] != "Overall"]
+    return df[df["Class"].isin(TARGET_CLASSES)]
+
+
+def _run_mode(mode: str, path: str, chunk_rows: int) -> dict:
+    start = time.perf_counter()
+    if mode == "csv":
+        df = _load_csv(path)
+    elif mode == "ingest":
+        df = read_snapshot(ingest_csv(path, chunksize=chunk_rows), columns=["Class"])
+    elif mode == "streaming":
+        df = read_csv_streaming(path, APP_COLUMNS, chunksize=chunk_rows)
+    elif mode == "columnar":
+        df = read_dataset(path, columns=APP_COLUMNS)
+    else:
+        df = compact_frame(read_dataset(path, columns=APP_COLUMNS))
+    elapsed = time.perf_counter() - start
+    return {
+        "mode": mode,
+        "rows": len(df),
+        "seconds": round(elapsed, 4),
+        "frame_mb": round(df.memory_usage(deep=True).sum() / 2**20, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--mode", choices=MODES)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(_run_mode(args.mode, args.path, args.chunk_rows)))
+        return
+
+    # the parent stays small: Linux carries peak RSS over into forked children
+    for mode in MODES:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_load", args.path, "--mode", mode, "--chunk-rows", str(args.chunk_rows)],
+            check=True, capture_output=True, text=True,
+        )
+        print(out.stdout.strip().splitlines()[-1])
+    parquet_bytes = sum(part.stat().st_size for part in snapshot_parts(columnar_path(args.path)))
+    print(json.dumps({"parquet_mb": round(parquet_bytes / 2**20, 1)}))
+
+    df = read_dataset(args.path, columns=APP_COLUMNS)
+    report = memory_report(df, compact_frame(df))
+    for column, row in report.iterrows():
+        print(json.dumps({"column": column, **row.to_dict()}))
+
+
+if __name__ == "__main__":
+    main()
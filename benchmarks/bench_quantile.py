@@ -0,0 +1,113 @@
+"""Latency and accuracy of the sketched percentile-cap cutoff against the exact quantile.
+
+    python -m benchmarks.bench_quantile data/sample.csv [--selections 200] [--repeat 1]
+
+--repeat stacks the dataset on itself to see how both paths scale with row count.
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.data import APP_COLUMNS, read_dataset
+from src.filters import CAP_QUANTILE, build_filter_index, cap_cutoff, selected_positions
+
+
+def _random_selections(df: pd.DataFrame, count: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    ages = ["All Age Groups"] + sorted(df["AgeGroup"].dropna().unique())
+    demographics = ["All"] + sorted(df["Demographic"].dropna().astype(str).unique())
+    topics = sorted(df["Topic"].dropna().astype(str).unique())
+    lo, hi = int(df["YearStart"].min()), int(df["YearEnd"].max())
+    # the default view: the whole dataset, where the exact quantile sorts every row
+    selections = [{"AgeGroup": "All Age Groups", "Demographic": "All", "Topic": [], "rt_range": (lo, hi), "cap_outliers": False}]
+    for _ in range(count - 1):
+        start = rng.randint(lo, hi)
+        selections.append({
+            "AgeGroup": rng.choice(ages),
+            "Demographic": rng.choice(demographics),
+            "Topic": rng.sample(topics, rng.randint(0, min(3, len(topics)))),
+            "rt_range": (start, rng.randint(start, hi)),
+            "cap_outliers": False,
+        })
+    return selections
+
+
+def _rank_error(widths: np.ndarray, cutoff: float, q: float) -> float:
+    """How far, as a fraction of the rows, cutoff sits from the q-quantile's rank in sorted widths.
+
+    The exact quantile interpolates between the widths at the ranks around
+    h = (n - 1) q, so a cutoff inside that bracket is off by no rank. Otherwise the
+    error is the distance from h to the nearest (fractional) rank at which the
+    same linear interpolation gives cutoff.
+    """
+    n = len(widths)
+    h = (n - 1) * q
+    below, above = widths[int(np.floor(h))], widths[int(np.ceil(h))]
+    if below <= cutoff <= above:
+        return 0.0
+    left, right = np.searchsorted(widths, cutoff, "left"), np.searchsorted(widths, cutoff, "right")
+    if left < right:
+        # ties: every rank holding the value
+        ranks = (left, right - 1)
+    elif left == 0 or left == n:
+        ranks = (min(left, n - 1),) * 2
+    else:
+        rank = left - 1 + (cutoff - widths[left - 1]) / (widths[left] - widths[left - 1])
+        ranks = (rank, rank)
+    return min(abs(ranks[0] - h), abs(ranks[1] - h)) / n
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--selections", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    df = read_dataset(args.path, APP_COLUMNS)
+    df = pd.concat([df] * args.repeat, ignore_index=True)
+    index = build_filter_index(df)
+
+    exact_s = sketch_s = 0.0
+    default_ms = {}
+    rank_errors, bounds, value_errors = [], [], []
+    for i, selections in enumerate(_random_selections(df, args.selections)):
+        rows = df.take(selected_positions(index, selections))
+
+        start = time.perf_counter()
+        # the computation apply_filters used before sketches
+        exact = (rows["High_Confidence_Limit"] - rows["Low_Confidence_Limit"]).abs().quantile(CAP_QUANTILE)
+        exact_s += time.perf_counter() - start
+
+        start = time.perf_counter()
+        cutoff, bound = cap_cutoff(index, selections)
+        sketch_s += time.perf_counter() - start
+        if i == 0:
+            default_ms = {"default_view_exact_ms": round(exact_s * 1000, 3), "default_view_sketch_ms": round(sketch_s * 1000, 3)}
+
+        widths = np.sort((rows["High_Confidence_Limit"] - rows["Low_Confidence_Limit"]).abs().dropna().to_numpy())
+        if len(widths) == 0:
+            continue
+        rank_errors.append(_rank_error(widths, cutoff, CAP_QUANTILE))
+        bounds.append(bound)
+        value_errors.append(abs(cutoff - exact))
+
+    print(json.dumps({
+        "rows": len(df),
+        "sketch_points": len(index.ci_sketch),
+        "selections": args.selections,
+        "exact_ms": round(exact_s / args.selections * 1000, 3),
+        "sketch_ms": round(sketch_s / args.selections * 1000, 3),
+        **default_ms,
+        "max_rank_error": round(max(rank_errors, default=0.0), 5),
+        "max_rank_error_bound": round(max(bounds, default=0.0), 5),
+        "max_abs_value_error": round(max(value_errors, default=0.0), 4),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Refresh time against the size of the delta, on a dataset of fixed size.
+
+    python -m benchmarks.bench_refresh [--rows 1000000] [--deltas 10 100 1000 10000 100000]
+
+Each delta replaces that many lines of a synthetic export with rows of another
+seed, either as one block of lines (a revised year or state) or scattered over
+the file, and the refresh is compared with ingesting the new export from
+scratch. "diff_seconds" is digesting the new export's lines, matching them to
+the copy's and reading out the new ones, linear in the dataset; "apply_seconds"
+(parsing the delta, rewriting the parts it touches, patching the cube and
+swapping the CSV) is what should follow the delta. Scattered lines touch every
+part sooner, so apply_seconds reaches that of a rewrite at a smaller delta.
+"""
+import argparse
+import json
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.generate import write_csv
+from src.cube import read_cube
+from src.data import columnar_path, ingest_csv, read_manifest
+from src.refresh import refresh_dataset
+
+LAYOUTS = ("block", "scattered")
+
+
+def _export_with_delta(base: Path, replacements: Path, delta: int, layout: str, out: Path, seed: int) -> Path:
+    lines = base.read_bytes().splitlines(keepends=True)
+    new_lines = replacements.read_bytes().splitlines(keepends=True)[1:]
+    rng = random.Random(seed)
+    if layout == "block":
+        first = rng.randint(1, len(lines) - delta)
+        positions = range(first, first + delta)
+    else:
+        positions = rng.sample(range(1, len(lines)), delta)
+    for position, line in zip(positions, new_lines):
+        lines[position] = line
+    out.write_bytes(b"".join(lines))
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--deltas", type=int, nargs="+", default=[10, 100, 1_000, 10_000, 100_000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        base = write_csv(args.rows, tmp / "base.csv", args.seed)
+        replacements = write_csv(max(args.deltas), tmp / "replacements.csv", args.seed + 1)
+        for layout, delta in ((layout, delta) for layout in LAYOUTS for delta in args.deltas):
+            work = tmp / f"{layout}-{delta}"
+            work.mkdir()
+            path = Path(shutil.copyfile(base, work / "data.csv"))
+            read_cube(path)
+            before = {part["file"] for part in read_manifest(columnar_path(path))["parts"]}
+            export = _export_with_delta(base, replacements, delta, layout, work / "export.csv", args.seed + delta)
+
+            result = refresh_dataset(path, export)
+            parts = read_manifest(columnar_path(path))["parts"]
+            start = time.perf_counter()
+            ingest_csv(export, work / "full.parquet")
+            ingest_seconds = time.perf_counter() - start
+
+            print(json.dumps({
+                "rows": args.rows,
+                "delta": delta,
+                "layout": layout,
+                "changed": result.changed,
+                "added": result.added,
+                "removed": result.removed,
+                "full_rebuild": result.full_rebuild,
+                "parts_rewritten": sum(part["file"] not in before for part in parts),
+                "parts": len(parts),
+                "seconds": round(result.seconds, 4),
+                "diff_seconds": round(result.diff_seconds, 4),
+                "apply_seconds": round(result.seconds - result.diff_seconds, 4),
+                "ingest_seconds": round(ingest_seconds, 4),
+            }))
+            shutil.rmtree(work)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Concurrent load on app.py: rerun latency and throughput as more sessions run at once.
+
+    python -m benchmarks.bench_replay data/sample.csv
+    python -m benchmarks.bench_replay benchmarks/data/synthetic-1000000-s0.csv --sessions 1 4 16 32 --reruns 20 --budget-ms 500
+
+Every session is its own interpreter running one Streamlit AppTest: AppTest
+installs a process-wide runtime for a run, so sessions in one process could
+only take turns. A level starts its sessions together, lets each load the app,
+then releases them at once to replay --reruns random sidebar interactions
+each: moving the year slider, toggling a topic, switching saved views and
+switching between the charts and the table. The reruns compete for CPU, the
+Parquet copy and the disk cache the way the worker processes of a deployment
+do; the in-memory caches are per session, as they are per worker. The saved
+views are SELECTIONS from benchmarks.suite, kept in a temporary view store, and
+each level starts with an empty disk cache that its sessions share.
+
+One JSON line per level: rerun latency percentiles over every session's
+reruns, throughput (reruns per second from the release to the last session
+finishing) and resident memory per session. A last line names the lowest level
+whose p95 is over --budget-ms, or null when every level is within it.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+APP = Path(__file__).parent.parent / "app.py"
+
+# relative frequency of each interaction in a session's replay
+ACTIONS = {"years": 4, "topic": 3, "view": 2, "tab": 1}
+
+# what a session prints once the app is loaded, and waits on stdin for a line after
+READY = "ready"
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def _option_value(label: str) -> str:
+    # the sidebar labels options "value (count)"
+    return label.rsplit(" (", 1)[0]
+
+
+def _interact(at, action: str, rng: random.Random) -> None:
+    """Set one sidebar or tab widget the way a user would; the next run applies it."""
+    if action == "years":
+        slider = at.slider(key="rt_range")
+        lo, hi = sorted(rng.sample(range(int(slider.min), int(slider.max) + 1), 2))
+        slider.set_value((lo, hi))
+    elif action == "topic":
+        topic = at.multiselect(key="Topic")
+        value = _option_value(rng.choice(topic.options))
+        chosen = list(topic.value)
+        topic.set_value([t for t in chosen if t != value] if value in chosen else chosen + [value])
+    elif action == "view":
+        view = at.selectbox(key="active_view")
+        view.set_value(rng.choice(view.options))
+    else:
+        tab = at.radio(key="main_tab")
+        tab.set_value(next(option for option in tab.options if option != tab.value))
+
+
+def run_session(seed: int, reruns: int, timeout: float) -> dict:
+    """One session: load the app, wait for the release, replay; what it measured."""
+    # imported here: the session's interpreter has the level's environment, the parent reads none of it
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    actions, weights = zip(*ACTIONS.items())
+    result = {"latency_ms": [], "errors": []}
+    at = AppTest.from_file(str(APP), default_timeout=timeout)
+    start = time.perf_counter()
+    at.run()
+    result["first_ms"] = (time.perf_counter() - start) * 1000
+
+    print(READY, flush=True)
+    sys.stdin.readline()
+    # CLOCK_MONOTONIC is one clock for every process, so the parent can compare sessions' spans
+    result["start"] = time.monotonic()
+    for action in rng.choices(actions, weights, k=reruns):
+        if at.exception:
+            break
+        try:
+            _interact(at, action, rng)
+            start = time.perf_counter()
+            at.run()
+        except Exception as e:
+            result["errors"].append(repr(e))
+            break
+        result["latency_ms"].append((time.perf_counter() - start) * 1000)
+    result["end"] = time.monotonic()
+    if at.exception:
+        result["errors"].append(str(at.exception[0].message))
+    result["rss_mb"] = _rss_mb()
+    return result
+
+
+def prepare(path: str) -> None:
+    """Build the Parquet copy and cube and save the views, as a server that is already up has them."""
+    from benchmarks.suite import SELECTIONS
+    from src.cube import read_cube
+    from src.views import ViewStore
+
+    read_cube(path)
+    store = ViewStore()
+    for name, selections in SELECTIONS.items():
+        if name != "default":
+            store.save(name, {"cap_outliers": False, **selections})
+
+
+def run_level(path: str, sessions: int, reruns: int, seed: int, timeout: float, env: dict) -> dict:
+    command = [sys.executable, "-m", "benchmarks.bench_replay", path, "--worker", "--reruns", str(reruns), "--timeout", str(timeout)]
+    procs = [
+        subprocess.Popen([*command, "--seed", str(seed * 10_000 + i)], env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        for i in range(sessions)
+    ]
+    # every session loads the app before any is released, so the level times reruns, not start-up
+    ready = [proc.stdout.readline().strip() == READY for proc in procs]
+    for proc in procs:
+        if proc.poll() is None:
+            proc.stdin.write("go\n")
+            proc.stdin.flush()
+    results, failed = [], sessions - sum(ready)
+    for proc, is_ready in zip(procs, ready):
+        out, _ = proc.communicate()
+        lines = [line for line in out.splitlines() if line.startswith("{")]
+        if is_ready and proc.returncode == 0 and lines:
+            results.append(json.loads(lines[-1]))
+        elif is_ready:
+            failed += 1
+
+    latency_ms = np.concatenate([r["latency_ms"] for r in results]) if results else np.array([])
+    p50, p95, p99 = np.percentile(latency_ms, [50, 95, 99]) if len(latency_ms) else (np.nan,) * 3
+    wall = max(r["end"] for r in results) - min(r["start"] for r in results) if results else np.nan
+    errors = [error for r in results for error in r["errors"]]
+    for error in errors[:3]:
+        print(error, file=sys.stderr)
+    return {
+        "sessions": sessions,
+        "reruns": len(latency_ms),
+        "errors": len(errors) + failed,
+        "p50_ms": round(float(p50), 1),
+        "p95_ms": round(float(p95), 1),
+        "p99_ms": round(float(p99), 1),
+        "first_load_p50_ms": round(float(np.median([r["first_ms"] for r in results])), 1) if results else None,
+        "reruns_per_s": round(len(latency_ms) / wall, 2) if results and wall > 0 else None,
+        "rss_per_session_mb": round(float(np.median([r["rss_mb"] for r in results])), 1) if results else None,
+    }
+
+
+def over_budget_at(levels: list[dict], budget_ms: float) -> int | None:
+    """The fewest concurrent sessions whose rerun p95 is over budget_ms, or None if no level is."""
+    return next((level["sessions"] for level in levels if not level["p95_ms"] <= budget_ms), None)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="dataset the app loads, as DASHBOARD_DATA_PATH")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="concurrent sessions at each level")
+    parser.add_argument("--reruns", type=int, default=10, help="interactions per session")
+    parser.add_argument("--budget-ms", type=float, default=1000, help="rerun p95 a level must stay within")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds one rerun may take")
+    parser.add_argument("--out", type=Path, help="write all levels and the budget verdict here as JSON")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--setup", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.setup:
+        prepare(args.path)
+        return
+    if args.worker:
+        print(json.dumps(run_session(args.seed, args.reruns, args.timeout)), flush=True)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # the app reads these when its modules are first imported, so only sessions' interpreters see them
+        env = {
+            **os.environ,
+            "DASHBOARD_DATA_PATH": str(args.path),
+            "DASHBOARD_VIEW_DB": str(Path(tmp) / "views.sqlite"),
+        }
+        # before any level, so no session builds the copy or the cube while others wait on it
+        subprocess.run([sys.executable, "-m", "benchmarks.bench_replay", str(args.path), "--setup"], check=True, env=env)
+
+        levels = []
+        for sessions in args.sessions:
+            # an absolute directory is used as is; each level's sessions share a cold one
+            level_env = {**env, "DASHBOARD_DISK_CACHE": str(Path(tmp) / f"cache-{sessions}")}
+            levels.append(run_level(str(args.path), sessions, args.reruns, args.seed, args.timeout, level_env))
+            print(json.dumps(levels[-1]), flush=True)
+
+    verdict = {"budget_ms": args.budget_ms, "p95_over_budget_at": over_budget_at(levels, args.budget_ms), "cpus": os.cpu_count()}
+    print(json.dumps(verdict))
+    if args.out:
+        args.out.write_text(json.dumps({"levels": levels, **verdict}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Deterministic synthetic data in the shape of the CDC Alzheimer's Disease and Healthy Aging export.
+
+    python -m benchmarks.generate 1000000 benchmarks/data/synthetic-1000000.csv [--seed 0]
+
+Columns, categories and missing-value patterns follow data/sample.csv, so the
+file goes through load_data like the real export. The same rows and seed
+always give the same file.
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Rows are generated in blocks of this size, each from its own seeded generator
+BLOCK_ROWS = 100_000
+
+TOPICS = {
+    "Cognitive Decline": [
+        "Subjective cognitive decline or memory loss among older adults",
+        "Functional difficulties associated with subjective cognitive decline or memory loss among older adults",
+        "Talked with health care professional about subjective cognitive decline or memory loss",
+        "Need assistance with day-to-day activities because of cognitive decline or memory loss",
+    ],
+    "Mental Health": [
+        "Frequent mental distress",
+        "Lifetime diagnosis of depression",
+    ],
+    "Smoking and Alcohol Use": [
+        "Current smoking",
+        "Binge drinking within past 30 days",
+    ],
+    "Overall Health": [
+        "Physically unhealthy days (mean number of days)",
+        "Self-rated health (fair to poor health)",
+        "Disability status, including sensory or mobility limitations",
+    ],
+    "Nutrition/Physical Activity/Obesity": [
+        "Obesity",
+        "No leisure-time physical activity within past month",
+    ],
+    "Screenings and Vaccines": [
+        "Influenza vaccine within past year",
+        "Mammogram within past 2 years",
+    ],
+    "Caregiving": [
+        "Provide care for a friend or family member in past month",
+        "Expect to provide care for someone in the next two years",
+    ],
+}
+
+AGE_GROUPS = ["50-64 years", "65 years or older", "Overall"]
+
+# (DemographicCategory, Demographic, StratificationID2); the last row is the unstratified total
+DEMOGRAPHICS = [
+    ("Race/Ethnicity", "White, non-Hispanic", "WHT"),
+    ("Race/Ethnicity", "Black, non-Hispanic", "BLK"),
+    ("Race/Ethnicity", "Hispanic", "HIS"),
+    ("Race/Ethnicity", "Asian/Pacific Islander", "ASN"),
+    ("Race/Ethnicity", "Native Am/Alaskan Native", "NAA"),
+    ("Sex", "Male", "MALE"),
+    ("Sex", "Female", "FEMALE"),
+    (None, None, None),
+]
+
+LOCATIONS = {
+    "AL": "Alabama", "AK": "Alaska", "AZ": "Arizona", "AR": "Arkansas", "CA": "California",
+    "CO": "Colorado", "CT": "Connecticut", "DE": "Delaware", "DC": "District of Columbia",
+    "FL": "Florida", "GA": "Georgia", "HI": "Hawaii", "ID": "Idaho", "IL": "Illinois",
+    "IN": "Indiana", "IA": "Iowa", "KS": "Kansas", "KY": "Kentucky", "LA": "Louisiana",
+    "ME": "Maine", "MD": "Maryland", "MA": "Massachusetts", "MI": "Michigan", "MN": "Minnesota",
+    "MS": "Mississippi", "MO": "Missouri", "MT": "Montana", "NE": "Nebraska", "NV": "Nevada",
+    "NH": "New Hampshire", "NJ": "New Jersey", "NM": "New Mexico", "NY": "New York",
+    "NC": "North Carolina", "ND": "North Dakota", "OH": "Ohio", "OK": "Oklahoma", "OR": "Oregon",
+    "PA": "Pennsylvania", "RI": "Rhode Island", "SC": "South Carolina", "SD": "South Dakota",
+    "TN": "Tennessee", "TX": "Texas", "UT": "Utah", "VT": "Vermont", "VA": "Virginia",
+    "WA": "Washington", "WV": "West Virginia", "WI": "Wisconsin", "WY": "Wyoming",
+    "PR": "Puerto Rico", "GU": "Guam", "VI": "Virgin Islands", "US": "United States, DC & Territories",
+    "MDW": "Midwest", "NRE": "Northeast", "SOU": "South", "WEST": "West",
+}
+
+FIRST_YEAR, LAST_YEAR = 2015, 2022
+MISSING_VALUE_SHARE = 0.12
+FOOTNOTE = "Sample size of denominator and the relative standard error (RSE) is insufficient"
+
+# flattened (Class, Topic) pairs, each with a stable mean Data_Value
+_TOPIC_ROWS = [(cls, topic) for cls, topics in TOPICS.items() for topic in topics]
+_TOPIC_MEANS = np.random.default_rng(12345).uniform(5, 60, len(_TOPIC_ROWS)).round(1)
+
+
+def generate_block(rows: int, block: int, seed: int = 0) -> pd.DataFrame:
+    """Rows for one block; block numbers rows from block * BLOCK_ROWS on."""
+    rng = np.random.default_rng([seed, block])
+
+    topic = rng.integers(len(_TOPIC_ROWS), size=rows)
+    age = rng.integers(len(AGE_GROUPS), size=rows)
+    demographic = rng.integers(len(DEMOGRAPHICS), size=rows)
+    location = rng.integers(len(LOCATIONS), size=rows)
+    # most estimates are single-year; some pool three years
+    year_start = rng.integers(FIRST_YEAR, LAST_YEAR + 1, size=rows)
+    year_end = np.minimum(year_start + np.where(rng.random(rows) < 0.15, 2, 0), LAST_YEAR)
+
+    value = np.clip(_TOPIC_MEANS[topic] + rng.normal(0, 6, rows), 0.1, 99.9).round(1)
+    half_width = rng.gamma(2.0, 1.6, rows).round(1) + 0.3
+    missing = rng.random(rows) < MISSING_VALUE_SHARE
+    value[missing] = np.nan
+
+    classes = np.array([cls for cls, _ in _TOPIC_ROWS], dtype=object)
+    topics = np.array([t for _, t in _TOPIC_ROWS], dtype=object)
+    categories = np.array([d[0] for d in DEMOGRAPHICS], dtype=object)
+    demographics = np.array([d[1] for d in DEMOGRAPHICS], dtype=object)
+    strat2 = np.array([d[2] for d in DEMOGRAPHICS], dtype=object)
+    abbrs = np.array(list(LOCATIONS), dtype=object)
+    names = np.array(list(LOCATIONS.values()), dtype=object)
+    question_ids = np.array([f"Q{i + 1:02d}" for i in range(len(_TOPIC_ROWS))], dtype=object)
+    age_ids = np.array(["5064", "65PLUS", "AGE_OVERALL"], dtype=object)
+
+    first_row = block * BLOCK_ROWS
+    return pd.DataFrame({
+        "RowId": np.arange(first_row, first_row + rows),
+        "YearStart": year_start,
+        "YearEnd": year_end,
+        "LocationAbbr": abbrs[location],
+        "LocationDesc": names[location],
+        "Datasource": "BRFSS",
+        "Class": classes[topic],
+        "Topic": topics[topic],
+        "Question": topics[topic],
+        "Data_Value_Unit": "%",
+        "Data_Value_Type": "Percentage",
+        "Data_Value": value,
+        "Data_Value_Footnote": np.where(missing, FOOTNOTE, None),
+        "Low_Confidence_Limit": np.where(missing, np.nan, np.maximum(value - half_width, 0).round(1)),
+        "High_Confidence_Limit": np.where(missing, np.nan, np.minimum(value + half_width, 100).round(1)),
+        "AgeGroup": np.array(AGE_GROUPS, dtype=object)[age],
+        "DemographicCategory": categories[demographic],
+        "Demographic": demographics[demographic],
+        "QuestionID": question_ids[topic],
+        "StratificationID1": age_ids[age],
+        "StratificationID2": strat2[demographic],
+    })
+
+
+def generate_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """rows synthetic export rows as one frame; for large counts prefer write_csv."""
+    blocks = [
+        generate_block(min(BLOCK_ROWS, rows - start), start // BLOCK_ROWS, seed)
+        for start in range(0, rows, BLOCK_ROWS)
+    ]
+    return pd.concat(blocks, ignore_index=True) if blocks else generate_block(0, 0, seed)
+
+
+def write_csv(rows: int, out: str | Path, seed: int = 0) -> Path:
+    """Write rows synthetic export rows to out one block at a time."""
+    out = Path(out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_name(out.name + ".tmp")
+    with open(tmp, "w", newline="") as f:
+        for start in range(0, max(rows, 1), BLOCK_ROWS):
+            block = generate_block(min(BLOCK_ROWS, rows - start), start // BLOCK_ROWS, seed)
+            block.to_csv(f, index=False, header=start == 0)
+    tmp.replace(out)
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("rows", type=int)
+    parser.add_argument("out")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_csv(args.rows, args.out, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Scaling benchmark of the dashboard's data path on synthetic data, with a baseline check.
+
+    python -m benchmarks.suite --rows 10000 100000 1000000 --out bench.json
+    python -m benchmarks.suite --rows 10000 100000 --out new.json --baseline bench.json
+
+Each row count runs in a fresh interpreter, so one size's memory does not carry
+into the next. Every stage reports its best wall time over --repeat runs and the
+peak of Python-tracked allocations (NumPy and pandas buffers) from one more run.
+With --baseline, stages slower than the baseline by more than --tolerance are
+listed and the exit status is 1.
+"""
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generate import TOPICS
+from src.cache import RESULT_CACHE
+from src.cube import CUBE_INPUTS, build_cube, slice_cube, to_measures
+from src.data import APP_COLUMNS, ingest_csv, read_dataset
+from src.figures import VALID_STATES, demographic_counts, state_counts, state_percentage, yearly_trend
+from src.filters import apply_filters, build_filter_index
+from src.kpis import compute_kpis
+
+DATA_DIR = Path(__file__).parent / "data"
+
+# What users commonly look at, from the whole dataset down to a narrow slice
+SELECTIONS = {
+    "default": {"AgeGroup": "All Age Groups", "Demographic": "All", "Topic": [], "rt_range": (2015, 2022)},
+    "topic": {
+        "AgeGroup": "All Age Groups", "Demographic": "All", "Topic": TOPICS["Cognitive Decline"][:1], "rt_range": (2015, 2022),
+    },
+    "age_sex": {"AgeGroup": "65 years or older", "Demographic": "Female", "Topic": [], "rt_range": (2015, 2022)},
+    "narrow": {
+        "AgeGroup": "50-64 years", "Demographic": "Hispanic", "Topic": TOPICS["Mental Health"], "rt_range": (2019, 2020),
+    },
+    "cap_outliers": {
+        "AgeGroup": "All Age Groups", "Demographic": "All", "Topic": [], "rt_range": (2015, 2022), "cap_outliers": True,
+    },
+}
+
+# stage time differences below this are noise, whatever the ratio
+MIN_SECONDS = 0.01
+
+
+def dataset_path(rows: int, seed: int, data_dir: Path = DATA_DIR) -> Path:
+    return data_dir / f"synthetic-{rows}-s{seed}.csv"
+
+
+def _measure(fn: Callable[[], object], repeat: int) -> dict:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(best, 6), "peak_mb": round(peak / 2**20, 2)}
+
+
+def _stages(path: Path) -> list[tuple[str, Callable[[], object]]]:
+    """(name, callable) for every timed stage, in run order; later stages reuse earlier results."""
+    stages = [
+        ("load_data.ingest", lambda: ingest_csv(path)),
+        ("load_data", lambda: read_dataset(path, APP_COLUMNS)),
+    ]
+    df = read_dataset(path, APP_COLUMNS)
+    cube = build_cube(read_dataset(path, CUBE_INPUTS))
+    stages += [
+        ("filter_index", lambda: build_filter_index(df)),
+        ("build_cube", lambda: build_cube(read_dataset(path, CUBE_INPUTS))),
+    ]
+
+    def _filter(selections):
+        # time the filter itself, not a hit on the shared result cache
+        RESULT_CACHE.clear()
+        return apply_filters(df, selections)
+
+    for name, selections in SELECTIONS.items():
+        stages.append((f"apply_filters[{name}]", lambda s=selections: _filter(s)))
+
+    raw = apply_filters(df, SELECTIONS["default"])
+    inputs = {"cube": slice_cube(cube, SELECTIONS["default"]), "raw": to_measures(raw)}
+    for source, measures in inputs.items():
+        stages += [
+            (f"header_metrics[{source}]", lambda m=measures: compute_kpis(m)),
+            (f"charts.yearly_trend[{source}]", lambda m=measures: yearly_trend(m)),
+            (f"charts.race_counts[{source}]", lambda m=measures: demographic_counts(m, "Race/Ethnicity")),
+            (f"charts.sex_counts[{source}]", lambda m=measures: demographic_counts(m, "Sex")),
+            (f"charts.state_counts[{source}]", lambda m=measures: state_counts(m)),
+            (f"layouts.state_percentage[{source}]", lambda m=measures: state_percentage(m, VALID_STATES)),
+        ]
+    return stages
+
+
+def run_size(path: Path, rows: int, repeat: int) -> list[dict]:
+    results = []
+    for stage, fn in _stages(path):
+        results.append({"rows": rows, "stage": stage, **_measure(fn, repeat)})
+        print(json.dumps(results[-1]), file=sys.stderr)
+    return results
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[dict]:
+    """Stages at least `tolerance` slower (as a fraction) than in the baseline, and MIN_SECONDS slower."""
+    before = {(r["rows"], r["stage"]): r for r in baseline}
+    regressions = []
+    for r in results:
+        old = before.get((r["rows"], r["stage"]))
+        if old is None:
+            continue
+        if r["seconds"] > old["seconds"] * (1 + tolerance) and r["seconds"] - old["seconds"] > MIN_SECONDS:
+            regressions.append({
+                "rows": r["rows"],
+                "stage": r["stage"],
+                "baseline_seconds": old["seconds"],
+                "seconds": r["seconds"],
+                "ratio": round(r["seconds"] / old["seconds"], 2),
+            })
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--out", type=Path, help="write results here as JSON")
+    parser.add_argument("--baseline", type=Path, help="results JSON to check for regressions against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        results = run_size(dataset_path(args.worker, args.seed, args.data_dir), args.worker, args.repeat)
+        max_rss_mb = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        print(json.dumps({"results": results, "max_rss_mb": max_rss_mb}))
+        return
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+        },
+        "results": [],
+        "max_rss_mb": {},
+    }
+    for rows in args.rows:
+        path = dataset_path(rows, args.seed, args.data_dir)
+        # the parent stays small: Linux carries peak RSS over into forked children
+        if not path.exists():
+            subprocess.run(
+                [sys.executable, "-m", "benchmarks.generate", str(rows), str(path), "--seed", str(args.seed)], check=True
+            )
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.suite", "--worker", str(rows), "--seed", str(args.seed),
+             "--repeat", str(args.repeat), "--data-dir", str(args.data_dir)],
+            check=True, stdout=subprocess.PIPE, text=True,
+        )
+        worker = json.loads(out.stdout.strip().splitlines()[-1])
+        report["results"] += worker["results"]
+        report["max_rss_mb"][str(rows)] = worker["max_rss_mb"]
+
+    if args.out:
+        args.out.write_text(json.dumps(report, indent=2))
+
+    if args.baseline:
+        regressions = compare(report["results"], json.loads(args.baseline.read_text())["results"], args.tolerance)
+        for r in regressions:
+            print(json.dumps(r))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Group-by kernel for measure records: integer codes in, per-group totals out.
+
+A dimension is coded to dense integers without hashing (categorical codes as
+they are, years as offsets from the first year), and each measure's per-group
+total is then one np.bincount over those codes. No index is built and nothing
+is sorted: the totals come back as arrays aligned with the sorted labels.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+def dimension_codes(column: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """Integer codes in sorted-label order, missing values coded len(labels), and the labels."""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes = column.cat.codes.to_numpy().astype(np.int64)
+        labels = column.cat.categories.to_numpy()
+    elif pd.api.types.is_integer_dtype(column.dtype) and len(column):
+        # years: offsets from the smallest value, no hashing or sorting
+        values = column.to_numpy(dtype=np.int64)
+        lo = values.min()
+        codes = values - lo
+        labels = np.arange(lo, values.max() + 1)
+    else:
+        codes, labels = pd.factorize(column, sort=True)
+        codes, labels = codes.astype(np.int64), np.asarray(labels)
+    codes[codes < 0] = len(labels)
+    return codes, labels
+
+
+@dataclass(frozen=True)
+class GroupTotals:
+    """Measure totals per label of one dimension, for the labels that have records, in label order."""
+
+    labels: np.ndarray
+    rows: np.ndarray
+    count: np.ndarray
+    sum: np.ndarray
+
+    @property
+    def mean(self) -> np.ndarray:
+        """Data_Value mean per group; NaN for a group without values."""
+        mean = np.full(len(self.labels), np.nan)
+        np.divide(self.sum, self.count, out=mean, where=self.count > 0)
+        return mean
+
+
+def group_totals(measures: pd.DataFrame, by: str, where: np.ndarray | None = None) -> GroupTotals:
+    """Sum measure records up to one dimension; `where` is a boolean mask of the records to include.
+
+    Like a sorted, observed group-by, groups without records are left out, as is
+    the group of records missing the dimension.
+    """
+    codes, labels = dimension_codes(measures[by])
+    if where is not None:
+        # excluded records go to the missing-value slot, which is dropped below
+        codes[~where] = len(labels)
+    size = len(labels) + 1
+    rows = np.bincount(codes, weights=measures["rows"].to_numpy(dtype=np.float64), minlength=size)[:-1]
+    count = np.bincount(codes, weights=measures["count"].to_numpy(dtype=np.float64), minlength=size)[:-1]
+    total = np.bincount(codes, weights=measures["sum"].to_numpy(dtype=np.float64), minlength=size)[:-1]
+    # every record holds at least one row, so a group has records exactly when it has rows
+    observed = rows > 0
+    return GroupTotals(labels[observed], rows[observed].astype(np.int64), count[observed].astype(np.int64), total[observed])
+
+
+def label_mask(column: pd.Series, values: list) -> np.ndarray:
+    """Boolean mask of the records whose label is one of values, compared once per label rather than per record."""
+    codes, labels = dimension_codes(column)
+    return np.append(np.isin(labels, values), False)[codes]
@@ -0,0 +1,336 @@
+"""Where filtered rows and measure records come from.
+
+The app asks a backend for the rows and measure records of a selection, the
+sidebar's year bounds and option counts, and the Table's row count, pages and
+CSV download, and aggregates measure records further itself, so KPIs and charts
+are the same code on top of either backend:
+
+- PandasBackend (default) filters the dataset and slices the cube in memory.
+- DuckDBBackend pushes the selection down as a SQL predicate over the Parquet
+  copy and the cube file, so only matching rows are ever read and the dataset is
+  never loaded. Capped selections are grouped into cube cells, the Table is
+  searched, sorted and paged, and the cap's sketch is built, all in SQL. It
+  needs the optional duckdb package (pip install duckdb).
+
+Set DASHBOARD_BACKEND=duckdb to switch. Both return the same values in the same
+dtypes; category dictionaries may differ, and float sums may differ in the last
+bits from summation order.
+"""
+import os
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+import streamlit as st
+
+from src.cache import RESULT_CACHE, selection_key
+from src.cube import CUBE_DIMENSIONS, LIMITS_Z, cube_path, read_cube, select_measures
+from src.data import APP_COLUMNS, TARGET_CLASSES, columnar_paths, compact_frame, sort_categories
+from src.filters import (
+    CAP_QUANTILE,
+    INDEXED_COLUMNS,
+    FilterOptions,
+    apply_filters,
+    cap_cutoff,
+    filter_options,
+    get_filter_index,
+    year_bounds,
+)
+from src.sketch import SKETCH_DIMENSIONS, SKETCH_POINTS, merged_quantile, select_points
+from src.table import CSV_CHUNK_ROWS, TABLE_COLUMNS, csv_chunks, table_positions
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+BACKEND = os.environ.get("DASHBOARD_BACKEND", "pandas")
+
+# the rows read_dataset keeps (src.data.row_filter); its parameter is TARGET_CLASSES
+DASHBOARD_ROWS = "(AgeGroup <> 'Overall' OR AgeGroup IS NULL) AND list_contains(?, Class)"
+
+# the CI width as build_filter_index computes it, from the float64 limits compact_frame loads
+CI_WIDTH = "abs(CAST(High_Confidence_Limit AS DOUBLE) - CAST(Low_Confidence_Limit AS DOUBLE))"
+
+# src.cube.to_measures summed per cube cell: a raw selection's measure records, one per cell rather than per row
+MEASURES = f"""
+    count(*) AS rows,
+    count(Data_Value) AS count,
+    coalesce(sum(Data_Value), 0) AS sum,
+    coalesce(sum(Data_Value * Data_Value), 0) AS sumsq,
+    count(*) FILTER (WHERE Data_Value IS NOT NULL AND {CI_WIDTH} IS NOT NULL) AS limits,
+    coalesce(sum(pow({CI_WIDTH} / {2 * LIMITS_Z!r}, 2)) FILTER (WHERE Data_Value IS NOT NULL), 0) AS variance
+"""
+
+# src.sketch.build_sketch: every CI width of a slice of at most SKETCH_POINTS rows, else the widths at
+# the centres of SKETCH_POINTS equal-rank buckets, each weighing rows / SKETCH_POINTS
+SKETCH = f"""
+WITH widths AS (
+    SELECT {', '.join(SKETCH_DIMENSIONS)}, {CI_WIDTH} AS value
+    FROM {{rows}} WHERE {DASHBOARD_ROWS} AND {CI_WIDTH} IS NOT NULL AND NOT isnan({CI_WIDTH})
+), ranked AS (
+    SELECT *,
+        row_number() OVER slice - 1 AS rank,
+        count(*) OVER (PARTITION BY {', '.join(SKETCH_DIMENSIONS)}) AS n
+    FROM widths
+    WINDOW slice AS (PARTITION BY {', '.join(SKETCH_DIMENSIONS)} ORDER BY value)
+), bucketed AS (
+    -- the first bucket whose centre is at or past the rank
+    SELECT *, greatest(ceil(rank * {{points}} / n - 0.5), 0) AS bucket FROM ranked
+)
+SELECT {', '.join(SKETCH_DIMENSIONS)}, value,
+    CASE WHEN n <= {{points}} THEN 1.0 ELSE n / {{points}} END AS weight
+FROM bucketed
+WHERE n <= {{points}} OR (bucket < {{points}} AND floor((bucket + 0.5) * n / {{points}}) = rank)
+ORDER BY value, weight
+"""
+
+
+class PandasBackend:
+    """Filters and cube slices computed in memory from the loaded frames."""
+
+    name = "pandas"
+
+    def __init__(self, df: pd.DataFrame, cube: pd.DataFrame):
+        self.df = df
+        self.cube = cube
+
+    def filter_rows(self, selections: dict) -> pd.DataFrame:
+        return apply_filters(self.df, selections)
+
+    def measures(self, selections: dict) -> tuple[pd.DataFrame, str]:
+        return select_measures(self.df, self.cube, selections)
+
+    def cap_cutoff(self, selections: dict) -> tuple[float, float]:
+        return cap_cutoff(get_filter_index(self.df), selections)
+
+    def year_bounds(self) -> tuple[int, int]:
+        return year_bounds(get_filter_index(self.df))
+
+    def filter_options(self, selections: dict) -> FilterOptions:
+        return filter_options(self.df, selections)
+
+    def table_count(self, selections: dict, query: str) -> int:
+        return len(table_positions(self.df, selections, query))
+
+    def table_page(
+        self, selections: dict, query: str, sort_by: str | None, descending: bool, offset: int, limit: int
+    ) -> pd.DataFrame:
+        positions = table_positions(self.df, selections, query, sort_by, descending)
+        return self.df.take(positions[offset:offset + limit])[TABLE_COLUMNS]
+
+    def table_csv(self, selections: dict, query: str, sort_by: str | None, descending: bool) -> Iterator[bytes]:
+        return csv_chunks(self.df, table_positions(self.df, selections, query, sort_by, descending), TABLE_COLUMNS)
+
+
+def _quote(path: Path) -> str:
+    return "'" + str(path).replace("'", "''") + "'"
+
+
+def _predicate(selections: dict, cutoff: float | None = None, open_column: str | None = None) -> tuple[str, list]:
+    """SQL WHERE clause and its parameters for a render_filters selection, leaving open_column unfiltered."""
+    clauses, params = [], []
+    if selections["AgeGroup"] != "All Age Groups" and open_column != "AgeGroup":
+        clauses.append("AgeGroup = ?")
+        params.append(selections["AgeGroup"])
+    if selections["Demographic"] != "All" and open_column != "Demographic":
+        clauses.append("Demographic = ?")
+        params.append(selections["Demographic"])
+    if selections["Topic"] and open_column != "Topic":
+        clauses.append("list_contains(?, Topic)")
+        params.append(list(selections["Topic"]))
+    lo, hi = selections["rt_range"]
+    clauses.append("YearStart >= ? AND YearEnd <= ?")
+    params += [int(lo), int(hi)]
+    if cutoff is not None:
+        # a NULL width compares as NULL and drops the row, as NaN <= cutoff does in pandas
+        clauses.append(f"{CI_WIDTH} <= ?")
+        params.append(cutoff)
+    return " AND ".join(clauses), params
+
+
+def _as_frame(df: pd.DataFrame, attrs: dict) -> pd.DataFrame:
+    # the same dtypes load_data gives, so both backends feed identical frames to the aggregations
+    df = compact_frame(df)
+    df.attrs = attrs
+    return df
+
+
+def _as_cube_frame(df: pd.DataFrame, attrs: dict) -> pd.DataFrame:
+    # the dtypes read_cube gives: categorical dimensions, measures and years as stored in the cube file
+    df = sort_categories(df.astype({col: "category" for col in CUBE_DIMENSIONS if df[col].dtype == object}))
+    df.attrs = attrs
+    return df
+
+
+class DuckDBBackend:
+    """Selections answered by SQL over the dataset's Parquet copy and cube file."""
+
+    name = "duckdb"
+
+    def __init__(self, path: str, content_hash: str):
+        if duckdb is None:
+            raise RuntimeError("the DuckDB backend needs the duckdb package: pip install duckdb")
+        # materialize the Parquet copies and the cube first; DuckDB only reads them
+        files = ", ".join(_quote(file) for file in columnar_paths(path))
+        read_cube(path)
+        self.content_hash = content_hash
+        # rows come back in file name order, then file order: the order read_dataset combines them in
+        self.rows_source = f"read_parquet([{files}], filename = true, file_row_number = true)"
+        self.cube_source = f"read_parquet({_quote(cube_path(path))}, file_row_number = true)"
+        self.con = duckdb.connect()
+        self._sketch = None
+        self._years = None
+        self._values = {}
+
+    def _query(self, sql: str, params: list) -> pd.DataFrame:
+        # a cursor per query: sessions run on their own threads, and a DuckDB connection is not shared safely
+        with self.con.cursor() as cur:
+            return cur.execute(sql, params).df()
+
+    def _key(self, selections: dict) -> tuple:
+        return selection_key(selections, self.content_hash)
+
+    def _rows(self, selections: dict, columns: list[str]) -> pd.DataFrame:
+        cutoff = self.cap_cutoff(selections)[0] if selections.get("cap_outliers") else None
+        where, params = _predicate(selections, cutoff)
+        sql = (
+            f"SELECT {', '.join(columns)} FROM {self.rows_source} "
+            f"WHERE {DASHBOARD_ROWS} AND {where} ORDER BY filename, file_row_number"
+        )
+        return self._query(sql, [TARGET_CLASSES] + params)
+
+    def filter_rows(self, selections: dict) -> pd.DataFrame:
+        key = self._key(selections)
+
+        def _compute():
+            return _as_frame(self._rows(selections, APP_COLUMNS), {"content_hash": self.content_hash})
+
+        out = RESULT_CACHE.get_or_compute((key, "rows"), _compute).copy(deep=False)
+        out.attrs = {"content_hash": self.content_hash, "selection_key": key}
+        return out
+
+    def measures(self, selections: dict) -> tuple[pd.DataFrame, str]:
+        key = self._key(selections)
+
+        def _compute():
+            attrs = {"content_hash": self.content_hash}
+            if selections.get("cap_outliers"):
+                # the cube's GROUP BY over the capped rows, so only cube-sized records leave DuckDB
+                where, params = _predicate(selections, self.cap_cutoff(selections)[0])
+                dimensions = ", ".join(CUBE_DIMENSIONS)
+                sql = (
+                    f"SELECT {dimensions}, {MEASURES} FROM {self.rows_source} WHERE {DASHBOARD_ROWS} AND {where} "
+                    f"GROUP BY ALL ORDER BY {dimensions} NULLS LAST"
+                )
+                return _as_frame(self._query(sql, [TARGET_CLASSES] + params), attrs), "raw"
+            where, params = _predicate(selections)
+            sql = f"SELECT * EXCLUDE (file_row_number) FROM {self.cube_source} WHERE {where} ORDER BY file_row_number"
+            return _as_cube_frame(self._query(sql, params), attrs), "cube"
+
+        measures, source = RESULT_CACHE.get_or_compute((key, "measures"), _compute)
+        measures = measures.copy(deep=False)
+        measures.attrs = {**measures.attrs, "selection_key": key}
+        return measures, source
+
+    def cap_cutoff(self, selections: dict) -> tuple[float, float]:
+        if self._sketch is None:
+            # the CI-width sketch build_filter_index keeps, built by DuckDB, so both backends cap at the same width
+            sql = SKETCH.format(rows=self.rows_source, points=SKETCH_POINTS)
+            self._sketch = _as_frame(self._query(sql, [TARGET_CLASSES]), {})
+        return merged_quantile(*select_points(self._sketch, selections), CAP_QUANTILE)
+
+    def year_bounds(self) -> tuple[int, int]:
+        if self._years is None:
+            sql = f"SELECT min(YearStart), max(YearEnd) FROM {self.rows_source} WHERE {DASHBOARD_ROWS}"
+            lo, hi = self._query(sql, [TARGET_CLASSES]).iloc[0]
+            self._years = int(lo), int(hi)
+        return self._years
+
+    def _options(self, col: str) -> list[str]:
+        """Every value of col among the dashboard rows, sorted as the filter index lists them."""
+        if col not in self._values:
+            sql = f"SELECT DISTINCT {col} AS value FROM {self.rows_source} WHERE {DASHBOARD_ROWS} AND {col} IS NOT NULL"
+            self._values[col] = sorted(str(value) for value in self._query(sql, [TARGET_CLASSES])["value"])
+        return self._values[col]
+
+    def _facets(self, selections: dict) -> tuple[dict[str, dict[str, int]], dict[str, int]]:
+        # src.filters.facet_counts as one GROUP BY per column, that column's own filter left open
+        cutoff = self.cap_cutoff(selections)[0] if selections.get("cap_outliers") else None
+        counts, totals = {}, {}
+        for col in INDEXED_COLUMNS:
+            where, params = _predicate(selections, cutoff, open_column=col)
+            sql = f"SELECT {col} AS value, count(*) AS n FROM {self.rows_source} WHERE {DASHBOARD_ROWS} AND {where} GROUP BY {col}"
+            found = self._query(sql, [TARGET_CLASSES] + params)
+            matched = {str(value): int(n) for value, n in zip(found["value"], found["n"]) if not pd.isna(value)}
+            counts[col] = {value: matched.get(value, 0) for value in self._options(col)}
+            # rows missing the column count towards the total, as they do in the filter index
+            totals[col] = int(found["n"].sum())
+        return counts, totals
+
+    def filter_options(self, selections: dict) -> FilterOptions:
+        counts, totals = RESULT_CACHE.get_or_compute((self._key(selections), "facets"), lambda: self._facets(selections))
+        return FilterOptions(self.year_bounds(), counts, totals)
+
+    def _table_rows(self, selections: dict, query: str) -> tuple[str, list]:
+        # src.table.search_positions: the query in any table column, case-insensitive
+        cutoff = self.cap_cutoff(selections)[0] if selections.get("cap_outliers") else None
+        where, params = _predicate(selections, cutoff)
+        sql = f"FROM {self.rows_source} WHERE {DASHBOARD_ROWS} AND {where}"
+        if query:
+            sql += " AND (" + " OR ".join(f"contains(lower(CAST({col} AS VARCHAR)), ?)" for col in TABLE_COLUMNS) + ")"
+            params += [query.lower()] * len(TABLE_COLUMNS)
+        return sql, [TARGET_CLASSES] + params
+
+    def table_count(self, selections: dict, query: str) -> int:
+        def _compute():
+            sql, params = self._table_rows(selections, query)
+            return int(self._query(f"SELECT count(*) AS n {sql}", params)["n"].iloc[0])
+
+        return RESULT_CACHE.get_or_compute((self._key(selections), ("table_count", query)), _compute)
+
+    def _table_sql(self, selections: dict, query: str, sort_by: str | None, descending: bool) -> tuple[str, list]:
+        # src.table.sort_positions: ties in dataset order, missing values last either way round
+        if sort_by is not None and sort_by not in TABLE_COLUMNS:
+            raise ValueError(f"the table can't be sorted by {sort_by!r}")
+        sql, params = self._table_rows(selections, query)
+        order = "filename, file_row_number"
+        if sort_by:
+            order = f"{sort_by} {'DESC' if descending else 'ASC'} NULLS LAST, {order}"
+        return f"SELECT {', '.join(TABLE_COLUMNS)} {sql} ORDER BY {order}", params
+
+    def table_page(
+        self, selections: dict, query: str, sort_by: str | None, descending: bool, offset: int, limit: int
+    ) -> pd.DataFrame:
+        def _compute():
+            sql, params = self._table_sql(selections, query, sort_by, descending)
+            return _as_frame(self._query(f"{sql} LIMIT ? OFFSET ?", params + [limit, offset]), {})
+
+        stage = ("table", query, sort_by, descending, offset, limit)
+        return RESULT_CACHE.get_or_compute((self._key(selections), stage), _compute)
+
+    def table_csv(self, selections: dict, query: str, sort_by: str | None, descending: bool) -> Iterator[bytes]:
+        sql, params = self._table_sql(selections, query, sort_by, descending)
+        with self.con.cursor() as cur:
+            cur.execute(sql, params)
+            header = True
+            # fetched in vectors of DuckDB's 2048 rows, about CSV_CHUNK_ROWS at a time
+            while len(chunk := cur.fetch_df_chunk(max(1, CSV_CHUNK_ROWS // 2048))) or header:
+                yield _as_frame(chunk, {}).to_csv(index=False, header=header).encode()
+                header = False
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _duckdb_backend(path: str, content_hash: str) -> DuckDBBackend:
+    return DuckDBBackend(path, content_hash)
+
+
+def get_backend(
+    path: str, content_hash: str, df: pd.DataFrame | None, cube: pd.DataFrame | None, name: str = BACKEND
+) -> PandasBackend | DuckDBBackend:
+    """The configured backend for a dataset; df and cube are what the pandas backend works on, None for DuckDB."""
+    if name == "pandas":
+        return PandasBackend(df, cube)
+    if name == "duckdb":
+        return _duckdb_backend(path, content_hash)
+    raise ValueError(f"unknown DASHBOARD_BACKEND {name!r}; expected 'pandas' or 'duckdb'")
@@ -0,0 +1,175 @@
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+import numpy as np
+import pandas as pd
+
+from src.diskcache import DiskCache
+
+DEFAULT_BUDGET_MB = 256
+DEFAULT_FIGURE_BUDGET_MB = 32
+
+
+def sizeof(value: Any) -> int:
+    """Approximate number of bytes held by a cached value."""
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+_lookups = threading.local()
+
+
+def count_lookup(hit: bool) -> None:
+    """Count a cache hit or miss against the calling thread, i.e. the current session's rerun."""
+    counts = _lookups.__dict__.setdefault("counts", [0, 0])
+    counts[0 if hit else 1] += 1
+
+
+def thread_lookups() -> tuple[int, int]:
+    """Hits and misses counted on this thread so far, over every cache."""
+    hits, misses = _lookups.__dict__.get("counts", (0, 0))
+    return hits, misses
+
+
+class ResultCache:
+    """Thread-safe LRU cache bounded by the total byte size of its values, optionally backed by a DiskCache."""
+
+    def __init__(self, max_bytes: int, disk: DiskCache | None = None):
+        self.max_bytes = max_bytes
+        # consulted on a miss and filled on every compute; benchmarks set it to None to time computations
+        self.disk = disk
+        self._entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        count_lookup(entry is not None)
+        return (False, None) if entry is None else (True, entry[0])
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        # compute outside the lock; two sessions racing on a miss both compute, last write wins
+        found, value = self.get(key)
+        if not found:
+            if self.disk is not None:
+                found, value = self.disk.get(key)
+            if not found:
+                value = compute()
+                if self.disk is not None:
+                    self.disk.put(key, value)
+            self.put(key, value)
+        return value
+
+    def remap(self, fn: Callable[[Hashable], Hashable | None]) -> None:
+        """Rewrite every key with fn(key), keeping LRU order; keys mapped to None are dropped."""
+        with self._lock:
+            entries = self._entries
+            self._entries = OrderedDict()
+            self._bytes = 0
+            for key, (value, size) in entries.items():
+                new_key = fn(key)
+                if new_key is not None:
+                    self._entries[new_key] = (value, size)
+                    self._bytes += size
+
+    def items(self) -> list[tuple[Hashable, Any]]:
+        """Every key and value held, least recently used first."""
+        with self._lock:
+            return [(key, value) for key, (value, _) in self._entries.items()]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# shared with other worker processes and across restarts once app.py attaches the disk tier (src.diskcache)
+RESULT_CACHE = ResultCache(int(float(os.environ.get("DASHBOARD_CACHE_MB", DEFAULT_BUDGET_MB)) * 2**20))
+
+# serialized Plotly figures, keyed by the content of the data they plot
+FIGURE_CACHE = ResultCache(int(float(os.environ.get("DASHBOARD_FIGURE_CACHE_MB", DEFAULT_FIGURE_BUDGET_MB)) * 2**20))
+
+
+def selection_key(selections: dict, content_hash: str) -> tuple:
+    """Canonical, hashable form of a render_filters selection for one dataset."""
+    if content_hash is None:
+        # frames without a content hash would share each other's cached results
+        raise ValueError("a selection key needs the dataset's content hash")
+    lo, hi = selections["rt_range"]
+    return (
+        content_hash,
+        selections["AgeGroup"],
+        selections["Demographic"],
+        tuple(sorted(selections["Topic"])),
+        (int(lo), int(hi)),
+        bool(selections.get("cap_outliers")),
+    )
+
+
+def cached(df: pd.DataFrame, stage: Hashable, compute: Callable[[], Any]) -> Any:
+    """Memoize an aggregate of a filtered frame under its selection key.
+
+    Frames returned by apply_filters carry the key in df.attrs; anything else is
+    computed directly. Cached values are shared between sessions and must not be mutated.
+    """
+    key = df.attrs.get("selection_key")
+    if key is None:
+        return compute()
+    return RESULT_CACHE.get_or_compute((key, stage), compute)
+
+
+def frame_digest(df: pd.DataFrame) -> str:
+    """Content hash of a small frame: values, index, column names and dtypes."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr(list(zip(df.columns, map(str, df.dtypes)))).encode())
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
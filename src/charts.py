@@ -1,45 +1,75 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Callable
+
 import pandas as pd
-import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
 import streamlit as st
 
-
+from src.cache import FIGURE_CACHE, cached, frame_digest
+from src.figures import (
+    DELTA_SCALE,
+    demographic_bar_figure,
+    demographic_counts,
+    map_figure,
+    radial_bar_figure,
+    response_trend_figure,
+    state_counts,
+    yearly_trend,
+)
+from src.timing import span
+
+logger = logging.getLogger(__name__)
+
+# per chart: cache hits, misses and total seconds spent building figures on a miss
+FIGURE_STATS: dict[str, dict] = defaultdict(lambda: {"hits": 0, "misses": 0, "build_seconds": 0.0})
+_stats_lock = threading.Lock()
+
+
+def show_figure(chart: str, data: pd.DataFrame, build: Callable[[], go.Figure], **params) -> None:
+    """Draw the figure build() makes from data, reusing its serialized form when data is unchanged.
+
+    The key is the chart name, a content hash of data and any other inputs in params,
+    so identical aggregates share a figure across reruns and sessions.
+    """
+    key = ("figure", chart, frame_digest(data), tuple(sorted(params.items())))
+    with span(f"figure:{chart}", rows_in=len(data)):
+        found, spec = FIGURE_CACHE.get(key)
+        if not found:
+            start = time.perf_counter()
+            spec = pio.to_json(build(), validate=False)
+            elapsed = time.perf_counter() - start
+            FIGURE_CACHE.put(key, spec)
+
+        with _stats_lock:
+            stats = FIGURE_STATS[chart]
+            stats["hits" if found else "misses"] += 1
+            if not found:
+                stats["build_seconds"] += elapsed
+            lookups = stats["hits"] + stats["misses"]
+            if found:
+                logger.info("figure %s: cache hit (hit rate %.0f%%)", chart, 100 * stats["hits"] / lookups)
+            else:
+                logger.info(
+                    "figure %s: built in %.1f ms (hit rate %.0f%%)", chart, 1000 * elapsed, 100 * stats["hits"] / lookups
+                )
+
+        st.plotly_chart(json.loads(spec), use_container_width=True)
+
+
+# The plot_* functions take measure records from src.cube.select_measures
 def plot_response_trend(df: pd.DataFrame) -> None:
     if df.empty:
         st.info("No rows match your filters.")
         return
 
-    yearly = (
-        df.groupby("YearEnd")["Data_Value"]
-          .mean()
-          .reset_index(name="Percent")
-          .sort_values("YearEnd")
-    )
-
-    overall_avg = df["Data_Value"].mean()
-
-    fig = px.line(
-        yearly,
-        x="YearEnd",
-        y="Percent",
-        labels={"YearEnd": "year"},
-        markers=True,
-        title=None,
-    )
-
-    fig.add_hline(
-        y=overall_avg,
-        line_dash="dash",
-        line_color="#f5d76e",
-        annotation_text=f"Overall Avg: {overall_avg:.2f}%",
-        annotation_position="bottom right"
-    )
+    yearly, overall_avg = cached(df, "yearly_trend", lambda: yearly_trend(df))
 
-    fig.update_xaxes(dtick=1)
-    fig.update_yaxes(ticksuffix="%", rangemode="tozero")
-    fig.update_traces(line=dict(width=2, color="#6b9fd4"), marker=dict(size=8))
-    fig.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
-
-    st.plotly_chart(fig, use_container_width=True)
+    show_figure("response_trend", yearly, lambda: response_trend_figure(yearly, overall_avg), overall_avg=overall_avg)
 
 
 def plot_demo_bar(df: pd.DataFrame) -> None:
@@ -47,48 +77,18 @@ def plot_demo_bar(df: pd.DataFrame) -> None:
         st.info("No rows match your filters.")
         return
 
-    agg = (
-        df[df["DemographicCategory"] == "Race/Ethnicity"]
-        .groupby("Demographic", as_index=False)
-        .size()
-        .rename(columns={"size": "Count"})
-        .sort_values("Count", ascending=False)
-    )
+    agg = cached(df, "race_counts", lambda: demographic_counts(df, "Race/Ethnicity"))
 
-    fig = px.bar(
-        agg,
-        x="Demographic",
-        labels={"Demographic": "Race/Ethnicity"},
-        y="Count",
-        title=None,
-        color_discrete_sequence=["#6b9fd4"],
-    )
-    fig.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
-    st.plotly_chart(fig, use_container_width=True)
+    show_figure("demo_bar", agg, lambda: demographic_bar_figure(agg, "Race/Ethnicity"))
 
 def plot_sex_bar(df: pd.DataFrame) -> None:
     if df.empty:
         st.info("No rows match your filters.")
         return
 
-    agg = (
-        df[df["DemographicCategory"] == "Sex"]
-        .groupby("Demographic", as_index=False)
-        .size()
-        .rename(columns={"size": "Count"})
-        .sort_values("Count", ascending=False)
-    )
+    agg = cached(df, "sex_counts", lambda: demographic_counts(df, "Sex"))
 
-    fig = px.bar(
-        agg,
-        x="Demographic",
-        labels={"Demographic": "Sex"},
-        y="Count",
-        title=None,
-        color_discrete_sequence=["#6b9fd4"],
-    )
-    fig.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
-    st.plotly_chart(fig, use_container_width=True)
+    show_figure("sex_bar", agg, lambda: demographic_bar_figure(agg, "Sex"))
 
 def plot_map(df: pd.DataFrame) -> None:
 
@@ -97,35 +97,24 @@ def plot_map(df: pd.DataFrame) -> None:
         return
 
     # Count responses per state (respects filters automatically)
-    state_counts = (
-        df.groupby("LocationAbbr")
-        .size()
-        .reset_index(name="Count")
-    )
+    counts = cached(df, "state_counts", lambda: state_counts(df))
 
-    if state_counts.empty:
+    if counts.empty:
         st.warning("No data available.")
         return
 
-    fig = px.choropleth(
-        state_counts,
-        locations="LocationAbbr",
-        locationmode="USA-states",
-        color="Count",
-        scope="usa",
-        color_continuous_scale=[(0, "green"), (0.5, "yellow"), (1, "red")],
-        labels={"Count": "Number of Responses"}
-    )
+    show_figure("map", counts, lambda: map_figure(counts))
 
-    fig.update_layout(
-        height=600,
-        paper_bgcolor="rgba(0,0,0,0)",
-        plot_bgcolor="rgba(0,0,0,0)",
-        geo=dict(bgcolor="rgba(0,0,0,0)"),
+def plot_delta_map(states: pd.DataFrame) -> None:
+    """Mean change per state from src.compare.state_deltas, diverging around no change."""
+    show_figure(
+        "delta_map",
+        states,
+        lambda: map_figure(
+            states, color="Delta", label="Change (points)", scale=DELTA_SCALE, midpoint=0, hover=["Cells", "Significant"]
+        ),
     )
 
-    st.plotly_chart(fig, use_container_width=True)
-
 def plot_radial_bar(df: pd.DataFrame, value_col: str = "Percentage") -> None:
     if "LocationAbbr" not in df.columns:
         st.error("LocationAbbr column not found in dataframe.")
@@ -136,26 +125,4 @@ def plot_radial_bar(df: pd.DataFrame, value_col: str = "Percentage") -> None:
 
     df_sorted = df.sort_values(by=value_col, ascending=False)
 
-    fig = px.bar_polar(
-        df_sorted,
-        r=value_col,  # radial length = percentage
-        theta="LocationAbbr",  # angle = state
-        color=value_col,  # color intensity = value
-        color_continuous_scale=px.colors.sequential.Oranges,
-        template="ggplot2",
-        hover_data = {"LocationAbbr": True, value_col: ":.2f"}
-    )
-
-    fig.update_layout(
-        height=600,
-        font=dict(size=12),
-        paper_bgcolor="rgba(0,0,0,0)",
-        plot_bgcolor="rgba(0,0,0,0)",
-        polar = dict(
-            radialaxis=dict(
-                tickfont=dict(size=14, color="black")
-            )
-        )
-    )
-
-    st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+    show_figure("radial_bar", df_sorted, lambda: radial_bar_figure(df_sorted, value_col), value_col=value_col)
@@ -0,0 +1,167 @@
+"""Period-over-period comparison: two year windows, every state × topic × demographic cell.
+
+Analysts compare a selection over two year windows. Instead of two reruns, one
+request fetches the measure records spanning both windows, and one bincount per
+measure yields both windows' totals for every COMPARE_KEY cell. The deltas and
+their confidence intervals are then array arithmetic on those totals.
+
+The intervals come from the published confidence limits: the cube carries the
+sum of the rows' squared standard errors (src.cube), so a window's standard error
+for a cell mean is the root of that sum over the cell's count. A delta is
+flagged significant when its interval, from both windows' standard errors,
+excludes zero; a cell with a value lacking its limits is never flagged.
+"""
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+from src.aggregate import dimension_codes
+from src.cache import cached
+from src.charts import plot_delta_map
+
+# the cells whose means are compared
+COMPARE_KEY = ["LocationAbbr", "Topic", "Demographic"]
+
+COMPARE_CONFIDENCE = 0.95
+_Z = NormalDist().inv_cdf(0.5 + COMPARE_CONFIDENCE / 2)
+
+# ranked rows sent to the browser
+RANKED_ROWS = 100
+
+
+def window_mask(measures: pd.DataFrame, window: tuple[int, int]) -> np.ndarray:
+    """Records inside a year window, by the same test the sidebar's year range applies."""
+    lo, hi = window
+    return ((measures["YearStart"] >= lo) & (measures["YearEnd"] <= hi)).to_numpy()
+
+
+def compare_periods(measures: pd.DataFrame, base: tuple[int, int], target: tuple[int, int]) -> pd.DataFrame:
+    """Data_Value mean per COMPARE_KEY cell in the base and target windows, and target minus base.
+
+    measures must span both windows. Only cells with values in both windows are
+    returned, with Low/High bounding the delta at COMPARE_CONFIDENCE and
+    Significant when that interval excludes zero. The windows may overlap: a
+    record in both counts towards both.
+    """
+    cell = np.zeros(len(measures), dtype=np.int64)
+    labels, shape = [], []
+    present = np.ones(len(measures), dtype=bool)
+    for col in COMPARE_KEY:
+        col_codes, col_labels = dimension_codes(measures[col])
+        # records missing part of the key belong to no cell
+        present &= col_codes < len(col_labels)
+        cell = cell * len(col_labels) + np.minimum(col_codes, len(col_labels) - 1)
+        labels.append(col_labels)
+        shape.append(len(col_labels))
+    cells = int(np.prod(shape))
+
+    # base records keyed by their cell, target records by cells + their cell: one bincount covers both windows
+    in_base = present & window_mask(measures, base)
+    in_target = present & window_mask(measures, target)
+    key = np.concatenate([cell[in_base], cells + cell[in_target]])
+    totals = {}
+    for measure in ("count", "sum", "limits", "variance"):
+        values = measures[measure].to_numpy(dtype=np.float64)
+        weights = np.concatenate([values[in_base], values[in_target]])
+        totals[measure] = np.bincount(key, weights=weights, minlength=2 * cells).reshape(2, cells)
+
+    paired = np.flatnonzero((totals["count"] > 0).all(axis=0))
+    count, total, limits, variance = (totals[measure][:, paired] for measure in ("count", "sum", "limits", "variance"))
+    mean = total / count
+    # the mean of independent values: its variance is the sum of theirs over count squared
+    se = np.where(limits == count, np.sqrt(variance) / count, np.nan)
+    delta = mean[1] - mean[0]
+    margin = _Z * np.sqrt(se[0] ** 2 + se[1] ** 2)
+
+    codes = np.unravel_index(paired, shape)
+    out = pd.DataFrame(
+        {col: pd.Categorical.from_codes(col_codes, col_labels) for col, col_codes, col_labels in zip(COMPARE_KEY, codes, labels)}
+    )
+    out["Base"], out["Target"], out["Delta"] = mean[0], mean[1], delta
+    out["Low"], out["High"] = delta - margin, delta + margin
+    out["Significant"] = (out["Low"] > 0) | (out["High"] < 0)
+    out["BaseCount"], out["TargetCount"] = count.astype(np.int64)
+    return out
+
+
+def state_deltas(cells: pd.DataFrame) -> pd.DataFrame:
+    """Mean cell delta per LocationAbbr, with how many of its cells changed significantly."""
+    codes, states = dimension_codes(cells["LocationAbbr"])
+    size = len(states) + 1
+    n = np.bincount(codes, minlength=size)[:-1]
+    total = np.bincount(codes, weights=cells["Delta"].to_numpy(), minlength=size)[:-1]
+    significant = np.bincount(codes, weights=cells["Significant"].to_numpy(dtype=np.float64), minlength=size)[:-1]
+    observed = n > 0
+    return pd.DataFrame({
+        "LocationAbbr": states[observed],
+        "Delta": total[observed] / n[observed],
+        "Cells": n[observed],
+        "Significant": significant[observed].astype(np.int64),
+    })
+
+
+def ranked_changes(cells: pd.DataFrame, significant_only: bool = True) -> pd.DataFrame:
+    """Cells ordered by the size of their change, largest first."""
+    if significant_only:
+        cells = cells[cells["Significant"].to_numpy()]
+    order = np.argsort(-cells["Delta"].abs().to_numpy(), kind="stable")
+    return cells.take(order).reset_index(drop=True)
+
+
+def _label(window: tuple[int, int]) -> str:
+    lo, hi = window
+    return str(lo) if lo == hi else f"{lo}-{hi}"
+
+
+def render_comparison(backend, selections: dict, bounds: tuple[int, int]) -> None:
+    """Two year windows compared under the sidebar's other filters: a delta map and the ranked cells.
+
+    backend is a src.backend backend; bounds are the dataset's first and last year.
+    """
+    lo, hi = bounds
+    mid = (lo + hi) // 2
+    c1, c2 = st.columns(2)
+    with c1:
+        base = st.slider("Base period", lo, hi, (lo, mid), key="compare_base")
+    with c2:
+        target = st.slider("Comparison period", lo, hi, (min(mid + 1, hi), hi), key="compare_target")
+
+    # one request for the records of both windows; the sidebar's own year range is replaced by them
+    span_years = (min(base[0], target[0]), max(base[1], target[1]))
+    measures, _ = backend.measures({**selections, "rt_range": span_years})
+    cells = cached(measures, ("compare", base, target), lambda: compare_periods(measures, base, target))
+    if cells.empty:
+        st.info("No state, topic and demographic has values in both periods.")
+        return
+
+    st.caption(
+        f"{len(cells):,} state × topic × demographic cells reported in both periods, "
+        f"{int(cells['Significant'].sum()):,} changed significantly "
+        f"({COMPARE_CONFIDENCE:.0%} interval of the change excludes zero)."
+    )
+
+    st.subheader(f"Change in Average Percentage, {_label(base)} to {_label(target)}")
+    st.write("Mean change over each state's cells; red states rose, blue states fell.")
+    states = cached(measures, ("compare_states", base, target), lambda: state_deltas(cells))
+    plot_delta_map(states)
+
+    st.subheader("Largest Changes")
+    significant_only = st.toggle("Significant changes only", value=True, key="compare_significant")
+    ranked = ranked_changes(cells, significant_only).head(RANKED_ROWS)
+    st.dataframe(
+        pa.Table.from_pandas(ranked, preserve_index=False),
+        use_container_width=True,
+        height=420,
+        column_config={
+            "Base": st.column_config.NumberColumn(_label(base), format="%.2f"),
+            "Target": st.column_config.NumberColumn(_label(target), format="%.2f"),
+            "Delta": st.column_config.NumberColumn("Change", format="%+.2f"),
+            "Low": st.column_config.NumberColumn("Change low", format="%+.2f"),
+            "High": st.column_config.NumberColumn("Change high", format="%+.2f"),
+            "BaseCount": st.column_config.NumberColumn(f"Values {_label(base)}"),
+            "TargetCount": st.column_config.NumberColumn(f"Values {_label(target)}"),
+        },
+    )
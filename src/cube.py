@@ -0,0 +1,189 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+
+from src.cache import RESULT_CACHE, count_lookup, selection_key
+from src.data import (
+    HASH_KEY,
+    LOAD_WORKERS,
+    concat_frames,
+    dataset_files,
+    dataset_hash,
+    derived_path,
+    is_multi_file,
+    read_dataset,
+    sort_categories,
+    stored_hash,
+)
+from src.filters import apply_filters
+
+# Grain of the pre-aggregated cube; every sidebar filter and chart axis is one of these
+CUBE_DIMENSIONS = [
+    "YearStart",
+    "YearEnd",
+    "Class",
+    "Topic",
+    "AgeGroup",
+    "DemographicCategory",
+    "Demographic",
+    "LocationAbbr",
+]
+
+# rows: number of raw rows, count: rows with a Data_Value, sum/sumsq: of Data_Value,
+# limits: rows with a Data_Value and both confidence limits, variance: sum of their squared standard errors
+MEASURE_COLUMNS = ["rows", "count", "sum", "sumsq", "limits", "variance"]
+
+# the columns a cube is aggregated from
+CUBE_INPUTS = CUBE_DIMENSIONS + ["Data_Value", "Low_Confidence_Limit", "High_Confidence_Limit"]
+
+# the published limits are 95% intervals: a row's standard error is their width over 2 z
+LIMITS_CONFIDENCE = 0.95
+LIMITS_Z = NormalDist().inv_cdf(0.5 + LIMITS_CONFIDENCE / 2)
+
+
+def cube_path(path: str | Path) -> Path:
+    return derived_path(path, ".cube.parquet")
+
+
+def to_measures(df: pd.DataFrame) -> pd.DataFrame:
+    """Raw rows as one-row measure records, the same shape as cube cells."""
+    # float64 whatever the source's dtype, so sums keep their precision
+    value = pd.to_numeric(df["Data_Value"], errors="coerce").astype("float64")
+    out = df[CUBE_DIMENSIONS].copy()
+    out["rows"] = 1
+    out["count"] = value.notna().astype("int64")
+    out["sum"] = value.fillna(0.0)
+    out["sumsq"] = out["sum"] ** 2
+    low = pd.to_numeric(df["Low_Confidence_Limit"], errors="coerce").astype("float64")
+    high = pd.to_numeric(df["High_Confidence_Limit"], errors="coerce").astype("float64")
+    se = (high - low).abs() / (2 * LIMITS_Z)
+    limited = value.notna() & se.notna()
+    out["limits"] = limited.astype("int64")
+    out["variance"] = (se**2).where(limited, 0.0)
+    out.attrs = dict(df.attrs)
+    return out
+
+
+def build_cube(df: pd.DataFrame) -> pd.DataFrame:
+    """Sum the measures over every observed combination of the cube dimensions."""
+    cube = (
+        to_measures(df)
+        .groupby(CUBE_DIMENSIONS, observed=True, dropna=False, sort=False)[MEASURE_COLUMNS]
+        .sum()
+        .reset_index()
+    )
+    cube.attrs = dict(df.attrs)
+    return cube
+
+
+def write_cube(cube: pd.DataFrame, out: str | Path, content_hash: str) -> None:
+    table = pa.Table.from_pandas(cube, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), HASH_KEY: content_hash.encode()})
+    out = Path(out)
+    tmp = out.with_name(out.name + ".tmp")
+    pq.write_table(table, tmp)
+    tmp.replace(out)
+
+
+def merge_cubes(cubes: list[pd.DataFrame]) -> pd.DataFrame:
+    """One cube from cubes of disjoint row sets, summing the cells they share."""
+    return (
+        concat_frames(cubes)
+        .groupby(CUBE_DIMENSIONS, observed=True, dropna=False, sort=False)[MEASURE_COLUMNS]
+        .sum()
+        .reset_index()
+    )
+
+
+def read_cube(path: str | Path) -> pd.DataFrame:
+    """Cube for the dataset at path, materialized next to its Parquet copy on first use.
+
+    A multi-file dataset's cube merges the per-file cubes, so a changed extract
+    only re-aggregates its own rows.
+    """
+    content_hash = dataset_hash(path)
+    out = cube_path(path)
+    if stored_hash(out) != content_hash or not set(MEASURE_COLUMNS) <= set(pq.read_schema(out).names):
+        # missing or stale, or written before a measure was added
+        if is_multi_file(path):
+            with ThreadPoolExecutor(LOAD_WORKERS) as pool:
+                cube = merge_cubes(list(pool.map(read_cube, dataset_files(path))))
+        else:
+            cube = build_cube(read_dataset(path, CUBE_INPUTS))
+        write_cube(cube, out, content_hash)
+
+    cube = sort_categories(pd.read_parquet(out))
+    cube.attrs["content_hash"] = content_hash
+    return cube
+
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def load_cube(path: str, content_hash: str | None = None) -> pd.DataFrame:
+    # content_hash only keys the cache, so a refreshed file is picked up without a restart
+    count_lookup(hit=False)
+    return read_cube(path)
+
+
+def update_cube(cube: pd.DataFrame, removed: pd.DataFrame, added: pd.DataFrame) -> pd.DataFrame:
+    """Apply a row delta to a cube: subtract the removed rows' measures and add the new ones."""
+    negated = to_measures(removed)
+    negated[MEASURE_COLUMNS] = -negated[MEASURE_COLUMNS]
+    parts = [cube[CUBE_DIMENSIONS + MEASURE_COLUMNS], negated, to_measures(added)]
+    categorical = [col for col in CUBE_DIMENSIONS if isinstance(cube[col].dtype, pd.CategoricalDtype)]
+    updated = (
+        pd.concat([part.astype({col: object for col in categorical}) for part in parts], ignore_index=True)
+        .groupby(CUBE_DIMENSIONS, dropna=False, sort=False)[MEASURE_COLUMNS]
+        .sum()
+        .reset_index()
+    )
+    updated = updated[updated["rows"] > 0].reset_index(drop=True)
+    return updated.astype({col: "category" for col in categorical})
+
+
+def slice_cube(cube: pd.DataFrame, selections: dict) -> pd.DataFrame | None:
+    """Cube cells inside the selection, or None when the selection cannot be rolled up."""
+    if selections.get("cap_outliers"):
+        # the percentile cap depends on individual rows' CI widths
+        return None
+
+    mask = np.ones(len(cube), dtype=bool)
+    if selections["AgeGroup"] != "All Age Groups":
+        mask &= (cube["AgeGroup"] == selections["AgeGroup"]).to_numpy()
+    if selections["Demographic"] != "All":
+        mask &= (cube["Demographic"] == selections["Demographic"]).to_numpy()
+    if selections["Topic"]:
+        mask &= cube["Topic"].isin(selections["Topic"]).to_numpy()
+    lo, hi = selections["rt_range"]
+    mask &= ((cube["YearStart"] >= lo) & (cube["YearEnd"] <= hi)).to_numpy()
+    return cube[mask].reset_index(drop=True)
+
+
+def select_measures(df: pd.DataFrame, cube: pd.DataFrame, selections: dict) -> tuple[pd.DataFrame, str]:
+    """Measure records for a selection and their source: "cube", or "raw" when it can't be rolled up."""
+
+    def _compute():
+        sliced = slice_cube(cube, selections)
+        if sliced is None:
+            return to_measures(apply_filters(df, selections)), "raw"
+        return sliced, "cube"
+
+    content_hash = df.attrs.get("content_hash")
+    if content_hash is None:
+        # a frame of unknown content shares no cached results
+        return _compute()
+    key = selection_key(selections, content_hash)
+    measures, source = RESULT_CACHE.get_or_compute((key, "measures"), _compute)
+    measures = measures.copy(deep=False)
+    measures.attrs = {**measures.attrs, "selection_key": key}
+    return measures, source
+
+
+def overall_mean(measures: pd.DataFrame) -> float:
+    count = measures["count"].sum()
+    return float(measures["sum"].sum() / count) if count else float("nan")
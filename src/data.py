@@ -1,10 +1,448 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import streamlit as st
 
+from src.cache import RESULT_CACHE, count_lookup
+
+logger = logging.getLogger(__name__)
+
+TARGET_CLASSES = ["Mental Health", "Cognitive Decline", "Smoking and Alcohol Use"]
+
+# Low-cardinality text columns, stored dictionary-encoded and loaded as categoricals
+DIMENSION_COLUMNS = ["Class", "Topic", "AgeGroup", "Demographic", "DemographicCategory", "LocationAbbr"]
+
+# Every column the dashboard reads
+APP_COLUMNS = [
+    "YearStart",
+    "YearEnd",
+    "LocationAbbr",
+    "LocationDesc",
+    "Class",
+    "Topic",
+    "Data_Value",
+    "Low_Confidence_Limit",
+    "High_Confidence_Limit",
+    "AgeGroup",
+    "DemographicCategory",
+    "Demographic",
+]
+
+# Held compactly once loaded: repeated text as categoricals and years as small ints. Measurements stay
+# float64: the percentile cap compares CI widths against a cutoff they can tie, and a float32 width lands
+# on the other side of it
+CATEGORY_COLUMNS = DIMENSION_COLUMNS + ["LocationDesc"]
+MEASUREMENT_COLUMNS = ["Data_Value", "Low_Confidence_Limit", "High_Confidence_Limit"]
+YEAR_COLUMNS = ["YearStart", "YearEnd"]
+
+HASH_KEY = b"content_hash"
+ROW_GROUP_SIZE = 64_000
+
+# A CSV's Parquet copy is a directory of parts, listed in row order by its manifest, so a refresh
+# (src.refresh) rewrites only the parts holding changed rows. Ingest writes parts of PART_ROWS rows.
+SNAPSHOT_MANIFEST = "manifest.json"
+PART_ROWS = ROW_GROUP_SIZE
+
+# Rows parsed per CSV chunk; bounds ingest memory independently of the file size
+CHUNK_ROWS = int(os.environ.get("DASHBOARD_CHUNK_ROWS", 100_000))
+
+# Threads hashing and reading the files of a multi-file dataset (a directory or glob of CSV extracts)
+LOAD_WORKERS = int(os.environ.get("DASHBOARD_LOAD_WORKERS", os.cpu_count() or 1))
+
+
+def file_hash(path: str | Path) -> str:
+    """sha256 of the raw file bytes, used as the dataset's content hash."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def is_multi_file(path: str | Path) -> bool:
+    return Path(path).is_dir() or glob.has_magic(str(path))
+
+
+def dataset_files(path: str | Path) -> list[Path]:
+    """The CSV files of a dataset, in the order their rows are combined: a file, a directory's *.csv, or a glob."""
+    if Path(path).is_dir():
+        names = glob.glob(os.path.join(glob.escape(str(path)), "*.csv"))
+    elif glob.has_magic(str(path)):
+        # derived .parquet files sit next to the extracts, so only CSVs count
+        names = [name for name in glob.glob(str(path)) if name.endswith(".csv")]
+    else:
+        return [Path(path)]
+    if not names:
+        raise FileNotFoundError(f"no CSV files match {path}")
+    # plain string order, the order DuckDB sorts file names in (src.backend)
+    return [Path(name) for name in sorted(names)]
+
+
+def derived_path(path: str | Path, suffix: str) -> Path:
+    """Where a file derived from the dataset lives: next to a single CSV, or in the directory a multi-file dataset is read from."""
+    if not is_multi_file(path):
+        return Path(path).with_suffix(suffix)
+    if Path(path).is_dir():
+        root = Path(path)
+    else:
+        # the deepest directory above the first wildcard
+        parts = Path(path).parts
+        root = Path(*parts[:next(i for i, part in enumerate(parts) if glob.has_magic(part))] or ["."])
+    # several globs may share a directory, so the name carries the spec
+    spec = hashlib.blake2b(str(path).encode(), digest_size=4).hexdigest()
+    return root / f"_combined-{spec}{suffix}"
+
+
+_hash_memo: dict[tuple, str] = {}
+
+
+def _memo_file_hash(path: Path) -> str:
+    """file_hash(), memoized on the file's size and modification time."""
+    stat = path.stat()
+    memo_key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _hash_memo:
+        _hash_memo[memo_key] = file_hash(path)
+    return _hash_memo[memo_key]
+
+
+def dataset_hash(path: str | Path) -> str:
+    """Content hash of a dataset: its file's hash, or one sha256 over every file's name and hash."""
+    if not is_multi_file(path):
+        return _memo_file_hash(Path(path))
+    files = dataset_files(path)
+    with ThreadPoolExecutor(LOAD_WORKERS) as pool:
+        hashes = list(pool.map(_memo_file_hash, files))
+    return combine_hashes(files, hashes)
+
+
+def combine_hashes(files: list[Path], hashes: list[str]) -> str:
+    """A multi-file dataset's content hash from its files, in dataset_files order, and their hashes."""
+    h = hashlib.sha256()
+    for file, file_digest in zip(files, hashes):
+        h.update(f"{file.name}:{file_digest}\n".encode())
+    return h.hexdigest()
+
+
+def columnar_path(path: str | Path) -> Path:
+    """Directory of the Parquet copy that sits next to a CSV export: its parts and their manifest."""
+    return Path(path).with_suffix(".parquet")
+
+
+def read_manifest(snapshot: str | Path) -> dict | None:
+    """A Parquet copy's manifest, or None if it has none.
+
+    content_hash: the CSV the copy holds; parts: {"file", "rows"} in row order;
+    header: sha256 of the CSV's header line; digests: whether each part has the
+    digests of its rows' CSV lines beside it (see line_digests).
+    """
+    try:
+        return json.loads((Path(snapshot) / SNAPSHOT_MANIFEST).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(snapshot: Path, manifest: dict, previous: dict | None) -> None:
+    """Switch the copy over to manifest's parts, then remove the parts two manifests back.
+
+    The previous manifest's parts outlive the switch, so a reader that listed them
+    just before can still open them.
+    """
+    manifest = {**manifest, "previous": [part["file"] for part in (previous or {}).get("parts", [])]}
+    tmp = snapshot / (SNAPSHOT_MANIFEST + ".tmp")
+    tmp.write_text(json.dumps(manifest))
+    tmp.replace(snapshot / SNAPSHOT_MANIFEST)
+    keep = {part["file"] for part in manifest["parts"]} | set(manifest["previous"])
+    for name in (previous or {}).get("previous", []):
+        if name not in keep:
+            for file in (snapshot / name, (snapshot / name).with_suffix(".npy")):
+                with suppress(OSError):
+                    file.unlink()
+
+
+def snapshot_hash(snapshot: str | Path) -> str | None:
+    """Content hash of the CSV a Parquet copy holds, or None if there is no copy."""
+    manifest = read_manifest(snapshot)
+    return None if manifest is None else manifest["content_hash"]
+
+
+def snapshot_parts(snapshot: str | Path) -> list[Path]:
+    """The part files of a Parquet copy, in row order; their names sort in the same order."""
+    manifest = read_manifest(snapshot) or {"parts": []}
+    return [Path(snapshot) / part["file"] for part in manifest["parts"]]
+
+
+def write_part(snapshot: Path, index: int, table: pa.Table, digests: np.ndarray | None = None) -> dict:
+    """Write one part of a Parquet copy, at position index, and its rows' line digests; returns its manifest entry."""
+    # a fresh name per write: a part is never changed in place, and the index keeps name order row order
+    name = f"p{index:06d}-{uuid.uuid4().hex[:8]}.parquet"
+    pq.write_table(table, snapshot / name, row_group_size=ROW_GROUP_SIZE)
+    if digests is not None:
+        np.save(snapshot / Path(name).with_suffix(".npy"), digests, allow_pickle=False)
+    return {"file": name, "rows": table.num_rows}
+
+
+def read_snapshot(
+    snapshot: str | Path, columns: list[str] | None = None, filters: ds.Expression | None = None
+) -> pd.DataFrame:
+    """Rows of a Parquet copy, its parts read as one table in row order."""
+    parts = snapshot_parts(snapshot)
+    if not parts:
+        return pd.DataFrame(columns=columns or [])
+    return pq.read_table([str(part) for part in parts], columns=columns, filters=filters).to_pandas()
+
+
+def columnar_paths(path: str | Path) -> list[Path]:
+    """Parquet parts of every file of the dataset in row order, (re)building stale copies on LOAD_WORKERS threads."""
+    def _fresh(file: Path) -> list[Path]:
+        content_hash = dataset_hash(file)
+        if snapshot_hash(columnar_path(file)) != content_hash:
+            ingest_csv(file, columnar_path(file), content_hash)
+        return snapshot_parts(columnar_path(file))
+
+    with ThreadPoolExecutor(LOAD_WORKERS) as pool:
+        return [part for parts in pool.map(_fresh, dataset_files(path)) for part in parts]
+
+
+def stored_hash(parquet_path: str | Path) -> str | None:
+    """Content hash recorded in a Parquet file's metadata, or None if it is missing."""
+    try:
+        metadata = pq.read_schema(parquet_path).metadata or {}
+    except (FileNotFoundError, pa.ArrowInvalid):
+        return None
+    value = metadata.get(HASH_KEY)
+    return value.decode() if value else None
+
+
+def line_digests(path: str | Path) -> tuple[bytes, np.ndarray]:
+    """Header line and a 64-bit digest per data line; nothing is parsed.
+
+    pandas' hash_array uses a fixed key, so digests stored with a Parquet copy
+    compare with those of a later export in another process.
+    """
+    digests = []
+    with open(path, "rb") as f:
+        header = f.readline()
+        tail = b""
+        for block in iter(lambda: f.read(1 << 24), b""):
+            lines = (tail + block).split(b"\n")
+            tail = lines.pop()
+            digests.append(pd.util.hash_array(np.array(lines, dtype=object)))
+        if tail:
+            digests.append(pd.util.hash_array(np.array([tail], dtype=object)))
+    return header, np.concatenate(digests) if digests else np.empty(0, dtype=np.uint64)
+
+
+def header_digest(header: bytes) -> str:
+    return hashlib.sha256(header).hexdigest()
+
+
+def _snapshot_schema(first: pa.Table) -> pa.Schema:
+    """Fixed Parquet schema taken from the first chunk, so every part matches.
+
+    Dimensions become dictionary<int32, string>; columns that are empty in the first
+    chunk are stored as strings, since their type can't be inferred yet.
+    """
+    fields = []
+    for field in first.schema:
+        if field.name in DIMENSION_COLUMNS:
+            fields.append(pa.field(field.name, pa.dictionary(pa.int32(), pa.string())))
+        elif first.column(field.name).null_count == first.num_rows:
+            fields.append(pa.field(field.name, pa.string()))
+        else:
+            fields.append(field.remove_metadata())
+    return pa.schema(fields)
+
+
+def ingest_csv(
+    path: str | Path,
+    out: str | Path | None = None,
+    content_hash: str | None = None,
+    chunksize: int = CHUNK_ROWS,
+) -> Path:
+    """Stream a CSV export into a Parquet copy with dictionary-encoded dimensions, one chunk at a time.
+
+    The copy is parts of PART_ROWS rows, each with the digests of its rows' CSV
+    lines beside it when lines and rows line up (no quoted line breaks), which is
+    what src.refresh diffs a new export against.
+    """
+    out = Path(out) if out else columnar_path(path)
+    content_hash = content_hash or file_hash(path)
+    if out.is_file():
+        # a single-file copy written before copies had parts
+        out.unlink()
+    out.mkdir(parents=True, exist_ok=True)
+    previous = read_manifest(out)
+    header, digests = line_digests(path)
+
+    # parts first, under fresh names; the manifest switches readers over to them last
+    parts, schema, buffer, offset = [], None, None, 0
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        schema = schema or _snapshot_schema(table)
+        buffer = table.cast(schema) if buffer is None else pa.concat_tables([buffer, table.cast(schema)])
+        while buffer.num_rows >= PART_ROWS:
+            parts.append(write_part(out, len(parts), buffer.slice(0, PART_ROWS), digests[offset : offset + PART_ROWS]))
+            buffer, offset = buffer.slice(PART_ROWS), offset + PART_ROWS
+    if buffer is not None and buffer.num_rows:
+        parts.append(write_part(out, len(parts), buffer, digests[offset:]))
+    rows = sum(part["rows"] for part in parts)
+
+    manifest = {
+        "content_hash": content_hash,
+        "header": header_digest(header),
+        "digests": rows == len(digests),
+        "parts": parts,
+    }
+    write_manifest(out, manifest, previous)
+    return out
+
+
+def row_filter() -> ds.Expression:
+    # same rows as the old `AgeGroup != "Overall"` + Class comparisons, so null AgeGroups are kept
+    age = ds.field("AgeGroup")
+    return ((age != "Overall") | age.is_null()) & ds.field("Class").isin(TARGET_CLASSES)
+
+
+def _keep_dashboard_rows(chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    for chunk in chunks:
+        yield chunk[(chunk["AgeGroup"] != "Overall") & chunk["Class"].isin(TARGET_CLASSES)]
+
+
+def _select_columns(chunks: Iterable[pd.DataFrame], columns: list[str] | None) -> Iterator[pd.DataFrame]:
+    for chunk in chunks:
+        chunk = chunk if columns is None else chunk[columns]
+        dims = [col for col in DIMENSION_COLUMNS if col in chunk.columns]
+        yield chunk.astype({col: "category" for col in dims})
+
+
+def concat_frames(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """pd.concat that unions categorical dictionaries instead of falling back to object dtype."""
+    if not frames:
+        return pd.DataFrame()
+    frames = list(frames)
+    for col in frames[0].columns:
+        if all(isinstance(f[col].dtype, pd.CategoricalDtype) for f in frames):
+            categories = pd.api.types.union_categoricals([f[col] for f in frames], ignore_order=True).categories
+            frames = [f.assign(**{col: f[col].cat.set_categories(categories)}) for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def sort_categories(df: pd.DataFrame) -> pd.DataFrame:
+    """Put categorical dictionaries in lexical order, so group-bys sort like plain strings.
+
+    Chunked ingest builds dictionaries in order of first appearance.
+    """
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].cat.reorder_categories(sorted(df[col].cat.categories))
+    return df
+
+
+def read_csv_streaming(path: str | Path, columns: list[str] | None = None, chunksize: int = CHUNK_ROWS) -> pd.DataFrame:
+    """Dashboard rows straight from the CSV, parsed in bounded chunks.
+
+    Only `columns` (plus the predicate columns) are parsed, the Class/AgeGroup
+    predicates run per chunk, and only the compact survivors are kept.
+    """
+    usecols = None if columns is None else list(dict.fromkeys([*columns, "AgeGroup", "Class"]))
+    chunks = pd.read_csv(path, usecols=usecols, chunksize=chunksize)
+    df = sort_categories(concat_frames(list(_select_columns(_keep_dashboard_rows(chunks), columns))))
+    df.attrs["content_hash"] = dataset_hash(path)
+    return df
+
+
+def read_dataset(path: str | Path, columns: list[str] | None = None) -> pd.DataFrame:
+    """Read the dashboard rows through the Parquet copy, (re)building it when the CSV changed.
+
+    A directory or glob is read file by file on LOAD_WORKERS threads, each through
+    its own Parquet copy, and the rows are combined in file order under one hash.
+    """
+    if is_multi_file(path):
+        files = dataset_files(path)
+        with ThreadPoolExecutor(LOAD_WORKERS) as pool:
+            frames = list(pool.map(lambda file: read_dataset(file, columns), files))
+        # extracts hold different subsets of each dimension; concat_frames unions their dictionaries
+        df = sort_categories(concat_frames(frames))
+        df.attrs["content_hash"] = dataset_hash(path)
+        return df
+
+    content_hash = dataset_hash(path)
+    snapshot = columnar_path(path)
+    if snapshot_hash(snapshot) != content_hash:
+        try:
+            ingest_csv(path, snapshot, content_hash)
+        except OSError:
+            # read-only deployment: no Parquet copy, but still never hold the whole CSV
+            return read_csv_streaming(path, columns)
+
+    df = sort_categories(read_snapshot(snapshot, columns, row_filter()))
+    df.attrs["content_hash"] = content_hash
+    return df
+
+
+def compact_frame(df: pd.DataFrame, columns: list[str] | None = None) -> pd.DataFrame:
+    """df reduced to `columns` with the smallest dtypes that hold its values.
+
+    Data_Value and the confidence limits are float64 whatever the source gave, so
+    CI widths, the cap cutoff and means are those of the uncompacted values.
+    """
+    if columns is not None:
+        df = df[columns]
+    dtypes = {}
+    for col in df.columns:
+        if col in CATEGORY_COLUMNS and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            dtypes[col] = "category"
+        elif col in MEASUREMENT_COLUMNS:
+            dtypes[col] = "float64"
+        elif col in YEAR_COLUMNS:
+            # missing years only fit a float; 2015..2022 fit int16
+            dtypes[col] = "float32" if df[col].hasnans else "int16"
+    out = sort_categories(df.astype(dtypes))
+    out.attrs = dict(df.attrs)
+    return out
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """Per-column dtype and deep memory of a frame before and after compact_frame, plus a total row."""
+    mb_before = before.memory_usage(deep=True, index=False) / 2**20
+    mb_after = after.memory_usage(deep=True, index=False).reindex(mb_before.index, fill_value=0) / 2**20
+    report = pd.DataFrame({
+        "dtype_before": before.dtypes.astype(str),
+        "dtype_after": after.dtypes.astype(str).reindex(mb_before.index, fill_value="dropped"),
+        "mb_before": mb_before,
+        "mb_after": mb_after,
+    })
+    report.loc["total"] = ["", "", mb_before.sum(), mb_after.sum()]
+    return report.round({"mb_before": 3, "mb_after": 3})
+
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def load_data(path: str, columns: list[str] | None = None, content_hash: str | None = None) -> pd.DataFrame:
+    # content_hash only keys the cache, so a refreshed file is picked up without a restart
+    count_lookup(hit=False)
+
+    def _load():
+        df = read_dataset(path, columns)
+        compact = compact_frame(df)
+        total = memory_report(df, compact).loc["total"]
+        logger.info("loaded %d rows: %.1f MB, %.1f MB compacted", len(df), total["mb_before"], total["mb_after"])
+        return compact
 
-@st.cache_data(show_spinner=False)
-def load_data(path: str) -> pd.DataFrame:
-    df = pd.read_csv(path)
-    df = df[df["AgeGroup"] != "Overall"]
-    df = df[(df['Class'] == 'Mental Health') | (df['Class'] == 'Cognitive Decline') | (df['Class'] == 'Smoking and Alcohol Use')]
-    return df
\ No newline at end of file
+    disk = RESULT_CACHE.disk
+    if content_hash is None or disk is None:
+        return _load()
+    # another worker, or this one before a restart, may have compacted this version already
+    return disk.get_or_compute(((content_hash, None if columns is None else tuple(columns)), "frame"), _load)
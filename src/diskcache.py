@@ -0,0 +1,283 @@
+"""Results kept in a local directory, shared by every worker process and kept across restarts.
+
+The in-memory caches are per process; this tier sits behind them, so a second
+worker, or the same one after a redeploy, loads what another already computed.
+Keys are those of the result cache, (selection key, stage), whose selection key
+starts with the dataset's content hash, so entries of an older dataset are
+never read again and simply age out. CACHE_VERSION goes into every file's
+digest the same way, so entries an older release of the app wrote, whose
+values may have another shape, are never read either.
+
+Each entry is one file: a pickle, or for large arrays an .npy file that is
+memory-mapped on read. A SQLite index in the same directory records each file's
+size and last use; writers evict least recently used entries past the size
+limit inside one transaction, so concurrent processes agree on what is kept.
+Entries are pickles: the directory must only be writable by the app.
+
+Nothing touches the disk until the app asks for the cache (get_disk_cache), and
+the directory sits next to the dataset, not in the working directory. Writes are
+queued for a background thread that pickles them and indexes a batch per
+transaction, so a rerun that missed never waits on the disk.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing, suppress
+from pathlib import Path
+from typing import Any, Callable, Hashable
+
+import numpy as np
+import streamlit as st
+
+logger = logging.getLogger(__name__)
+
+# "" turns the disk tier off; a relative directory is taken from the dataset's directory
+DISK_CACHE_DIR = os.environ.get("DASHBOARD_DISK_CACHE", "cache")
+DEFAULT_DISK_BUDGET_MB = 1024
+
+# writes waiting for the writer thread; past this many, new ones are dropped rather than queued
+WRITE_QUEUE = 64
+# writes indexed per transaction
+WRITE_BATCH = 16
+
+# bump when a cached stage's value changes shape
+CACHE_VERSION = 1
+
+# arrays at least this large are stored as .npy and memory-mapped instead of unpickled
+MMAP_MIN_BYTES = 2**20
+
+# files no index row points to, left by a process that died mid-write, are removed once this old
+ORPHAN_SECONDS = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    digest TEXT PRIMARY KEY,
+    file TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+
+def _digest(key: Hashable) -> str:
+    # keys are tuples of strings, numbers and booleans, whose repr is the same in every process
+    return hashlib.sha256(repr((CACHE_VERSION, key)).encode()).hexdigest()
+
+
+def _write(path: Path, value: Any) -> None:
+    with open(path, "xb") as f:
+        if path.suffix == ".npy":
+            np.save(f, value, allow_pickle=False)
+        else:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _read(path: Path) -> Any:
+    if path.suffix == ".npy":
+        return np.load(path, mmap_mode="r", allow_pickle=False)
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+class DiskCache:
+    """LRU cache of picklable values in a directory, bounded by total file size; a no-op when the directory is unusable."""
+
+    def __init__(self, directory: str | Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.available = True
+        self.hits = 0
+        self.misses = 0
+        self._pending = queue.Queue(maxsize=WRITE_QUEUE)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with closing(sqlite3.connect(self.directory / "index.sqlite", timeout=5)) as con:
+                # readers then never wait for a writer in another process
+                con.execute("PRAGMA journal_mode=WAL")
+                con.execute(_SCHEMA)
+            self._remove_orphans()
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("results will not be cached on disk, %s is not usable: %s", self.directory, e)
+            self.available = False
+
+    def _connect(self) -> sqlite3.Connection:
+        # a connection per call: sessions run on separate threads and sqlite3 connections are per thread
+        return sqlite3.connect(self.directory / "index.sqlite", timeout=5, isolation_level=None)
+
+    def _remove_orphans(self) -> None:
+        with closing(self._connect()) as con:
+            known = {file for (file,) in con.execute("SELECT file FROM entries")}
+        cutoff = time.time() - ORPHAN_SECONDS
+        for path in self.directory.iterdir():
+            # another process may be sweeping or evicting the same files
+            with suppress(OSError):
+                if path.suffix in (".pkl", ".npy") and path.name not in known and path.stat().st_mtime < cutoff:
+                    path.unlink()
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        if not self.available:
+            return False, None
+        digest = _digest(key)
+        try:
+            with closing(self._connect()) as con:
+                row = con.execute("SELECT file FROM entries WHERE digest = ?", (digest,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return False, None
+                try:
+                    value = _read(self.directory / row[0])
+                except (OSError, EOFError, ValueError, AttributeError, ImportError, pickle.UnpicklingError):
+                    # evicted by another process between the lookup and the read, or cut short
+                    con.execute("DELETE FROM entries WHERE digest = ? AND file = ?", (digest, row[0]))
+                    self.misses += 1
+                    return False, None
+                con.execute("UPDATE entries SET last_used = ? WHERE digest = ?", (time.time(), digest))
+        except sqlite3.Error as e:
+            logger.warning("disk cache %s: %s", self.directory, e)
+            return False, None
+        self.hits += 1
+        return True, value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Queue value for the writer thread; cached values are never mutated, so it can pickle them later."""
+        if not self.available:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="disk-cache-writer", daemon=True)
+                self._writer.start()
+        try:
+            self._pending.put_nowait((key, value))
+        except queue.Full:
+            logger.debug("disk cache writes are behind, not caching %r", key)
+
+    def flush(self) -> None:
+        """Wait until every queued write is on disk."""
+        self._pending.join()
+
+    def _write_loop(self) -> None:
+        while True:
+            batch = [self._pending.get()]
+            while len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._store(batch)
+            except Exception:
+                logger.exception("disk cache %s: writing %d entries failed", self.directory, len(batch))
+            finally:
+                for _ in batch:
+                    self._pending.task_done()
+
+    def _store(self, batch: list[tuple[Hashable, Any]]) -> None:
+        """Write a batch of entries' files, then index them and evict in one transaction."""
+        written = []
+        for key, value in batch:
+            large_array = isinstance(value, np.ndarray) and value.dtype != object and value.nbytes >= MMAP_MIN_BYTES
+            digest = _digest(key)
+            # a fresh name per write, so a file is only ever removed by whoever drops its index row
+            path = self.directory / f"{digest}-{uuid.uuid4().hex}{'.npy' if large_array else '.pkl'}"
+            try:
+                _write(path, value)
+                size = path.stat().st_size
+            except (OSError, pickle.PicklingError, TypeError, AttributeError) as e:
+                path.unlink(missing_ok=True)
+                logger.warning("not caching %r on disk: %s", key, e)
+                continue
+            if size > self.max_bytes:
+                path.unlink()
+                continue
+            written.append((digest, path, size))
+        if not written:
+            return
+
+        try:
+            with closing(self._connect()) as con:
+                con.execute("BEGIN IMMEDIATE")
+                try:
+                    stale = []
+                    for digest, path, size in written:
+                        stale += [file for (file,) in con.execute("SELECT file FROM entries WHERE digest = ?", (digest,))]
+                        con.execute(
+                            "INSERT OR REPLACE INTO entries (digest, file, bytes, last_used) VALUES (?, ?, ?, ?)",
+                            (digest, path.name, size, time.time()),
+                        )
+                    stale += self._evict(con)
+                    con.execute("COMMIT")
+                except BaseException:
+                    con.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            logger.warning("disk cache %s: %s", self.directory, e)
+            for _, path, _ in written:
+                path.unlink(missing_ok=True)
+            return
+        for file in stale:
+            # a process still holding a memory map of the file keeps its data until it lets go
+            with suppress(OSError):
+                (self.directory / file).unlink()
+
+    def _evict(self, con: sqlite3.Connection) -> list[str]:
+        """Drop least recently used rows until the total fits max_bytes; returns their files."""
+        (total,) = con.execute("SELECT COALESCE(SUM(bytes), 0) FROM entries").fetchone()
+        evicted = []
+        if total <= self.max_bytes:
+            return evicted
+        for digest, file, size in con.execute("SELECT digest, file, bytes FROM entries ORDER BY last_used"):
+            evicted.append((digest, file))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        con.executemany("DELETE FROM entries WHERE digest = ? AND file = ?", evicted)
+        return [file for _, file in evicted]
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        found, value = self.get(key)
+        if not found:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def stats(self) -> dict:
+        entries, size = 0, 0
+        if self.available:
+            try:
+                with closing(self._connect()) as con:
+                    entries, size = con.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM entries").fetchone()
+            except sqlite3.Error:
+                pass
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def disk_cache_dir(data_path: str | Path) -> Path | None:
+    """Where the disk tier for the dataset at data_path lives, or None when DASHBOARD_DISK_CACHE turns it off."""
+    if not DISK_CACHE_DIR:
+        return None
+    # a directory or glob of extracts has its parent directory, the same as a single file
+    return Path(data_path).parent / DISK_CACHE_DIR
+
+
+@st.cache_resource(show_spinner=False)
+def get_disk_cache(data_path: str) -> DiskCache | None:
+    directory = disk_cache_dir(data_path)
+    if directory is None:
+        return None
+    return DiskCache(directory, int(float(os.environ.get("DASHBOARD_DISK_CACHE_MB", DEFAULT_DISK_BUDGET_MB)) * 2**20))
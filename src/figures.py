@@ -0,0 +1,146 @@
+"""Chart data and figures as plain functions of measure records; nothing here draws.
+
+src.charts renders these in the app, src.report writes them to files.
+"""
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from src.aggregate import group_totals, label_mask
+from src.cube import overall_mean
+
+VALID_STATES = [
+    "AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "FL", "GA", "HI", "ID", "IL", "IN", "IA",
+    "KS", "KY", "LA", "ME", "MD", "MA", "MI", "MN", "MS", "MO", "MT", "NE", "NV", "NH", "NJ",
+    "NM", "NY", "NC", "ND", "OH", "OK", "OR", "PA", "RI", "SC", "SD", "TN", "TX", "UT", "VT",
+    "VA", "WA", "WV", "WI", "WY"
+]
+
+# state maps: green to red for prevalence, blue to red for a change centred on zero
+STATE_SCALE = [(0, "green"), (0.5, "yellow"), (1, "red")]
+DELTA_SCALE = "RdBu_r"
+
+
+# AGGREGATIONS
+# each is a few bincounts over measure records (src.aggregate); the frames built from them are chart-sized
+def yearly_trend(df: pd.DataFrame) -> tuple[pd.DataFrame, float]:
+    """Mean Data_Value per YearEnd as Percent, and the mean over all years."""
+    years = group_totals(df, "YearEnd")
+    yearly = pd.DataFrame({"YearEnd": years.labels, "Percent": years.mean})
+    return yearly, overall_mean(df)
+
+
+def demographic_counts(df: pd.DataFrame, category: str) -> pd.DataFrame:
+    """Rows per Demographic within one DemographicCategory, largest first."""
+    groups = group_totals(df, "Demographic", where=label_mask(df["DemographicCategory"], [category]))
+    counts = pd.DataFrame({"Demographic": groups.labels, "Count": groups.rows})
+    return counts.sort_values("Count", ascending=False)
+
+
+def state_counts(df: pd.DataFrame) -> pd.DataFrame:
+    """Rows per LocationAbbr."""
+    states = group_totals(df, "LocationAbbr")
+    return pd.DataFrame({"LocationAbbr": states.labels, "Count": states.rows})
+
+
+def state_percentage(df: pd.DataFrame, states: list[str]) -> pd.DataFrame:
+    """Rows per state as a share of all rows in the given states."""
+    groups = group_totals(df, "LocationAbbr", where=label_mask(df["LocationAbbr"], states))
+    df_percentage = pd.DataFrame({"LocationAbbr": groups.labels, "Count": groups.rows})
+    df_percentage["Percentage"] = 100 * df_percentage["Count"] / df_percentage["Count"].sum()
+    return df_percentage
+
+
+# FIGURES
+def response_trend_figure(yearly: pd.DataFrame, overall_avg: float) -> go.Figure:
+    fig = px.line(
+        yearly,
+        x="YearEnd",
+        y="Percent",
+        labels={"YearEnd": "year"},
+        markers=True,
+        title=None,
+    )
+
+    fig.add_hline(
+        y=overall_avg,
+        line_dash="dash",
+        line_color="#f5d76e",
+        annotation_text=f"Overall Avg: {overall_avg:.2f}%",
+        annotation_position="bottom right"
+    )
+
+    fig.update_xaxes(dtick=1)
+    fig.update_yaxes(ticksuffix="%", rangemode="tozero")
+    fig.update_traces(line=dict(width=2, color="#6b9fd4"), marker=dict(size=8))
+    fig.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
+    return fig
+
+
+def demographic_bar_figure(agg: pd.DataFrame, label: str) -> go.Figure:
+    """Bar per Demographic from demographic_counts; label names the axis (Race/Ethnicity, Sex)."""
+    fig = px.bar(
+        agg,
+        x="Demographic",
+        labels={"Demographic": label},
+        y="Count",
+        title=None,
+        color_discrete_sequence=["#6b9fd4"],
+    )
+    fig.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
+    return fig
+
+
+def map_figure(
+    counts: pd.DataFrame,
+    color: str = "Count",
+    label: str = "Number of Responses",
+    scale: list | str = STATE_SCALE,
+    midpoint: float | None = None,
+    hover: list[str] | None = None,
+) -> go.Figure:
+    """Choropleth of one value per LocationAbbr; midpoint centres a diverging scale."""
+    fig = px.choropleth(
+        counts,
+        locations="LocationAbbr",
+        locationmode="USA-states",
+        color=color,
+        scope="usa",
+        color_continuous_scale=scale,
+        color_continuous_midpoint=midpoint,
+        hover_data=hover,
+        labels={color: label}
+    )
+
+    fig.update_layout(
+        height=600,
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        geo=dict(bgcolor="rgba(0,0,0,0)"),
+    )
+    return fig
+
+
+def radial_bar_figure(df_sorted: pd.DataFrame, value_col: str = "Percentage") -> go.Figure:
+    fig = px.bar_polar(
+        df_sorted,
+        r=value_col,  # radial length = percentage
+        theta="LocationAbbr",  # angle = state
+        color=value_col,  # color intensity = value
+        color_continuous_scale=px.colors.sequential.Oranges,
+        template="ggplot2",
+        hover_data = {"LocationAbbr": True, value_col: ":.2f"}
+    )
+
+    fig.update_layout(
+        height=600,
+        font=dict(size=12),
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        polar = dict(
+            radialaxis=dict(
+                tickfont=dict(size=14, color="black")
+            )
+        )
+    )
+    return fig
@@ -1,14 +1,48 @@
+from dataclasses import dataclass
+
+import numpy as np
 import pandas as pd
 import streamlit as st
 import plotly.express as px
 
-def render_filters(df: pd.DataFrame) -> dict:
-    """Rendering filter widgets and returning the chosen values."""
+from src.cache import RESULT_CACHE, selection_key
+from src.sketch import build_sketch, merged_quantile, select_points
+from src.views import get_view_store
+
+# Columns with an equality / membership filter in the sidebar
+INDEXED_COLUMNS = ["AgeGroup", "Demographic", "Topic"]
+
+# "Cap extreme data values" drops rows whose CI width is above this quantile
+CAP_QUANTILE = 0.99
+
+# the "Switch View" entry that is no saved view
+DEFAULT_VIEW = "Default View/ Full Dataset"
+
+@dataclass(frozen=True)
+class FilterOptions:
+    """What the sidebar shows for a selection: the year bounds, and option_counts' counts and totals."""
+    years: tuple[int, int]
+    counts: dict[str, dict[str, int]]
+    totals: dict[str, int]
+
+
+def render_filters(backend, options: FilterOptions | None = None) -> dict:
+    """Rendering filter widgets and returning the chosen values.
+
+    backend (src.backend) supplies the year bounds and option counts; options
+    stands in for it when the sidebar still shows the selection they were
+    computed for (a snapshot of the default view, src.snapshot).
+    """
 
     st.sidebar.header("Filters")
 
     # --- Initialize saved_views ---
-    if "saved_views" not in st.session_state:
+    # stored views are shared by every session and survive restarts; read afresh each rerun, so a view
+    # deleted in another session is gone here too. Without a usable store, views live in this session only
+    store = get_view_store()
+    if store.available:
+        st.session_state.saved_views = store.views()
+    elif "saved_views" not in st.session_state:
         st.session_state.saved_views = {}
 
     if "active_view" not in st.session_state:
@@ -16,7 +50,7 @@ def render_filters(df: pd.DataFrame) -> dict:
 
     # --- Determine selected view ---
     saved_keys = list(st.session_state.saved_views.keys())
-    selected_view = st.sidebar.selectbox("Switch View", ["Default View/ Full Dataset"] + saved_keys, key="active_view")
+    selected_view = st.sidebar.selectbox("Switch View", [DEFAULT_VIEW] + saved_keys, key="active_view")
 
     # selected view?
     if "last_active_view" not in st.session_state:
@@ -26,6 +60,7 @@ def render_filters(df: pd.DataFrame) -> dict:
 
         if st.session_state.active_view in st.session_state.saved_views:
             saved = st.session_state.saved_views[st.session_state.active_view]
+            store.record_use(st.session_state.active_view)
 
             for key, value in saved.items():
                 st.session_state[key] = value
@@ -34,6 +69,8 @@ def render_filters(df: pd.DataFrame) -> dict:
         st.rerun()
 
     # --- Prepare defaults ---
+    min_rt, max_rt = options.years if options is not None else backend.year_bounds()
+
     if st.session_state.active_view in st.session_state.saved_views:
         defaults = st.session_state.saved_views[st.session_state.active_view]
     else:
@@ -41,29 +78,49 @@ def render_filters(df: pd.DataFrame) -> dict:
             "AgeGroup": st.session_state.get("AgeGroup", "All Age Groups"),
             "Demographic": st.session_state.get("Demographic", "All"),
             "Topic": st.session_state.get("Topic", []),
-            "rt_range": st.session_state.get(
-                "rt_range", (int(df["YearStart"].min()), int(df["YearEnd"].max()))
-            ),
+            "rt_range": st.session_state.get("rt_range", (min_rt, max_rt)),
             "cap_outliers": st.session_state.get("cap_outliers", False),
         }
 
+    # what the widgets will show: a saved view's values until the user changes one of them
+    current = {key: st.session_state.get(key, value) for key, value in defaults.items()}
+
+    # rows each option would match under the other filters; options matching none are hidden unless chosen
+    if options is None:
+        options = backend.filter_options(current)
+    counts, totals = options.counts, options.totals
+
+    def _options(col: str, chosen: list) -> list[str]:
+        return [value for value, count in counts[col].items() if count or value in chosen]
+
+    def _label(col: str, all_label: str | None = None):
+        def _format(value: str) -> str:
+            count = totals[col] if value == all_label else counts[col].get(value, 0)
+            return f"{value} ({count:,})"
+        return _format
+
     # --- Render widgets with defaults ---
-    age_options = ["All Age Groups"] + sorted(df["AgeGroup"].unique())
-    age_index = age_options.index(defaults["AgeGroup"]) if defaults["AgeGroup"] in age_options else 0
-    ageGroup = st.sidebar.selectbox("Age Group", age_options, index=age_index, key="AgeGroup")
+    age_options = ["All Age Groups"] + _options("AgeGroup", [current["AgeGroup"]])
+    age_index = age_options.index(current["AgeGroup"]) if current["AgeGroup"] in age_options else 0
+    ageGroup = st.sidebar.selectbox(
+        "Age Group", age_options, index=age_index, format_func=_label("AgeGroup", "All Age Groups"), key="AgeGroup"
+    )
 
-    dem_options = ["All"] + sorted(df["Demographic"].dropna().astype(str).unique())
-    dem_index = dem_options.index(defaults["Demographic"]) if defaults["Demographic"] in dem_options else 0
-    demographic = st.sidebar.selectbox("Sex/Ethnicity", dem_options, index=dem_index, key="Demographic")
+    dem_options = ["All"] + _options("Demographic", [current["Demographic"]])
+    dem_index = dem_options.index(current["Demographic"]) if current["Demographic"] in dem_options else 0
+    demographic = st.sidebar.selectbox(
+        "Sex/Ethnicity", dem_options, index=dem_index, format_func=_label("Demographic", "All"), key="Demographic"
+    )
 
-    topic_options = sorted(df["Topic"].dropna().astype(str).unique())
-    topic = st.sidebar.multiselect("Topic", topic_options, default=defaults["Topic"], key="Topic")
+    topic_options = _options("Topic", current["Topic"])
+    topic_default = [t for t in current["Topic"] if t in topic_options]
+    topic = st.sidebar.multiselect(
+        "Topic", topic_options, default=topic_default, format_func=_label("Topic"), key="Topic"
+    )
 
-    min_rt = int(df["YearStart"].dropna().min())
-    max_rt = int(df["YearEnd"].dropna().max())
-    rt_range = st.sidebar.slider("Year Range", min_rt, max_rt, value=defaults["rt_range"], step=1, key="rt_range")
+    rt_range = st.sidebar.slider("Year Range", min_rt, max_rt, value=current["rt_range"], step=1, key="rt_range")
 
-    cap_outliers = st.sidebar.checkbox("Cap extreme data values", value=defaults["cap_outliers"], key="cap_outliers")
+    cap_outliers = st.sidebar.checkbox("Cap extreme data values", value=current["cap_outliers"], key="cap_outliers")
 
     # --- Save view section ---
     st.sidebar.markdown("---")
@@ -78,17 +135,25 @@ def render_filters(df: pd.DataFrame) -> dict:
             "rt_range": rt_range,
             "cap_outliers": cap_outliers,
         }
+        store.save(view_name, st.session_state.saved_views[view_name])
         st.sidebar.success("View saved!")
 
     st.sidebar.markdown("---")
-    st.sidebar.subheader('Clear Session?')
-    st.sidebar.subheader("Warning! This clears your saved views")
+    st.sidebar.subheader("Delete Views?")
+    st.sidebar.subheader("Warning! Saved views are shared, these delete them for everyone")
 
-    if st.sidebar.button("Clear All Saved Views and restore to default view"):
-        st.session_state.saved_views = {}
-        st.session_state.last_active_view = ""
-        st.sidebar.success("All saved views cleared!")
-        st.rerun()
+    st.sidebar.button(
+        "Delete selected view and restore to default view",
+        on_click=_delete_view,
+        args=(store, st.session_state.active_view),
+        disabled=st.session_state.active_view not in st.session_state.saved_views,
+    )
+    st.sidebar.button(
+        "Clear All Saved Views and restore to default view",
+        on_click=_clear_views,
+        args=(store,),
+        disabled=not st.session_state.saved_views,
+    )
 
     return {
         "AgeGroup": ageGroup,
@@ -99,24 +164,226 @@ def render_filters(df: pd.DataFrame) -> dict:
     }
 
 
-def apply_filters(df: pd.DataFrame, selections: dict) -> pd.DataFrame:
-    out = df.copy()
+def _restore_default_view() -> None:
+    # a callback runs before the widgets are drawn, so the view switch and the filters can still be reset
+    st.session_state.active_view = DEFAULT_VIEW
+    st.session_state.last_active_view = DEFAULT_VIEW
+    for key in ("AgeGroup", "Demographic", "Topic", "rt_range", "cap_outliers"):
+        st.session_state.pop(key, None)
+
+
+def _delete_view(store, name: str) -> None:
+    store.delete(name)
+    st.session_state.saved_views.pop(name, None)
+    _restore_default_view()
+    st.toast(f"Saved view {name!r} deleted")
+
+
+def _clear_views(store) -> None:
+    store.clear()
+    st.session_state.saved_views = {}
+    _restore_default_view()
+    st.toast("All saved views cleared")
+
+
+@dataclass
+class FilterIndex:
+    """Row bitmaps per dimension value plus sorted year arrays for one loaded dataset."""
+    n_rows: int
+    bitmaps: dict[str, dict[str, np.ndarray]]  # column -> value -> np.packbits row mask
+    stacks: dict[str, np.ndarray]  # column -> the column's bitmaps as rows, in sorted value order
+    start_order: np.ndarray  # row positions ordered by YearStart, missing years dropped
+    start_sorted: np.ndarray
+    end_order: np.ndarray  # row positions ordered by YearEnd, missing years dropped
+    end_sorted: np.ndarray
+    ci_width: np.ndarray | None
+    ci_sketch: pd.DataFrame | None  # per-slice quantile sketch of ci_width
+
+
+def _sorted_years(values: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    years = values.to_numpy(dtype="float64", na_value=np.nan)
+    order = np.argsort(years, kind="stable")
+    valid = int(np.count_nonzero(~np.isnan(years)))
+    order = order[:valid]
+    return order, years[order]
+
+
+def build_filter_index(df: pd.DataFrame) -> FilterIndex:
+    """One pass over the dimension columns; every later filter is bitmap arithmetic."""
+    bitmaps, stacks = {}, {}
+    for col in INDEXED_COLUMNS:
+        codes, uniques = pd.factorize(df[col], sort=True)
+        stack = np.empty((len(uniques), (len(df) + 7) // 8), dtype=np.uint8)
+        for i in range(len(uniques)):
+            stack[i] = np.packbits(codes == i)
+        stacks[col] = stack
+        # the dictionaries are sorted once here; the sidebar lists their keys in order
+        bitmaps[col] = {str(value): stack[i] for i, value in enumerate(uniques)}
+
+    start_order, start_sorted = _sorted_years(df["YearStart"])
+    end_order, end_sorted = _sorted_years(df["YearEnd"])
+
+    ci_width = ci_sketch = None
+    if {"Low_Confidence_Limit", "High_Confidence_Limit"} <= set(df.columns):
+        # subtracted in float64 whatever the frame holds, so every caller caps at the same widths
+        high = df["High_Confidence_Limit"].to_numpy(dtype="float64", na_value=np.nan)
+        low = df["Low_Confidence_Limit"].to_numpy(dtype="float64", na_value=np.nan)
+        ci_width = np.abs(high - low)
+        ci_sketch = build_sketch(df, ci_width)
+
+    return FilterIndex(len(df), bitmaps, stacks, start_order, start_sorted, end_order, end_sorted, ci_width, ci_sketch)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _cached_index(content_hash: str, n_rows: int, _df: pd.DataFrame) -> FilterIndex:
+    return build_filter_index(_df)
+
+
+def get_filter_index(df: pd.DataFrame) -> FilterIndex:
+    """Index for a loaded dataset, built once per content hash."""
+    content_hash = df.attrs.get("content_hash")
+    if content_hash is None:
+        return build_filter_index(df)
+    return _cached_index(content_hash, len(df), df)
+
+
+def year_bounds(index: FilterIndex) -> tuple[int, int]:
+    """First YearStart and last YearEnd in the dataset: the year slider's range."""
+    return int(index.start_sorted[0]), int(index.end_sorted[-1])
+
+
+def default_selections(index: FilterIndex) -> dict:
+    """The selection of "Default View/ Full Dataset": no filters over every year."""
+    return {
+        "AgeGroup": "All Age Groups",
+        "Demographic": "All",
+        "Topic": [],
+        "rt_range": year_bounds(index),
+        "cap_outliers": False,
+    }
+
+
+def _year_mask(index: FilterIndex, lo: int, hi: int) -> np.ndarray | None:
+    """Rows with YearStart >= lo and YearEnd <= hi, or None when every row qualifies."""
+    first = np.searchsorted(index.start_sorted, lo, side="left")
+    last = np.searchsorted(index.end_sorted, hi, side="right")
+    if first == 0 and last == len(index.end_sorted) and len(index.start_sorted) == len(index.end_sorted) == index.n_rows:
+        return None
+
+    start_ok = np.zeros(index.n_rows, dtype=bool)
+    start_ok[index.start_order[first:]] = True
+    end_ok = np.zeros(index.n_rows, dtype=bool)
+    end_ok[index.end_order[:last]] = True
+    return start_ok & end_ok
+
+
+def cap_cutoff(index: FilterIndex, selections: dict) -> tuple[float, float]:
+    """CI-width cutoff for the percentile cap, merged from the slice sketches, and its rank-error bound."""
+    return merged_quantile(*select_points(index.ci_sketch, selections), CAP_QUANTILE)
+
+
+def _and(current: np.ndarray | None, other: np.ndarray) -> np.ndarray:
+    return other if current is None else np.bitwise_and(current, other)
+
+
+def _dimension_bits(index: FilterIndex, selections: dict) -> dict[str, np.ndarray]:
+    """Packed row mask of every active sidebar filter, by column."""
+    empty = np.zeros((index.n_rows + 7) // 8, dtype=np.uint8)
+    bits = {}
 
     if selections["AgeGroup"] != "All Age Groups":
-        out = out[out["AgeGroup"] == selections["AgeGroup"]]
+        bits["AgeGroup"] = index.bitmaps["AgeGroup"].get(selections["AgeGroup"], empty)
 
     if selections["Demographic"] != "All":
-        out = out[out["Demographic"] == selections["Demographic"]]
+        bits["Demographic"] = index.bitmaps["Demographic"].get(selections["Demographic"], empty)
 
     if selections["Topic"]:
-        out = out[out["Topic"].isin(selections["Topic"])]
+        topics = [index.bitmaps["Topic"][t] for t in selections["Topic"] if t in index.bitmaps["Topic"]]
+        bits["Topic"] = np.bitwise_or.reduce(topics) if topics else empty
+
+    return bits
+
+
+def selected_positions(index: FilterIndex, selections: dict) -> np.ndarray:
+    """Row positions matching the selections, in dataset order."""
+    bits = None
+    for other in _dimension_bits(index, selections).values():
+        bits = _and(bits, other)
+
+    mask = np.ones(index.n_rows, dtype=bool) if bits is None else np.unpackbits(bits, count=index.n_rows).view(bool)
 
     lo, hi = selections["rt_range"]
-    out = out[(out["YearStart"] >= lo) & (out["YearEnd"] <= hi)]
+    years = _year_mask(index, lo, hi)
+    if years is not None:
+        mask &= years
+
+    if selections.get("cap_outliers") and index.ci_width is not None:
+        cutoff, _ = cap_cutoff(index, selections)
+        mask[mask] = index.ci_width[mask] <= cutoff
+
+    return np.flatnonzero(mask)
+
+
+def facet_counts(index: FilterIndex, selections: dict) -> tuple[dict[str, dict[str, int]], dict[str, int]]:
+    """Rows each sidebar option would match, and each filter's row count with that filter left open.
+
+    An option's count applies every other filter, years and cap included, but
+    not its own column's, so it is what picking that option would give. Counts
+    are popcounts of the dimension bitmaps against one packed mask per column;
+    the frame is never scanned. The cap uses the current selection's cutoff.
+    """
+    mask = _year_mask(index, *selections["rt_range"])
+    if selections.get("cap_outliers") and index.ci_width is not None:
+        cutoff, _ = cap_cutoff(index, selections)
+        capped = index.ci_width <= cutoff
+        mask = capped if mask is None else mask & capped
+    base = None if mask is None else np.packbits(mask)
 
-    if selections.get("cap_outliers") and {"Low_Confidence_Limit", "High_Confidence_Limit"} <= set(out.columns):
-        width = (out["High_Confidence_Limit"] - out["Low_Confidence_Limit"]).abs()
-        cutoff = width.quantile(0.99)
-        out = out[width <= cutoff]
+    dimensions = _dimension_bits(index, selections)
+    counts, totals = {}, {}
+    for col in INDEXED_COLUMNS:
+        others = base
+        for other, bits in dimensions.items():
+            if other != col:
+                others = _and(others, bits)
+        stack = index.stacks[col] if others is None else np.bitwise_and(index.stacks[col], others)
+        counts[col] = dict(zip(index.bitmaps[col], np.bitwise_count(stack).sum(axis=1, dtype=np.int64).tolist()))
+        totals[col] = index.n_rows if others is None else int(np.bitwise_count(others).sum(dtype=np.int64))
+    return counts, totals
 
-    return out.reset_index(drop=True)
+
+def option_counts(df: pd.DataFrame, selections: dict) -> tuple[dict[str, dict[str, int]], dict[str, int]]:
+    """facet_counts for a loaded dataset, shared across sessions by selection key."""
+    content_hash = df.attrs.get("content_hash")
+    if content_hash is None:
+        return facet_counts(get_filter_index(df), selections)
+    return RESULT_CACHE.get_or_compute(
+        (selection_key(selections, content_hash), "facets"),
+        lambda: facet_counts(get_filter_index(df), selections),
+    )
+
+
+def filter_options(df: pd.DataFrame, selections: dict) -> FilterOptions:
+    """The sidebar's year bounds and option counts for a selection of a loaded dataset."""
+    counts, totals = option_counts(df, selections)
+    return FilterOptions(year_bounds(get_filter_index(df)), counts, totals)
+
+
+def filtered_positions(df: pd.DataFrame, selections: dict) -> np.ndarray:
+    """Row positions of df matching the selections, shared across sessions by selection key."""
+    content_hash = df.attrs.get("content_hash")
+    if content_hash is None:
+        return selected_positions(get_filter_index(df), selections)
+    return RESULT_CACHE.get_or_compute(
+        (selection_key(selections, content_hash), "positions"),
+        lambda: selected_positions(get_filter_index(df), selections),
+    )
+
+
+def apply_filters(df: pd.DataFrame, selections: dict) -> pd.DataFrame:
+    out = df.take(filtered_positions(df, selections)).reset_index(drop=True)
+    content_hash = df.attrs.get("content_hash")
+    if content_hash is not None:
+        # lets charts and KPIs cache their aggregates under the same selection
+        out.attrs["selection_key"] = selection_key(selections, content_hash)
+    return out
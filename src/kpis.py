@@ -0,0 +1,169 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from src.aggregate import dimension_codes
+
+# the correlation KPI pairs these two groups of classes
+SMOKING_CLASSES = ["Smoking and Alcohol Use"]
+COGNITIVE_CLASSES = ["Mental Health", "Cognitive Decline"]
+
+# ... on the cells of this key that both groups report a value for
+CORR_KEY = ["YearEnd", "LocationAbbr", "Demographic"]
+
+CORR_CONFIDENCE = 0.95
+BOOTSTRAP_RESAMPLES = 2000
+# below this many paired cells most resamples repeat a few pairs, and r gets no interval
+BOOTSTRAP_MIN_CELLS = 10
+# fixed, so a selection's interval is the same on every rerun and in every cache
+BOOTSTRAP_SEED = 0
+# resampled values drawn per batch; small enough to stay in cache, and bounds memory whatever the cell count
+BOOTSTRAP_BATCH = 65_536
+
+
+@dataclass(frozen=True)
+class KPIResult:
+    """The five header KPIs for one selection; None marks a metric with no data."""
+
+    total: int
+    best_year: int | None = None
+    best_year_mean: float | None = None
+    # best year's mean minus the mean over all years
+    year_delta: float | None = None
+    top_topic: str | None = None
+    top_topic_mean: float | None = None
+    top_demographic: str | None = None
+    top_demographic_mean: float | None = None
+    corr: float | None = None
+    # bootstrap confidence interval of corr
+    corr_low: float | None = None
+    corr_high: float | None = None
+    # paired CORR_KEY cells
+    corr_sample: int = 0
+
+
+def _best(counts: np.ndarray, sums: np.ndarray, labels: np.ndarray) -> tuple:
+    # first label with the highest mean, like idxmax over a sorted group-by; the missing slot is dropped
+    counts, sums = counts[: len(labels)], sums[: len(labels)]
+    if not (counts > 0).any():
+        return None, None
+    means = np.full(len(labels), -np.inf)
+    np.divide(sums, counts, out=means, where=counts > 0)
+    i = int(np.argmax(means))
+    return labels[i], float(means[i])
+
+
+def _bootstrap_corr(x: np.ndarray, y: np.ndarray, resamples: int, seed: int) -> np.ndarray:
+    """Pearson r of `resamples` resamples of the (x, y) pairs, a batch of whole resamples per array op.
+
+    A resample without variance in x or y has no r and is NaN.
+    """
+    n = len(x)
+    # r is shift-invariant; centering first keeps the one-pass sums below well conditioned
+    x, y = x - x.mean(), y - y.mean()
+    rng = np.random.default_rng(seed)
+    batch = max(1, BOOTSTRAP_BATCH // n)
+    out = np.empty(resamples)
+    for start in range(0, resamples, batch):
+        stop = min(start + batch, resamples)
+        idx = rng.integers(0, n, size=(stop - start, n))
+        xs, ys = x[idx], y[idx]
+        sx, sy = xs.sum(axis=1), ys.sum(axis=1)
+        sxy = np.einsum("ij,ij->i", xs, ys)
+        sxx = np.einsum("ij,ij->i", xs, xs)
+        syy = np.einsum("ij,ij->i", ys, ys)
+        vx, vy = n * sxx - sx * sx, n * syy - sy * sy
+        # repeated values leave a rounding residue of either sign instead of zero variance
+        degenerate = (vx <= 1e-12 * n * sxx) | (vy <= 1e-12 * n * syy)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = (n * sxy - sx * sy) / np.sqrt(vx * vy)
+        out[start:stop] = np.where(degenerate, np.nan, np.clip(r, -1.0, 1.0))
+    return out
+
+
+def paired_corr(measures: pd.DataFrame) -> tuple[float | None, float | None, float | None, int]:
+    """Correlation of smoking/alcohol with cognitive means over the CORR_KEY cells both groups report.
+
+    Returns r, the bounds of its bootstrap confidence interval and the number of
+    paired cells; the interval is None below BOOTSTRAP_MIN_CELLS cells. This replaced
+    pairing the nth smoking/alcohol row with the nth cognitive one, an r that
+    followed the rows' order and mixed years and states. Each group's
+    mean per cell comes from one bincount over the cell key, so the cost follows
+    the number of measure records, not raw rows.
+    """
+    codes, labels = dimension_codes(measures["Class"])
+    group_of = np.full(len(labels) + 1, 2)  # 0 smoking, 1 cognitive, 2 neither
+    group_of[np.flatnonzero(np.isin(labels, SMOKING_CLASSES))] = 0
+    group_of[np.flatnonzero(np.isin(labels, COGNITIVE_CLASSES))] = 1
+    group = group_of[codes]
+
+    cell = np.zeros(len(measures), dtype=np.int64)
+    cells = 1
+    for col in CORR_KEY:
+        col_codes, col_labels = dimension_codes(measures[col])
+        # records missing part of the key pair with nothing
+        group[col_codes == len(col_labels)] = 2
+        cell = cell * (len(col_labels) + 1) + col_codes
+        cells *= len(col_labels) + 1
+
+    key = group * cells + cell
+    counts = np.bincount(key, weights=measures["count"].to_numpy(dtype=np.float64), minlength=3 * cells)
+    sums = np.bincount(key, weights=measures["sum"].to_numpy(dtype=np.float64), minlength=3 * cells)
+    counts, sums = counts.reshape(3, cells)[:2], sums.reshape(3, cells)[:2]
+
+    paired = (counts > 0).all(axis=0)
+    n = int(np.count_nonzero(paired))
+    if n < 2:
+        return None, None, None, n
+    smokealc, cog = sums[:, paired] / counts[:, paired]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = float(np.corrcoef(smokealc, cog)[0, 1])
+    if np.isnan(r):
+        return None, None, None, n
+    r = min(max(r, -1.0), 1.0)
+    if n < BOOTSTRAP_MIN_CELLS:
+        return r, None, None, n
+
+    boot = _bootstrap_corr(smokealc, cog, BOOTSTRAP_RESAMPLES, BOOTSTRAP_SEED)
+    boot = boot[np.isfinite(boot)]
+    if not len(boot):
+        return r, None, None, n
+    alpha = (1 - CORR_CONFIDENCE) / 2
+    low, high = np.quantile(boot, [alpha, 1 - alpha])
+    return r, float(low), float(high), n
+
+
+def compute_kpis(measures: pd.DataFrame) -> KPIResult:
+    """All five KPIs from measure records.
+
+    Year, topic and demographic are coded to integers and combined into a single
+    key, so one bincount per measure yields every group's count and sum; each KPI
+    is then a marginal of that small array.
+    """
+    year, years = dimension_codes(measures["YearEnd"])
+    topic, topics = dimension_codes(measures["Topic"])
+    demographic, demographics = dimension_codes(measures["Demographic"])
+    shape = (len(years) + 1, len(topics) + 1, len(demographics) + 1)
+
+    key = (year * shape[1] + topic) * shape[2] + demographic
+    size = int(np.prod(shape))
+    counts = np.bincount(key, weights=measures["count"].to_numpy(dtype=np.float64), minlength=size).reshape(shape)
+    sums = np.bincount(key, weights=measures["sum"].to_numpy(dtype=np.float64), minlength=size).reshape(shape)
+
+    kpis = {"total": int(measures["rows"].sum())}
+
+    year_counts, year_sums = counts.sum(axis=(1, 2)), sums.sum(axis=(1, 2))
+    best_year, best_mean = _best(year_counts, year_sums, years)
+    if best_year is not None:
+        overall = year_sums[:-1].sum() / year_counts[:-1].sum()
+        kpis.update(best_year=int(best_year), best_year_mean=best_mean, year_delta=float(best_mean - overall))
+
+    top_topic, top_mean = _best(counts.sum(axis=(0, 2)), sums.sum(axis=(0, 2)), topics)
+    kpis.update(top_topic=top_topic, top_topic_mean=top_mean)
+
+    top_demographic, top_mean = _best(counts.sum(axis=(0, 1)), sums.sum(axis=(0, 1)), demographics)
+    kpis.update(top_demographic=top_demographic, top_demographic_mean=top_mean)
+
+    kpis["corr"], kpis["corr_low"], kpis["corr_high"], kpis["corr_sample"] = paired_corr(measures)
+    return KPIResult(**kpis)
@@ -1,71 +1,57 @@
+from typing import Callable
+
 import pandas as pd
 import streamlit as st
 import plotly.express as px
 
+from src.cache import cached
 from src.charts import plot_response_trend, plot_demo_bar, plot_sex_bar, plot_map, plot_radial_bar
+from src.figures import VALID_STATES, state_percentage
+from src.kpis import compute_kpis
+from src.timing import span
 
 
 # KPI METRICS
 def header_metrics(df: pd.DataFrame) -> None:
+    """KPI row; df holds measure records."""
+    kpis = cached(df, "header_metrics", lambda: compute_kpis(df))
+
     c1, c2, c3, c4, c5 = st.columns(5)
     with c1:
-        st.metric("Total Records", len(df))
+        st.metric("Total Records", kpis.total)
     with c2:
-        dv = pd.to_numeric(df["Data_Value"], errors="coerce")
-        dff = df.assign(Data_Value=dv).dropna(subset=["YearEnd", "Data_Value"])
-
-        if dff.empty:
+        if kpis.best_year is None:
             st.metric("Year with Highest Avg.", "—", delta="—")
         else:
-            overall_avg = dff["Data_Value"].mean()
-
-            yearly_avg = (
-                dff.groupby("YearEnd")["Data_Value"]
-                .mean()
-                .reset_index(name="YearAvg")
-            )
-            best = yearly_avg.loc[yearly_avg["YearAvg"].idxmax()]
-            best_year = int(best["YearEnd"])
-            best_val = float(best["YearAvg"])
-
-            delta = best_val - overall_avg
-
             st.metric(
                 "Year with Highest Avg.",
-                f"{best_year}",
-                delta=f"{delta:+.2f}%",
+                f"{kpis.best_year}",
+                delta=f"{kpis.year_delta:+.2f}%",
                 delta_color="normal",
-                help=f"Overall Avg: {best_val:.2f}%"
+                help=f"Overall Avg: {kpis.best_year_mean:.2f}%"
             )
     with c3:
-        q_avg = df.groupby("Topic")["Data_Value"].mean()
-        if not q_avg.empty:
-            top_q = q_avg.idxmax()
-            top_val = q_avg[top_q]
+        if kpis.top_topic is not None:
+            top_val = kpis.top_topic_mean
             st.metric(
                 "Topic with Highest Avg.",
                 f"{top_val:.2f}%",
                 delta="High" if top_val > 30 else "Moderate",
                 delta_color="inverse" if top_val > 30 else "normal",
-                help=top_q
+                help=kpis.top_topic
             )
         else:
             st.metric("Inquiry with Highest Avg.", "—")
     with c4:
-        demo_avg = df.groupby("Demographic")["Data_Value"].mean()
-        if not demo_avg.empty:
-            top_demo = demo_avg.idxmax()
-            st.metric("Largest Demographic",top_demo,help=f"Avg. Reports: {demo_avg[top_demo]:.2f}%")
+        if kpis.top_demographic is not None:
+            st.metric("Largest Demographic",kpis.top_demographic,help=f"Avg. Reports: {kpis.top_demographic_mean:.2f}%")
         else:
             st.metric("Largest Demographic", "—")
     with c5:
-        smokealc = (df[df["Class"] == "Smoking and Alcohol Use"]["Data_Value"].dropna().reset_index(drop=True))
-        cog = (df[df["Class"].isin(["Mental Health", "Cognitive Decline"])]["Data_Value"].dropna().reset_index(drop=True))
-        sample = min(len(smokealc), len(cog))
-        if sample == 0:
+        if kpis.corr is None:
             st.metric("Smoke/Alcohol vs Cognitive Corr.", "—")
         else:
-            r = smokealc[:sample].corr(cog[:sample])
+            r = kpis.corr
 
             if abs(r) < 0.2:
                 delta_text = "Neutral"
@@ -82,81 +68,129 @@ def header_metrics(df: pd.DataFrame) -> None:
             st.metric(
                 "Smoke/Alcohol vs Cognitive Corr.",
                 f"{r:.2f}",
-                help=f"Sample size: {sample}",
+                help=(
+                    f"Paired over {kpis.corr_sample} year × state × demographic cells"
+                    + (f"; 95% CI {kpis.corr_low:.2f} to {kpis.corr_high:.2f}" if kpis.corr_low is not None else "")
+                ),
                 delta=delta_text,
                 delta_color=delta_color,
                 delta_arrow=delta_arrow
             )
 
 
+# CHART VIEWS
+# Producers for the views under the chart selector, in display order. Only the
+# selected one runs, so a rerun pays for one view's aggregation and figures.
+VIEWS: dict[str, Callable[[pd.DataFrame], None]] = {}
+
+
+def view(label: str) -> Callable:
+    """Register a function rendering one chart view from measure records."""
+    def register(producer: Callable[[pd.DataFrame], None]) -> Callable[[pd.DataFrame], None]:
+        VIEWS[label] = producer
+        return producer
+    return register
+
+
+@view("Demographic")
+def demographic_view(df: pd.DataFrame) -> None:
+    categories = df["DemographicCategory"].dropna().unique().tolist()
+
+    with st.expander("How to interact with this chart"):
+        st.write("""
+        - Hover over bars to view column name and counts.
+        - Plots will appear based on topics chosen.
+        - Hover over plot for more options, including fullscreen view and downloading plot.
+        """)
+
+    if "Race/Ethnicity" in categories:
+        st.subheader("Distribution by Race/Ethnicity")
+        st.write("Number of survey responses grouped by race and ethnicity category.")
+        plot_demo_bar(df)
+
+    if "Sex" in categories:
+        st.subheader("Distribution by Sex")
+        st.write("Number of survey responses grouped by sex.")
+        plot_sex_bar(df)
+
+
+@view("Trends")
+def trends_view(df: pd.DataFrame) -> None:
+    st.subheader("Yearly Reporting Trend")
+    st.write("Average reported percentage by year with overall average reference line.")
+    with st.expander("How to interact with this chart"):
+        st.write("""
+        - Hover over coordinate points to see each percentage values.
+        - Blue line is average percent count for each year.
+        - Yellow dashed line is average percent count for all recorded years .
+        - Hover over plot for more options, including fullscreen view and downloading plot.
+        """)
+    plot_response_trend(df)
+
+
+@view("Map")
+def map_view(df: pd.DataFrame) -> None:
+    st.subheader("Chloropleth Map of Topic Prevalence")
+    st.write("Shows counts of selected topics on a Red-Green Scale, with red being higher prevalence")
+    with st.expander("How to interact with this chart"):
+        st.write("""
+        - Hover over state to view state abbreviation and number of responses.
+        - Colors adjust based on relative counts from topics chosen (i.e. red states have more alzheimer's prevalence, green states have relatively less alzheimer's prevalence).
+        - Hover over plot for more options, including fullscreen view and downloading plot.
+        """)
+    plot_map(df)
+
+
+@view("Polar Chart")
+def polar_view(df: pd.DataFrame) -> None:
+    st.subheader("Percentage of Responses by State ")
+    st.write("Shows relative percentage of responses grouped by state.")
+    with st.expander("How to interact with this chart"):
+        st.write("""
+        - Hover over bars to view section abbreviation and counts.
+        - Colors adjust based on relative counts from topics chosen, on a tan to red scale (i.e. red sections have more alzheimer's prevalence, tan sections have relatively less alzheimer's prevalence).
+        - Hover over plot for more options, including fullscreen view and downloading plot.
+        """)
+    df_percentage = cached(df, "state_percentage", lambda: state_percentage(df, VALID_STATES))
+
+    plot_radial_bar(df_percentage, value_col="Percentage")
+
+
+def _remember_chart_view() -> None:
+    st.session_state.chart_view = st.session_state.chart_picker
+
+
 def body_layout_tabs(df: pd.DataFrame) -> None:
-    """Tabs layout with 4 default tabs."""
-    t1, t2, t3, t4 = st.tabs(["Demographic", "Trends","Map", "Polar Chart"])
-
-    with t1:
-        categories = df["DemographicCategory"].dropna().unique().tolist()
-
-        with st.expander("How to interact with this chart"):
-            st.write("""
-            - Hover over bars to view column name and counts.
-            - Plots will appear based on topics chosen.
-            - Hover over plot for more options, including fullscreen view and downloading plot.
-            """)
-
-        if "Race/Ethnicity" in categories:
-            st.subheader("Distribution by Race/Ethnicity")
-            st.write("Number of survey responses grouped by race and ethnicity category.")
-            plot_demo_bar(df)
-
-        if "Sex" in categories:
-            st.subheader("Distribution by Sex")
-            st.write("Number of survey responses grouped by sex.")
-            plot_sex_bar(df)
-
-    with t2:
-        st.subheader("Yearly Reporting Trend")
-        st.write("Average reported percentage by year with overall average reference line.")
-        with st.expander("How to interact with this chart"):
-            st.write("""
-            - Hover over coordinate points to see each percentage values.
-            - Blue line is average percent count for each year.
-            - Yellow dashed line is average percent count for all recorded years .
-            - Hover over plot for more options, including fullscreen view and downloading plot.
-            """)
-        plot_response_trend(df)
-
-    with t3:
-        st.subheader("Chloropleth Map of Topic Prevalence")
-        st.write("Shows counts of selected topics on a Red-Green Scale, with red being higher prevalence")
-        with st.expander("How to interact with this chart"):
-            st.write("""
-            - Hover over state to view state abbreviation and number of responses.
-            - Colors adjust based on relative counts from topics chosen (i.e. red states have more alzheimer's prevalence, green states have relatively less alzheimer's prevalence).
-            - Hover over plot for more options, including fullscreen view and downloading plot.
-            """)
-        plot_map(df)
-
-    with t4:
-        st.subheader("Percentage of Responses by State ")
-        st.write("Shows relative percentage of responses grouped by state.")
-        with st.expander("How to interact with this chart"):
-            st.write("""
-            - Hover over bars to view section abbreviation and counts.
-            - Colors adjust based on relative counts from topics chosen, on a tan to red scale (i.e. red sections have more alzheimer's prevalence, tan sections have relatively less alzheimer's prevalence).
-            - Hover over plot for more options, including fullscreen view and downloading plot.
-            """)
-        valid_states = [
-            "AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "FL", "GA", "HI", "ID", "IL", "IN", "IA",
-            "KS", "KY", "LA", "ME", "MD", "MA", "MI", "MN", "MS", "MO", "MT", "NE", "NV", "NH", "NJ",
-            "NM", "NY", "NC", "ND", "OH", "OK", "OR", "PA", "RI", "SC", "SD", "TN", "TX", "UT", "VT",
-            "VA", "WA", "WV", "WI", "WY"
-        ]
-        df = df[df["LocationAbbr"].isin(valid_states)]
-        df_percentage = (
-            df.groupby("LocationAbbr")
-            .size()
-            .reset_index(name="Count")
+    """Chart selector over the registered views; only the selected view is computed."""
+    # a widget's state is dropped on reruns that don't draw it (the Table), so the choice lives under its own key
+    if st.session_state.get("chart_view") not in VIEWS:
+        st.session_state.chart_view = next(iter(VIEWS))
+    st.session_state.chart_picker = st.session_state.chart_view
+    st.radio(
+        "Chart",
+        list(VIEWS),
+        key="chart_picker",
+        on_change=_remember_chart_view,
+        horizontal=True,
+        label_visibility="collapsed",
+    )
+
+    with span(f"view:{st.session_state.chart_view}", rows_in=len(df)):
+        VIEWS[st.session_state.chart_view](df)
+
+
+def timing_panel(records: list[dict]) -> None:
+    """Opt-in sidebar table of this rerun's spans (src.timing), nested stages indented."""
+    st.sidebar.toggle("Show timings", key="show_timings")
+    if not records:
+        return
+    with st.sidebar.expander("Timings (this rerun)", expanded=True):
+        table = pd.DataFrame(records).astype({"rows_in": "Int64", "rows_out": "Int64"})
+        table["span"] = ["\u2003" * depth + name for depth, name in zip(table["depth"], table["span"])]
+        total = table.loc[table["depth"] == 0, "ms"].sum()
+        st.caption(f"{total:.1f} ms in instrumented stages")
+        st.dataframe(
+            table[["span", "ms", "rows_in", "rows_out", "cache_hits", "cache_misses"]],
+            hide_index=True,
+            use_container_width=True,
         )
-        df_percentage["Percentage"] = 100 * df_percentage["Count"] / df_percentage["Count"].sum()
-
-        plot_radial_bar(df_percentage, value_col="Percentage")
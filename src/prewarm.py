@@ -0,0 +1,60 @@
+"""Startup prewarming of the most used saved views.
+
+When the server loads a dataset version, a background thread computes the
+sidebar's option counts, measures, KPIs and chart aggregates of the
+DASHBOARD_PREWARM_VIEWS most used stored views into the result cache, so
+switching to one of them reads the result cache without a miss. Figures are
+still built on the first switch.
+"""
+import logging
+import os
+import threading
+import time
+
+import streamlit as st
+
+from src.cache import cached
+from src.figures import VALID_STATES, demographic_counts, state_counts, state_percentage, yearly_trend
+from src.kpis import compute_kpis
+from src.views import ViewStore
+
+logger = logging.getLogger(__name__)
+
+PREWARM_VIEWS = int(os.environ.get("DASHBOARD_PREWARM_VIEWS", 5))
+
+
+def warm_view(backend, selections: dict) -> None:
+    """Fill the result cache with what a rerun of this selection reads, under the app's own stage keys."""
+    # the sidebar's counts for the view's filters, as render_filters asks for them
+    backend.filter_options(selections)
+    measures, _ = backend.measures(selections)
+    cached(measures, "header_metrics", lambda: compute_kpis(measures))
+    if measures.empty:
+        return
+    # the stages src.charts and src.layouts cache their aggregates under
+    cached(measures, "yearly_trend", lambda: yearly_trend(measures))
+    cached(measures, "race_counts", lambda: demographic_counts(measures, "Race/Ethnicity"))
+    cached(measures, "sex_counts", lambda: demographic_counts(measures, "Sex"))
+    cached(measures, "state_counts", lambda: state_counts(measures))
+    cached(measures, "state_percentage", lambda: state_percentage(measures, VALID_STATES))
+
+
+def _prewarm(backend, views: dict[str, dict]) -> None:
+    start = time.perf_counter()
+    for name, view in views.items():
+        try:
+            warm_view(backend, view)
+        except Exception:
+            # a stale view (e.g. a topic no longer in the data) must not stop the others
+            logger.exception("prewarming saved view %r failed", name)
+    logger.info("prewarmed %d saved views in %.2f s", len(views), time.perf_counter() - start)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def start_prewarm(content_hash: str, _backend, _store: ViewStore, limit: int = PREWARM_VIEWS) -> threading.Thread:
+    """Prewarm the most used views once per dataset version, on a background thread."""
+    thread = threading.Thread(
+        target=_prewarm, args=(_backend, _store.most_used(limit)), name="prewarm-views", daemon=True
+    )
+    thread.start()
+    return thread
@@ -0,0 +1,371 @@
+"""Incremental refresh of the dataset from a new CDC export.
+
+    python -m src.refresh data/sample.csv path/to/new_export.csv
+
+Only lines that differ between the current CSV and the new export are parsed,
+only the Parquet parts holding changed rows are rewritten and the cube is
+patched with the delta; then the CSV is replaced by the export. A refresh log next to the data lets a running app move
+cached results whose slices were not touched over to the new content hash.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import shutil
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.cache import RESULT_CACHE, ResultCache
+from src.cube import CUBE_INPUTS, build_cube, cube_path, read_cube, update_cube, write_cube
+from src.data import (
+    PART_ROWS,
+    TARGET_CLASSES,
+    columnar_path,
+    combine_hashes,
+    dataset_files,
+    dataset_hash,
+    file_hash,
+    header_digest,
+    ingest_csv,
+    is_multi_file,
+    line_digests,
+    read_manifest,
+    read_snapshot,
+    row_filter,
+    write_manifest,
+    write_part,
+)
+
+ROW_KEY = ["YearStart", "YearEnd", "LocationAbbr", "QuestionID", "StratificationID1", "StratificationID2"]
+
+# Order of the values in a touched slice; matches the selection fields in the cache key
+SLICE_COLUMNS = ["AgeGroup", "Demographic", "Topic", "YearStart", "YearEnd"]
+
+
+@dataclass
+class RefreshResult:
+    old_hash: str
+    new_hash: str
+    added: int = 0
+    changed: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    full_rebuild: bool = False
+    seconds: float = 0.0
+    # the O(dataset) part of a refresh: digesting the new export's lines, matching them to the copy's
+    # and reading out the new ones
+    diff_seconds: float = 0.0
+    touched: list[tuple] = field(default_factory=list)
+
+
+def refresh_log_path(path: str | Path) -> Path:
+    return Path(path).with_suffix(".refresh.json")
+
+
+def _occurrences(digests: np.ndarray) -> pd.DataFrame:
+    # number duplicate lines so the n-th copy in the new file matches the n-th copy in the old one
+    lines = pd.DataFrame({"digest": digests})
+    lines["copy"] = lines.groupby("digest").cumcount()
+    return lines
+
+
+def _read_lines(path: str | Path, wanted: set[int]) -> list[bytes]:
+    """Data lines at the given 0-based positions, in file order."""
+    with open(path, "rb") as f:
+        f.readline()
+        return [line for i, line in enumerate(f) if i in wanted]
+
+
+def _parse_lines(header: bytes, lines: list[bytes], schema: pa.Schema) -> pa.Table:
+    text_columns = {
+        f.name: str for f in schema if pa.types.is_string(f.type) or pa.types.is_dictionary(f.type)
+    }
+    body = header + b"".join(line if line.endswith(b"\n") else line + b"\n" for line in lines)
+    df = pd.read_csv(io.BytesIO(body), dtype=text_columns)
+    return pa.Table.from_pandas(df, preserve_index=False).cast(schema)
+
+
+def _dashboard_rows(df: pd.DataFrame) -> pd.DataFrame:
+    return df[(df["AgeGroup"] != "Overall") & df["Class"].isin(TARGET_CLASSES)]
+
+
+def _slices(frames: list[pd.DataFrame]) -> list[tuple]:
+    touched = pd.concat([f[SLICE_COLUMNS].astype(object) for f in frames], ignore_index=True).drop_duplicates()
+    return [
+        tuple(None if isinstance(v, float) and math.isnan(v) else v for v in row)
+        for row in touched.itertuples(index=False)
+    ]
+
+
+def _paired(removed: pd.DataFrame, added: pd.DataFrame, key: list[str]) -> pd.DataFrame:
+    """Pair removed and added rows with the same key (the n-th of each with one another): changed rows."""
+    def _numbered(df: pd.DataFrame, side: str) -> pd.DataFrame:
+        keys = df[key].astype(str).reset_index(drop=True)
+        keys["copy"] = keys.groupby(key).cumcount()
+        keys[side] = np.arange(len(keys))
+        return keys
+
+    return _numbered(removed, "removed").merge(_numbered(added, "added"), on=[*key, "copy"])[["removed", "added"]]
+
+
+def _part_index(part: dict) -> int:
+    return int(part["file"][1:7])
+
+
+def _full_rebuild(path: Path, new_export: Path, new_hash: str, result: RefreshResult) -> None:
+    snapshot = ingest_csv(new_export, columnar_path(path), new_hash)
+    rows = read_snapshot(snapshot, CUBE_INPUTS, row_filter())
+    write_cube(build_cube(rows), cube_path(path), new_hash)
+    result.full_rebuild = True
+
+
+def refresh_dataset(path: str | Path, new_export: str | Path, key: list[str] = ROW_KEY) -> RefreshResult:
+    """Bring the dataset at `path` up to date with `new_export`, touching only what changed.
+
+    The new export's lines are diffed against the digests stored with the Parquet
+    copy; only lines that differ are parsed. Removed and added rows with the same
+    `key` are a changed row and replace it in place, other added rows go at the
+    end, and only the parts holding a changed or removed row are rewritten. The
+    copy keeps its old row order rather than the export's, so remove the disk
+    cache (src.diskcache) along with a refreshed copy: a copy ingested afresh from
+    the same CSV orders its rows differently.
+    """
+    start = time.perf_counter()
+    path, new_export = Path(path), Path(new_export)
+    if path.resolve() == new_export.resolve():
+        raise ValueError("the new export must be a separate file from the current dataset")
+    if is_multi_file(path):
+        raise ValueError("refresh one extract of a multi-file dataset at a time, by its file path")
+
+    # make sure the snapshot and cube match the CSV being diffed against
+    cube = read_cube(path)
+    old_hash, new_hash = dataset_hash(path), file_hash(new_export)
+    result = RefreshResult(old_hash, new_hash)
+    snapshot = columnar_path(path)
+    manifest = read_manifest(snapshot)
+    parts = manifest["parts"]
+    schema = pq.read_schema(snapshot / parts[0]["file"]) if parts else None
+
+    missing = [col for col in key if schema is not None and col not in schema.names]
+    if missing:
+        raise ValueError(f"row key columns missing from the dataset: {missing}")
+
+    new_header, new_digests = line_digests(new_export)
+    if not parts or not manifest["digests"] or manifest["header"] != header_digest(new_header):
+        # new columns, quoted multi-line fields or an empty copy: the line diff can't be trusted
+        _full_rebuild(path, new_export, new_hash, result)
+    else:
+        old_digests = np.concatenate([np.load((snapshot / part["file"]).with_suffix(".npy")) for part in parts])
+        old_lines = _occurrences(old_digests)
+        old_lines["position"] = np.arange(len(old_lines))
+        matched = _occurrences(new_digests).merge(old_lines, on=["digest", "copy"], how="left")["position"]
+        added_lines = np.flatnonzero(matched.isna().to_numpy())
+        kept = np.zeros(len(old_digests), dtype=bool)
+        kept[matched.dropna().to_numpy(dtype=np.int64)] = True
+        removed_positions = np.flatnonzero(~kept)
+        lines = _read_lines(new_export, set(added_lines.tolist()))
+        result.diff_seconds = time.perf_counter() - start
+
+        delta = _parse_lines(new_header, lines, schema)
+        if delta.num_rows != len(added_lines):
+            # a quoted line break in the new export
+            _full_rebuild(path, new_export, new_hash, result)
+        else:
+            removed = _apply_delta(
+                snapshot, manifest, schema, removed_positions, delta, new_digests[added_lines], key, result
+            )
+            result.unchanged = len(new_digests) - len(added_lines)
+            removed_df, added_df = _dashboard_rows(removed), _dashboard_rows(delta.to_pandas())
+            write_cube(update_cube(cube, removed_df, added_df), cube_path(path), new_hash)
+            result.touched = _slices([removed_df, added_df])
+
+    log = asdict(result)
+    refresh_log_path(path).write_text(json.dumps(log))
+
+    # swapping the CSV last makes the new content hash visible only once everything else is in place
+    tmp = path.with_name(path.name + ".tmp")
+    shutil.copyfile(new_export, tmp)
+    os.replace(tmp, path)
+
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def _apply_delta(
+    snapshot: Path,
+    manifest: dict,
+    schema: pa.Schema,
+    removed_positions: np.ndarray,
+    delta: pa.Table,
+    delta_digests: np.ndarray,
+    key: list[str],
+    result: RefreshResult,
+) -> pd.DataFrame:
+    """Rewrite the parts holding removed rows, append the unpaired added rows and switch the manifest.
+
+    Counts the changed, added and removed rows into result and returns the rows removed.
+    """
+    parts = [dict(part) for part in manifest["parts"]]
+    bounds = np.cumsum([0] + [part["rows"] for part in parts])
+    owner = np.searchsorted(bounds, removed_positions, side="right") - 1
+
+    # only the parts that lose a row are read
+    tables = {i: pq.read_table(snapshot / parts[i]["file"]) for i in np.unique(owner).tolist()}
+    removed = [tables[i].take(removed_positions[owner == i] - bounds[i]) for i in tables]
+    removed = (pa.concat_tables(removed).unify_dictionaries() if removed else schema.empty_table()).to_pandas()
+
+    pairs = _paired(removed, delta.to_pandas(), key)
+    replacement = dict(zip(pairs["removed"].tolist(), pairs["added"].tolist()))
+    appended = np.setdiff1d(np.arange(delta.num_rows), pairs["added"].to_numpy())
+    result.changed, result.added = len(pairs), len(appended)
+    result.removed = len(removed_positions) - len(pairs)
+
+    rewritten = {}
+    for i, table in tables.items():
+        # positions into the part's rows followed by the delta's; -1 drops a row
+        gone = np.flatnonzero(owner == i)
+        local = removed_positions[gone] - bounds[i]
+        partner = np.array([replacement.get(j, -1) for j in gone.tolist()], dtype=np.int64)
+        take = np.arange(table.num_rows)
+        take[local] = np.where(partner >= 0, table.num_rows + partner, -1)
+        digests = np.load((snapshot / parts[i]["file"]).with_suffix(".npy"))
+        digests[local[partner >= 0]] = delta_digests[partner[partner >= 0]]
+        combined = pa.concat_tables([table, delta]).unify_dictionaries()
+        rewritten[i] = (combined.take(take[take >= 0]), digests[take >= 0])
+
+    # unpaired added rows fill the last part up to PART_ROWS, then go in new parts
+    last = len(parts) - 1
+    if len(appended) and last not in rewritten and parts[last]["rows"] + len(appended) <= PART_ROWS:
+        last_file = snapshot / parts[last]["file"]
+        rewritten[last] = (pq.read_table(last_file), np.load(last_file.with_suffix(".npy")))
+    if len(appended) and last in rewritten and rewritten[last][0].num_rows + len(appended) <= PART_ROWS:
+        table, digests = rewritten[last]
+        table = pa.concat_tables([table, delta.take(appended).cast(table.schema)]).unify_dictionaries()
+        rewritten[last] = (table, np.concatenate([digests, delta_digests[appended]]))
+        appended = appended[:0]
+
+    new_parts = []
+    for i, part in enumerate(parts):
+        if i not in rewritten:
+            new_parts.append(part)
+        elif rewritten[i][0].num_rows:
+            table, digests = rewritten[i]
+            new_parts.append(write_part(snapshot, _part_index(part), table.cast(schema), digests))
+    next_index = _part_index(parts[-1]) + 1
+    for offset in range(0, len(appended), PART_ROWS):
+        rows = appended[offset : offset + PART_ROWS]
+        new_parts.append(write_part(snapshot, next_index, delta.take(rows).cast(schema), delta_digests[rows]))
+        next_index += 1
+
+    write_manifest(snapshot, {**manifest, "content_hash": result.new_hash, "parts": new_parts}, manifest)
+    return removed
+
+
+def _selection_touched(key: tuple, touched: list[tuple]) -> bool:
+    _, age, demographic, topics, (lo, hi), _ = key
+    for t_age, t_demographic, t_topic, t_start, t_end in touched:
+        if age != "All Age Groups" and age != t_age:
+            continue
+        if demographic != "All" and demographic != t_demographic:
+            continue
+        if topics and t_topic not in topics:
+            continue
+        if t_start is None or t_end is None or not (t_start >= lo and t_end <= hi):
+            continue
+        return True
+    return False
+
+
+def invalidate_touched(cache: ResultCache, old_hash: str, new_hash: str, touched: list[tuple] | None) -> None:
+    """Move cached results for untouched selections from old_hash to new_hash, dropping the rest.
+
+    Row positions (stage "positions", or a tuple stage starting with it) always go:
+    inserted and removed rows shift them for every selection. So do sidebar
+    option counts (stage "facets"), which count rows outside the selection too.
+    touched=None (a full rebuild) drops everything cached for old_hash.
+    """
+    def _remap(cache_key):
+        selection, stage = cache_key
+        if not isinstance(selection, tuple) or selection[0] != old_hash:
+            return cache_key
+        holds_positions = stage == "positions" or (isinstance(stage, tuple) and stage[0] == "positions")
+        if touched is None or holds_positions or stage == "facets" or _selection_touched(selection, touched):
+            return None
+        return (new_hash, *selection[1:]), stage
+
+    cache.remap(_remap)
+
+
+_applied_logs: set[str] = set()
+
+
+def _read_log(path: str | Path, new_hash: str) -> dict | None:
+    """The refresh log of the file at path, if its last refresh produced new_hash."""
+    log_path = refresh_log_path(path)
+    if not log_path.exists():
+        return None
+    log = json.loads(log_path.read_text())
+    return log if log["new_hash"] == new_hash else None
+
+
+def _touched(logs: list[dict]) -> list[tuple] | None:
+    if any(log["full_rebuild"] for log in logs):
+        return None
+    return [tuple(t) for log in logs for t in log["touched"]]
+
+
+def apply_refresh_log(path: str | Path, content_hash: str, cache: ResultCache = RESULT_CACHE) -> None:
+    """Carry this process's cache over a refresh that produced `content_hash`; cheap when there is none.
+
+    Extracts of a multi-file dataset are refreshed one at a time, each logging
+    its own file's hashes. The dataset's hash before a refresh is its files'
+    hashes with the refreshed ones put back, tried for each extract on its own
+    and for all of them refreshed together.
+    """
+    if content_hash in _applied_logs:
+        return
+    _applied_logs.add(content_hash)
+
+    if not is_multi_file(path):
+        log = _read_log(path, content_hash)
+        if log is not None:
+            invalidate_touched(cache, log["old_hash"], content_hash, _touched([log]))
+        return
+
+    files = dataset_files(path)
+    hashes = [dataset_hash(file) for file in files]
+    logs = {}
+    for i, (file, file_digest) in enumerate(zip(files, hashes)):
+        log = _read_log(file, file_digest)
+        if log is not None:
+            logs[i] = log
+    candidates = [[i] for i in logs]
+    if len(logs) > 1:
+        candidates.append(list(logs))
+    for refreshed in candidates:
+        old_hashes = [logs[i]["old_hash"] if i in refreshed else file_digest for i, file_digest in enumerate(hashes)]
+        invalidate_touched(cache, combine_hashes(files, old_hashes), content_hash, _touched([logs[i] for i in refreshed]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="current dataset CSV, e.g. data/sample.csv")
+    parser.add_argument("new_export", help="newly downloaded export with the same columns")
+    parser.add_argument("--key", nargs="+", default=ROW_KEY, help="columns identifying a row")
+    args = parser.parse_args()
+
+    result = refresh_dataset(args.path, args.new_export, args.key)
+    summary = asdict(result)
+    summary["touched"] = len(result.touched)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
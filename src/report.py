@@ -0,0 +1,234 @@
+"""Batch reports for saved views, without the app.
+
+    python -m src.report data/sample.csv views.json --out reports/
+    python -m src.report data/sample.csv views.json --out reports/ --per-state --per-topic
+
+views.json holds view definitions in the shape the sidebar saves them,
+{name: {"AgeGroup": ..., "Demographic": ..., "Topic": [...], "rt_range": [lo, hi],
+"cap_outliers": false}}, or a list of such dicts with a "name" each. A view may
+also set "LocationAbbr" to one state, which the sidebar has no filter for;
+--per-state and --per-topic expand every view into one view per state or topic.
+
+Each view gets a directory under --out with kpis.json and one standalone HTML
+file per chart; index.json lists them all. Views are spread over a process
+pool, each worker reading the dataset once.
+"""
+import argparse
+import json
+import math
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs
+
+from src.cube import read_cube, slice_cube, to_measures
+from src.data import APP_COLUMNS, compact_frame, read_dataset
+from src.figures import (
+    VALID_STATES,
+    demographic_bar_figure,
+    demographic_counts,
+    map_figure,
+    radial_bar_figure,
+    response_trend_figure,
+    state_counts,
+    state_percentage,
+    yearly_trend,
+)
+from src.filters import CAP_QUANTILE, FilterIndex, build_filter_index, selected_positions, year_bounds
+from src.kpis import KPIResult, compute_kpis
+
+# per process: the dataset, its cube and filter index, set by _init_worker
+_worker: dict = {}
+
+
+@dataclass
+class ViewReport:
+    """KPIs and figures for one view, keyed by chart name; empty charts are left out."""
+
+    name: str
+    view: dict
+    source: str
+    rows: int
+    kpis: KPIResult
+    figures: dict[str, go.Figure] = field(default_factory=dict)
+
+
+def _as_selections(view: dict, bounds: tuple[int, int]) -> dict:
+    # a view without a year range covers the dataset's years, as the sidebar's default does
+    selections = {
+        "AgeGroup": view.get("AgeGroup", "All Age Groups"),
+        "Demographic": view.get("Demographic", "All"),
+        "Topic": list(view.get("Topic", [])),
+        "rt_range": tuple(view.get("rt_range", bounds)),
+        "cap_outliers": bool(view.get("cap_outliers", False)),
+    }
+    if view.get("LocationAbbr"):
+        selections["LocationAbbr"] = view["LocationAbbr"]
+    return selections
+
+
+def compute_view(name: str, view: dict, df: pd.DataFrame, cube: pd.DataFrame, index: FilterIndex) -> ViewReport:
+    """What the dashboard shows for a view: KPIs from the cube when it can answer, else from raw rows."""
+    selections = _as_selections(view, year_bounds(index))
+    state = selections.get("LocationAbbr")
+    if state is None:
+        raw = df.take(selected_positions(index, selections))
+    else:
+        # the state's rows first, so the cap cuts at the percentile of that state's CI widths
+        raw = df.take(selected_positions(index, {**selections, "cap_outliers": False}))
+        raw = raw[(raw["LocationAbbr"] == state).to_numpy()]
+        if selections["cap_outliers"]:
+            width = (raw["High_Confidence_Limit"] - raw["Low_Confidence_Limit"]).abs()
+            raw = raw[(width <= width.quantile(CAP_QUANTILE)).to_numpy()]
+
+    measures = slice_cube(cube, selections)
+    source = "cube"
+    if measures is None:
+        measures, source = to_measures(raw), "raw"
+    elif state is not None:
+        measures = measures[(measures["LocationAbbr"] == state).to_numpy()]
+
+    report = ViewReport(name, selections, source, len(raw), compute_kpis(measures))
+    if measures.empty:
+        return report
+
+    yearly, overall_avg = yearly_trend(measures)
+    report.figures["response_trend"] = response_trend_figure(yearly, overall_avg)
+    for chart, category in [("demo_bar", "Race/Ethnicity"), ("sex_bar", "Sex")]:
+        counts = demographic_counts(measures, category)
+        if not counts.empty:
+            report.figures[chart] = demographic_bar_figure(counts, category)
+    report.figures["map"] = map_figure(state_counts(measures))
+    percentage = state_percentage(measures, VALID_STATES)
+    if not percentage.empty:
+        report.figures["radial_bar"] = radial_bar_figure(
+            percentage.sort_values(by="Percentage", ascending=False), "Percentage"
+        )
+    return report
+
+
+def read_views(path: str | Path) -> dict[str, dict]:
+    views = json.loads(Path(path).read_text())
+    if isinstance(views, list):
+        views = {view.pop("name"): view for view in views}
+    return views
+
+
+def expand_views(views: dict[str, dict], states: list[str] | None, topics: list[str] | None) -> dict[str, dict]:
+    """Every view, then one copy per state and per topic of each for the requested bundles."""
+    expanded = dict(views)
+    for name, view in views.items():
+        for state in states or []:
+            expanded[f"{name} - {state}"] = {**view, "LocationAbbr": state}
+        for topic in topics or []:
+            expanded[f"{name} - {topic}"] = {**view, "Topic": [topic]}
+    return expanded
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "-", name).strip("-").lower() or "view"
+
+
+def _json_safe(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, np.generic):
+        return _json_safe(value.item())
+    return value
+
+
+def write_report(report: ViewReport, out: Path, plotlyjs: str | bool) -> dict:
+    """kpis.json and <chart>.html for report in out; returns its index.json entry."""
+    out.mkdir(parents=True, exist_ok=True)
+    kpis = {key: _json_safe(value) for key, value in asdict(report.kpis).items()}
+    summary = {
+        "name": report.name,
+        "view": {**report.view, "rt_range": list(report.view["rt_range"])},
+        "source": report.source,
+        "rows": report.rows,
+        "kpis": kpis,
+    }
+    (out / "kpis.json").write_text(json.dumps(summary, indent=2))
+    for chart, fig in report.figures.items():
+        fig.write_html(out / f"{chart}.html", include_plotlyjs=plotlyjs, full_html=True)
+    return {"name": report.name, "dir": out.name, "charts": sorted(report.figures)}
+
+
+def _init_worker(path: str) -> None:
+    # the frame load_data gives the app, so reports match what it shows
+    df = compact_frame(read_dataset(path, APP_COLUMNS))
+    _worker.update(df=df, cube=read_cube(path), index=build_filter_index(df))
+
+
+def _run_view(name: str, view: dict, out: Path, plotlyjs: str | bool) -> dict:
+    report = compute_view(name, view, _worker["df"], _worker["cube"], _worker["index"])
+    return write_report(report, out, plotlyjs)
+
+
+def generate_reports(
+    path: str, views: dict[str, dict], out: str | Path, workers: int | None = None, plotlyjs: str = "shared"
+) -> list[dict]:
+    """Write a report directory per view under out, fanned out over `workers` processes."""
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    # build the Parquet copy and cube once here, not in every worker at the same time
+    read_cube(path)
+
+    if plotlyjs == "shared":
+        # one copy of plotly.js for all views instead of ~3.5 MB inlined per chart
+        (out / "plotly.min.js").write_text(get_plotlyjs())
+        include = "../plotly.min.js"
+    else:
+        include = {"cdn": "cdn", "inline": True}[plotlyjs]
+
+    slugs: dict[str, int] = {}
+    jobs = []
+    for name, view in views.items():
+        slug = _slug(name)
+        slugs[slug] = slugs.get(slug, 0) + 1
+        if slugs[slug] > 1:
+            slug = f"{slug}-{slugs[slug]}"
+        jobs.append((name, view, out / slug))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(path,)) as pool:
+        futures = [pool.submit(_run_view, name, view, view_out, include) for name, view, view_out in jobs]
+        index = [future.result() for future in futures]
+
+    (out / "index.json").write_text(json.dumps(index, indent=2))
+    return index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="dataset CSV, e.g. data/sample.csv")
+    parser.add_argument("views", help="JSON file of view definitions")
+    parser.add_argument("--out", default="reports", help="directory to write reports into")
+    parser.add_argument("--per-state", action="store_true", help="also report each view for every state")
+    parser.add_argument("--per-topic", action="store_true", help="also report each view for every topic")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument(
+        "--plotlyjs", choices=["shared", "cdn", "inline"], default="shared",
+        help="shared: one plotly.min.js in --out; cdn: load it from the web; inline: embed it in every file",
+    )
+    args = parser.parse_args()
+
+    topics = None
+    if args.per_topic:
+        topics = sorted(read_dataset(args.path, ["Topic"])["Topic"].dropna().unique())
+    views = expand_views(read_views(args.views), VALID_STATES if args.per_state else None, topics)
+
+    start = time.perf_counter()
+    index = generate_reports(args.path, views, args.out, args.workers, args.plotlyjs)
+    charts = sum(len(entry["charts"]) for entry in index)
+    print(f"{len(index)} views, {charts} charts in {time.perf_counter() - start:.1f} s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+# One summary per slice; every sidebar filter is a predicate on these columns
+SKETCH_DIMENSIONS = ["Topic", "AgeGroup", "Demographic", "YearStart", "YearEnd"]
+
+# Slices with more rows than this keep this many evenly spaced order statistics
+SKETCH_POINTS = 64
+
+
+def build_sketch(df: pd.DataFrame, values: np.ndarray, points: int = SKETCH_POINTS) -> pd.DataFrame:
+    """Mergeable quantile summaries of `values`, one per slice, flattened into one frame.
+
+    Small slices keep every value (weight 1). Larger slices of n values keep `points`
+    order statistics at the centres of equal-rank buckets, each weighing n / points.
+    The frame is sorted by value, then weight, so any union of slices is already in
+    order and points that tie on both are interchangeable, whatever the row order.
+    """
+    frame = df[SKETCH_DIMENSIONS].astype({"Topic": "category", "AgeGroup": "category", "Demographic": "category"})
+    frame = frame.assign(value=values)
+    frame = frame[frame["value"].notna()]
+    slice_id = frame.groupby(SKETCH_DIMENSIONS, observed=True, dropna=False, sort=False).ngroup().to_numpy()
+    order = np.lexsort((frame["value"].to_numpy(), slice_id))
+    frame = frame.iloc[order]
+    slice_id = slice_id[order]
+
+    starts = np.flatnonzero(np.r_[True, slice_id[1:] != slice_id[:-1]]) if len(frame) else np.empty(0, dtype=np.int64)
+    sizes = np.diff(np.r_[starts, len(frame)])
+
+    small = sizes <= points
+    keep = [np.repeat(starts[small], sizes[small]) + _ranks(sizes[small])]
+    big_starts, big_sizes = starts[~small], sizes[~small]
+    keep.append((big_starts[:, None] + ((np.arange(points) + 0.5) * big_sizes[:, None] / points).astype(np.int64)).ravel())
+    weights = np.r_[np.ones(int(sizes[small].sum())), np.repeat(big_sizes / points, points)]
+
+    sketch = frame.iloc[np.concatenate(keep)].assign(weight=weights)
+    return sketch.sort_values(["value", "weight"], kind="stable").reset_index(drop=True)
+
+
+def _ranks(sizes: np.ndarray) -> np.ndarray:
+    # 0..n-1 within each run of the given sizes
+    total = int(sizes.sum())
+    return np.arange(total) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+
+
+def _code_mask(column: pd.Series, wanted: list) -> np.ndarray:
+    categories = column.cat.categories
+    # lookup table over the codes; its extra last slot catches the -1 code of missing values
+    table = np.zeros(len(categories) + 1, dtype=bool)
+    table[[categories.get_loc(v) for v in wanted if v in categories]] = True
+    return table[column.cat.codes.to_numpy()]
+
+
+def select_points(sketch: pd.DataFrame, selections: dict) -> tuple[np.ndarray, np.ndarray]:
+    """Values and weights of the sketch points inside a render_filters selection, sorted by value."""
+    mask = np.ones(len(sketch), dtype=bool)
+    if selections["AgeGroup"] != "All Age Groups":
+        mask &= _code_mask(sketch["AgeGroup"], [selections["AgeGroup"]])
+    if selections["Demographic"] != "All":
+        mask &= _code_mask(sketch["Demographic"], [selections["Demographic"]])
+    if selections["Topic"]:
+        mask &= _code_mask(sketch["Topic"], selections["Topic"])
+    lo, hi = selections["rt_range"]
+    mask &= (sketch["YearStart"].to_numpy() >= lo) & (sketch["YearEnd"].to_numpy() <= hi)
+    return sketch["value"].to_numpy()[mask], sketch["weight"].to_numpy()[mask]
+
+
+def merged_quantile(
+    values: np.ndarray, weights: np.ndarray, q: float, sketch_points: int = SKETCH_POINTS
+) -> tuple[float, float]:
+    """q-quantile of merged slice points and its rank-error bound as a fraction of the rows.
+
+    Interpolates like pandas' default "linear" method, so a selection made only of
+    uncompressed slices gives exactly Series.quantile(q).
+    """
+    total = weights.sum()
+    if total == 0:
+        return float("nan"), 0.0
+
+    # each point sits in the middle of the ranks it stands for
+    centres = np.cumsum(weights) - weights + (weights - 1) / 2
+    value = float(np.interp((total - 1) * q, centres, values))
+    # a compressed slice of n rows is off by at most n / sketch_points ranks
+    rank_error = float(weights[weights > 1].sum() / sketch_points / total)
+    return value, rank_error
@@ -0,0 +1,147 @@
+"""Build-time snapshot of the default view, so a new session's first page is a file read.
+
+    python -m src.snapshot data/sample.csv
+
+Every session opens on "Default View/ Full Dataset", the most expensive
+selection. This build step computes it once: its measure records, the KPIs and
+chart aggregates under their result cache stages, every chart view's figure as
+src.charts serializes it, the sidebar's option counts and the table's first
+page. They are written next to the dataset, stamped with SNAPSHOT_VERSION and
+the dataset's content hash.
+
+app.main serves the snapshot while a session still shows the default view: the
+caches are seeded from it and the dataset is not loaded. The first filter or
+table control a user changes loads the dataset as usual. A snapshot of another
+dataset version or format is ignored, so rebuild it after a refresh.
+"""
+import argparse
+import pickle
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+from src.backend import PandasBackend
+from src.cache import FIGURE_CACHE, RESULT_CACHE, selection_key
+from src.cube import load_cube
+from src.data import APP_COLUMNS, dataset_hash, derived_path, load_data
+from src.filters import FilterOptions, default_selections, filter_options, get_filter_index
+from src.layouts import VIEWS
+from src.prewarm import warm_view
+from src.table import TABLE_DEFAULTS, first_page
+
+# bump when Snapshot or anything stored in it changes shape
+SNAPSHOT_VERSION = 1
+
+
+@dataclass
+class Snapshot:
+    """The default view of one dataset version, as the app renders it."""
+
+    version: int
+    content_hash: str
+    selections: dict
+    measures: pd.DataFrame
+    source: str
+    results: dict  # result cache stage -> value, for the default selection
+    figures: dict  # figure cache key -> serialized figure
+    options: FilterOptions
+    table_page: tuple[pd.DataFrame, int]  # src.table.first_page
+
+
+def snapshot_path(path: str | Path) -> Path:
+    return derived_path(path, ".snapshot.pkl")
+
+
+def build_snapshot(path: str) -> Snapshot:
+    """Compute the default view of the dataset at path with the app's own code, capturing what it caches."""
+    content_hash = dataset_hash(path)
+    df = load_data(path, columns=APP_COLUMNS, content_hash=content_hash)
+    backend = PandasBackend(df, load_cube(path, content_hash))
+    selections = default_selections(get_filter_index(df))
+
+    RESULT_CACHE.clear()
+    FIGURE_CACHE.clear()
+    warm_view(backend, selections)
+    measures, source = backend.measures(selections)
+    # every chart view renders once, headless, so its figures land in the figure cache under their real keys
+    for producer in VIEWS.values():
+        producer(measures)
+    options = filter_options(df, selections)
+
+    key = selection_key(selections, content_hash)
+    results = {
+        stage: value
+        for (selection, stage), value in RESULT_CACHE.items()
+        # row positions only serve the live table; the snapshot carries its first page instead
+        if selection == key and isinstance(stage, str) and stage != "positions"
+    }
+    return Snapshot(
+        SNAPSHOT_VERSION,
+        content_hash,
+        selections,
+        measures,
+        source,
+        results,
+        dict(FIGURE_CACHE.items()),
+        options,
+        first_page(df, selections),
+    )
+
+
+def write_snapshot(snapshot: Snapshot, out: str | Path) -> None:
+    out = Path(out)
+    # write-then-rename so a starting worker never reads a half-written file
+    tmp = out.with_name(out.name + ".tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp.replace(out)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_snapshot(path: str, content_hash: str) -> Snapshot | None:
+    """The dataset's snapshot if one was built for this version, with the caches seeded from it; else None."""
+    try:
+        with open(snapshot_path(path), "rb") as f:
+            snapshot = pickle.load(f)
+    except (OSError, EOFError, AttributeError, ImportError, pickle.UnpicklingError):
+        return None
+    if getattr(snapshot, "version", None) != SNAPSHOT_VERSION or snapshot.content_hash != content_hash:
+        return None
+
+    key = selection_key(snapshot.selections, content_hash)
+    for stage, value in snapshot.results.items():
+        RESULT_CACHE.put((key, stage), value)
+    for figure_key, spec in snapshot.figures.items():
+        FIGURE_CACHE.put(figure_key, spec)
+    return snapshot
+
+
+def shows_default(snapshot: Snapshot) -> bool:
+    """Whether this session still shows the snapshot's view: no saved view picked, no filter or table control changed."""
+    state = st.session_state
+    if state.get("active_view", "") in state.get("saved_views", {}):
+        return False
+    untouched = {**snapshot.selections, **TABLE_DEFAULTS}
+    return all(state.get(key, value) == value for key, value in untouched.items())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="dataset CSV, or a directory or glob of extracts, e.g. data/sample.csv")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    snapshot = build_snapshot(args.path)
+    out = snapshot_path(args.path)
+    write_snapshot(snapshot, out)
+    print(
+        f"{len(snapshot.results)} results, {len(snapshot.figures)} figures in {time.perf_counter() - start:.1f} s "
+        f"-> {out} ({out.stat().st_size / 2**20:.1f} MB)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import tempfile
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+from src.cache import RESULT_CACHE, selection_key
+from src.filters import filtered_positions
+
+# only important rows
+TABLE_COLUMNS = [
+    "YearStart",
+    "YearEnd",
+    "LocationDesc",
+    "Class",
+    "Topic",
+    "Data_Value",
+    "AgeGroup",
+    "DemographicCategory",
+    "Demographic",
+]
+
+PAGE_SIZES = [25, 50, 100, 250]
+DEFAULT_PAGE_SIZE = 50
+CSV_CHUNK_ROWS = 50_000
+
+# the table controls' session state before anyone touches them
+TABLE_DEFAULTS = {
+    "table_search": "",
+    "table_sort": None,
+    "table_descending": False,
+    "table_page_size": DEFAULT_PAGE_SIZE,
+    "table_page": 1,
+}
+
+
+def _value_codes(values: pd.Series) -> tuple[np.ndarray, pd.Index]:
+    """Codes into the distinct values (missing = -1), without formatting every row."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), values.cat.categories
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes, pd.Index(uniques)
+
+
+def search_positions(df: pd.DataFrame, positions: np.ndarray, columns: list[str], query: str) -> np.ndarray:
+    """The positions whose row contains query (case-insensitive) in any of the columns."""
+    match = np.zeros(len(positions), dtype=bool)
+    for col in columns:
+        codes, uniques = _value_codes(df[col].take(positions))
+        # test each distinct value once; the extra last slot catches the -1 code of missing values
+        hit = np.zeros(len(uniques) + 1, dtype=bool)
+        hit[:-1] = uniques.astype(str).str.contains(query, case=False, regex=False)
+        match |= hit[codes]
+    return positions[match]
+
+
+def sort_positions(df: pd.DataFrame, positions: np.ndarray, column: str, descending: bool = False) -> np.ndarray:
+    """The positions ordered by column, ties in dataset order and missing values last."""
+    values = df[column].take(positions)
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        key = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    else:
+        codes, _ = _value_codes(values)
+        key = np.where(codes < 0, np.nan, codes.astype(np.float64))
+    # argsort puts NaN last either way round
+    order = np.argsort(-key if descending else key, kind="stable")
+    return positions[order]
+
+
+def table_positions(
+    df: pd.DataFrame, selections: dict, query: str = "", sort_by: str | None = None, descending: bool = False
+) -> np.ndarray:
+    """Row positions behind the Table view: the selection, searched and sorted, cached per view state."""
+    def _compute():
+        positions = filtered_positions(df, selections)
+        if query:
+            positions = search_positions(df, positions, TABLE_COLUMNS, query)
+        if sort_by:
+            positions = sort_positions(df, positions, sort_by, descending)
+        return positions
+
+    content_hash = df.attrs.get("content_hash")
+    if content_hash is None:
+        return _compute()
+    # a "positions" stage: refresh drops it, since new and removed rows shift positions
+    stage = ("positions", "table", query, sort_by, descending)
+    return RESULT_CACHE.get_or_compute((selection_key(selections, content_hash), stage), _compute)
+
+
+def csv_chunks(
+    df: pd.DataFrame, positions: np.ndarray, columns: list[str], chunk_rows: int = CSV_CHUNK_ROWS
+) -> Iterator[bytes]:
+    """CSV of the rows at positions, header first, formatted chunk_rows at a time."""
+    for start in range(0, max(len(positions), 1), chunk_rows):
+        chunk = df.take(positions[start:start + chunk_rows])[columns]
+        yield chunk.to_csv(index=False, header=start == 0).encode()
+
+
+def first_page(df: pd.DataFrame, selections: dict) -> tuple[pd.DataFrame, int]:
+    """The rows of the table's first page with its controls at TABLE_DEFAULTS, and the number of matching rows."""
+    positions = table_positions(df, selections)
+    return df.take(positions[:DEFAULT_PAGE_SIZE])[TABLE_COLUMNS].reset_index(drop=True), len(positions)
+
+
+def render_table(backend, selections: dict, snapshot_page: tuple[pd.DataFrame, int] | None = None) -> None:
+    """Paginated table of the filtered rows; only the visible page is fetched and sent to the browser.
+
+    backend (src.backend) counts, pages and downloads the rows. snapshot_page,
+    first_page() from a snapshot of the default view, is shown while the controls
+    are at TABLE_DEFAULTS; backend is then only used for the CSV download and may
+    be a function loading it.
+    """
+    columns = list(snapshot_page[0].columns) if snapshot_page is not None else TABLE_COLUMNS
+
+    c1, c2, c3 = st.columns([3, 2, 1])
+    with c1:
+        query = st.text_input("Search", key="table_search", placeholder="Search all columns").strip()
+    with c2:
+        sort_by = st.selectbox(
+            "Sort by", [None] + columns, format_func=lambda c: "Dataset order" if c is None else c, key="table_sort"
+        )
+    with c3:
+        descending = st.toggle("Descending", key="table_descending", disabled=sort_by is None)
+
+    matching = snapshot_page[1] if snapshot_page is not None else backend.table_count(selections, query)
+
+    c1, c2, c3 = st.columns([3, 2, 1])
+    with c2:
+        page_size = st.selectbox(
+            "Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE), key="table_page_size"
+        )
+    pages = max(1, -(-matching // page_size))
+    # a narrower selection can leave the remembered page past the end
+    if st.session_state.get("table_page", 1) > pages:
+        st.session_state.table_page = pages
+    with c3:
+        page = st.number_input("Page", min_value=1, max_value=pages, step=1, key="table_page")
+    with c1:
+        st.caption(f"{matching:,} matching rows, page {page} of {pages}")
+
+    if snapshot_page is not None:
+        page_rows = snapshot_page[0]
+    else:
+        page_rows = backend.table_page(selections, query, sort_by, descending, (page - 1) * page_size, page_size)
+    st.dataframe(pa.Table.from_pandas(page_rows, preserve_index=False), use_container_width=True, height=420)
+
+    def _csv():
+        # built on click, a chunk at a time, into a temporary file rather than one large string
+        source = backend() if callable(backend) else backend
+        out = tempfile.TemporaryFile()
+        for chunk in source.table_csv(selections, query, sort_by, descending):
+            out.write(chunk)
+        out.seek(0)
+        return out
+
+    st.download_button(
+        "Download matching rows (CSV)",
+        data=_csv,
+        file_name="filtered_rows.csv",
+        mime="text/csv",
+        on_click="ignore",
+    )
@@ -0,0 +1,106 @@
+"""Span timing for one rerun of the app.
+
+    with span("apply_filters", rows_in=len(df)) as s:
+        df_f = apply_filters(df, selections)
+        s.rows_out = len(df_f)
+
+Spans are recorded only between start_trace(True) and finish_trace(); otherwise
+span() hands back a shared object that does nothing, so instrumented code costs
+one attribute lookup per stage. Set DASHBOARD_TRACE_LOG to a file path to append
+every recorded span there as a JSON line.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any
+
+from src.cache import thread_lookups
+
+TRACE_LOG = os.environ.get("DASHBOARD_TRACE_LOG")
+
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+class Span:
+    """One timed stage; set rows_out inside the block when it's known."""
+
+    def __init__(self, trace: list[dict], name: str, rows_in: int | None, memoized: bool):
+        self.trace = trace
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        # memoized: a st.cache_* call that counts only its misses, so no miss means a hit
+        self.memoized = memoized
+
+    def __enter__(self) -> "Span":
+        self.depth = _local.depth
+        _local.depth += 1
+        self.lookups = thread_lookups()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        seconds = time.perf_counter() - self.start
+        _local.depth -= 1
+        hits, misses = thread_lookups()
+        hits, misses = hits - self.lookups[0], misses - self.lookups[1]
+        if self.memoized and not misses:
+            hits += 1
+        self.trace.append({
+            "span": self.name,
+            "depth": self.depth,
+            "start_ms": round((self.start - _local.origin) * 1000, 3),
+            "ms": round(seconds * 1000, 3),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "cache_hits": hits,
+            "cache_misses": misses,
+        })
+
+
+class _NoSpan:
+    def __enter__(self) -> "_NoSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, rows_in: int | None = None, memoized: bool = False) -> Span | _NoSpan:
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        return _NO_SPAN
+    return Span(trace, name, rows_in, memoized)
+
+
+def start_trace(enabled: bool) -> None:
+    """Begin recording spans on this thread for the rerun that is starting."""
+    _local.trace = [] if enabled else None
+    _local.depth = 0
+    _local.started = time.time()
+    _local.origin = time.perf_counter()
+
+
+def finish_trace(session_id: str) -> list[dict]:
+    """Stop recording and return the rerun's spans in start order, logging them if configured."""
+    trace = getattr(_local, "trace", None)
+    _local.trace = None
+    if not trace:
+        return []
+    trace.sort(key=lambda record: record["start_ms"])
+
+    if TRACE_LOG:
+        started = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(_local.started))
+        lines = "".join(json.dumps({"ts": started, "session": session_id, **record}) + "\n" for record in trace)
+        # sessions run on separate threads; one write per rerun keeps their lines whole
+        with _log_lock, open(TRACE_LOG, "a") as f:
+            f.write(lines)
+    return trace
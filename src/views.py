@@ -0,0 +1,96 @@
+"""Saved views kept in a SQLite file.
+
+Views are stored in the shape render_filters saves them, shared by every
+session of the app and kept across restarts. Each switch to a view counts as
+a use; src.prewarm computes the most used ones ahead of time.
+"""
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+import streamlit as st
+
+logger = logging.getLogger(__name__)
+
+VIEW_DB = os.environ.get("DASHBOARD_VIEW_DB", "data/views.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS views (
+    name TEXT PRIMARY KEY,
+    definition TEXT NOT NULL,
+    uses INTEGER NOT NULL DEFAULT 0,
+    last_used REAL
+)
+"""
+
+
+def _decode(definition: str) -> dict:
+    view = json.loads(definition)
+    # JSON has no tuples; the year slider wants one back
+    view["rt_range"] = tuple(view["rt_range"])
+    return view
+
+
+class ViewStore:
+    """Named views in a SQLite file; with no writable file, the store is empty and saves are dropped."""
+
+    def __init__(self, path: str | Path = VIEW_DB):
+        self.path = Path(path)
+        self.available = True
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._execute(_SCHEMA)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("saved views will not persist, %s is not usable: %s", self.path, e)
+            self.available = False
+
+    def _execute(self, sql: str, params: tuple = ()) -> list[tuple]:
+        # a connection per call: sessions run on separate threads and sqlite3 connections are per thread
+        with closing(sqlite3.connect(self.path, timeout=5)) as con, con:
+            return con.execute(sql, params).fetchall()
+
+    def _try(self, sql: str, params: tuple = ()) -> list[tuple]:
+        if not self.available:
+            return []
+        try:
+            return self._execute(sql, params)
+        except sqlite3.Error as e:
+            logger.warning("saved view store %s: %s", self.path, e)
+            return []
+
+    def views(self) -> dict[str, dict]:
+        return {name: _decode(definition) for name, definition in self._try("SELECT name, definition FROM views ORDER BY name")}
+
+    def save(self, name: str, view: dict) -> None:
+        definition = json.dumps({**view, "rt_range": list(view["rt_range"])})
+        # re-saving a name replaces its definition but keeps its use count
+        self._try(
+            "INSERT INTO views (name, definition) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET definition = excluded.definition",
+            (name, definition),
+        )
+
+    def record_use(self, name: str) -> None:
+        self._try("UPDATE views SET uses = uses + 1, last_used = ? WHERE name = ?", (time.time(), name))
+
+    def delete(self, name: str) -> None:
+        self._try("DELETE FROM views WHERE name = ?", (name,))
+
+    def clear(self) -> None:
+        self._try("DELETE FROM views")
+
+    def most_used(self, limit: int) -> dict[str, dict]:
+        """Up to `limit` views that have been used, most used first."""
+        rows = self._try(
+            "SELECT name, definition FROM views WHERE uses > 0 ORDER BY uses DESC, last_used DESC LIMIT ?", (limit,)
+        )
+        return {name: _decode(definition) for name, definition in rows}
+
+
+@st.cache_resource(show_spinner=False)
+def get_view_store(path: str = VIEW_DB) -> ViewStore:
+    return ViewStore(path)
@@ -0,0 +1,18 @@
+import os
+import tempfile
+
+# tests never share the app's on-disk result cache or saved views
+os.environ["DASHBOARD_DISK_CACHE"] = ""
+os.environ["DASHBOARD_VIEW_DB"] = os.path.join(tempfile.mkdtemp(), "views.sqlite")
+
+import pytest
+
+from benchmarks.generate import write_csv
+
+TEST_ROWS = 20_000
+
+
+@pytest.fixture(scope="session")
+def dataset_path(tmp_path_factory) -> str:
+    """A synthetic export (benchmarks.generate) in a directory of its own, so derived files land next to it."""
+    return str(write_csv(TEST_ROWS, tmp_path_factory.mktemp("data") / "synthetic.csv"))
@@ -0,0 +1,164 @@
+import re
+from pathlib import Path
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.generate import write_csv
+from src.cache import RESULT_CACHE
+from src.data import dataset_hash
+from src.layouts import VIEWS
+from src.prewarm import start_prewarm
+from src.views import VIEW_DB, ViewStore
+
+APP = str(Path(__file__).parent.parent / "app.py")
+
+
+@pytest.fixture
+def app(dataset_path, monkeypatch):
+    monkeypatch.setenv("DASHBOARD_DATA_PATH", dataset_path)
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.run()
+    assert not at.exception
+    return at
+
+
+def _count(label: str) -> int:
+    return int(re.search(r"\(([\d,]+)\)$", label).group(1).replace(",", ""))
+
+
+def _total_records(at: AppTest) -> int:
+    return int(next(m.value for m in at.metric if m.label == "Total Records"))
+
+
+def _table_caption(at: AppTest) -> str:
+    return next(c.value for c in at.caption if "matching rows" in c.value)
+
+
+def test_option_counts_follow_a_changed_saved_view(app):
+    view = {
+        "AgeGroup": "All Age Groups",
+        "Demographic": "Female",
+        "Topic": [],
+        "rt_range": app.slider(key="rt_range").value,
+        "cap_outliers": False,
+    }
+    ViewStore(VIEW_DB).save("female", view)
+    app.run()
+    app.selectbox(key="active_view").set_value("female").run()
+    app.selectbox(key="Demographic").set_value("Male").run()
+    assert not app.exception
+
+    ages = app.selectbox(key="AgeGroup")
+    # "All Age Groups (n)" counts the rows the current filters match, which the KPI row totals too
+    assert _count(ages.options[0]) == _total_records(app)
+
+
+def test_prewarmed_view_opens_from_the_result_cache(tmp_path, monkeypatch):
+    # a dataset of its own, so the prewarm for its version starts after the view below is stored
+    path = str(write_csv(5_000, tmp_path / "prewarm.csv", seed=1))
+    monkeypatch.setenv("DASHBOARD_DATA_PATH", path)
+    store = ViewStore(VIEW_DB)
+    view = {
+        "AgeGroup": "65 years or older",
+        "Demographic": "Female",
+        "Topic": [],
+        "rt_range": (2016, 2021),
+        "cap_outliers": False,
+    }
+    store.save("prewarmed", view)
+    store.record_use("prewarmed")
+
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.run()
+    # the prewarm thread of this dataset version; start_prewarm hands back the one already started
+    start_prewarm(dataset_hash(path), None, store).join()
+
+    misses = RESULT_CACHE.stats()["misses"]
+    at.selectbox(key="active_view").set_value("prewarmed").run()
+    assert not at.exception
+    assert at.selectbox(key="Demographic").value == "Female"
+    assert RESULT_CACHE.stats()["misses"] == misses
+
+
+def test_deleting_a_view_reaches_other_sessions(app):
+    store = ViewStore(VIEW_DB)
+    store.save("shared", {
+        "AgeGroup": "All Age Groups",
+        "Demographic": "Male",
+        "Topic": [],
+        "rt_range": app.slider(key="rt_range").value,
+        "cap_outliers": False,
+    })
+    other = AppTest.from_file(APP, default_timeout=60)
+    other.run()
+    assert "shared" in other.selectbox(key="active_view").options
+
+    app.run()
+    app.selectbox(key="active_view").set_value("shared").run()
+    next(b for b in app.button if b.label.startswith("Delete selected view")).click().run()
+    assert not app.exception
+    assert "shared" not in store.views()
+    # the deleting session is back on the default view, filters included
+    assert app.selectbox(key="Demographic").value == "All"
+
+    other.run()
+    assert "shared" not in other.selectbox(key="active_view").options
+
+
+def test_only_the_chosen_chart_view_is_computed(app, monkeypatch):
+    drawn = []
+    for label in list(VIEWS):
+        monkeypatch.setitem(VIEWS, label, lambda df, label=label: drawn.append(label))
+    first, second = list(VIEWS)[:2]
+
+    app.run()
+    assert drawn == [first]
+    app.radio(key="chart_picker").set_value(second).run()
+    assert drawn == [first, second]
+    # the Table tab draws no chart at all
+    app.radio(key="main_tab").set_value("Table").run()
+    assert not app.exception
+    assert drawn == [first, second]
+
+
+def test_the_table_sends_only_the_page_shown(app):
+    app.radio(key="main_tab").set_value("Table").run()
+    app.selectbox(key="table_page_size").set_value(25).run()
+    app.number_input(key="table_page").set_value(3).run()
+    assert not app.exception
+
+    page = app.dataframe[0].value
+    assert len(page) == 25
+    assert _table_caption(app) == f"{_total_records(app):,} matching rows, page 3 of {-(-_total_records(app) // 25)}"
+    # a search with fewer matches than the remembered page moves back to the last page
+    app.text_input(key="table_search").set_value("no row has this").run()
+    assert not app.exception
+    assert app.number_input(key="table_page").value == 1
+    assert _table_caption(app) == "0 matching rows, page 1 of 1"
+    assert len(app.dataframe[0].value) == 0
+
+
+def test_clearing_all_views_reaches_other_sessions(app):
+    store = ViewStore(VIEW_DB)
+    for name, demographic in (("first", "Male"), ("second", "Female")):
+        store.save(name, {
+            "AgeGroup": "All Age Groups",
+            "Demographic": demographic,
+            "Topic": [],
+            "rt_range": app.slider(key="rt_range").value,
+            "cap_outliers": False,
+        })
+    other = AppTest.from_file(APP, default_timeout=60)
+    other.run()
+
+    app.run()
+    app.selectbox(key="active_view").set_value("second").run()
+    next(b for b in app.button if b.label.startswith("Clear All Saved Views")).click().run()
+    assert not app.exception
+    assert store.views() == {}
+    assert app.selectbox(key="Demographic").value == "All"
+    assert next(b for b in app.button if b.label.startswith("Clear All Saved Views")).disabled
+
+    other.run()
+    assert {"first", "second"}.isdisjoint(other.selectbox(key="active_view").options)
@@ -0,0 +1,75 @@
+import pytest
+
+pytest.importorskip("duckdb")
+
+from benchmarks.bench_backend import differences, outputs
+from benchmarks.suite import SELECTIONS
+from src import backend
+from src.backend import DuckDBBackend, PandasBackend
+from src.cache import RESULT_CACHE
+from src.cube import read_cube
+from src.data import APP_COLUMNS, compact_frame, dataset_hash, read_dataset
+from src.filters import get_filter_index
+from src.sketch import SKETCH_DIMENSIONS, SKETCH_POINTS, build_sketch
+
+
+@pytest.fixture(scope="module")
+def backends(dataset_path):
+    content_hash = dataset_hash(dataset_path)
+    # the frame load_data gives the app
+    df = compact_frame(read_dataset(dataset_path, APP_COLUMNS))
+    df.attrs["content_hash"] = content_hash
+    # each backend computes its own results rather than reading the other's from the shared cache
+    RESULT_CACHE.clear()
+    return PandasBackend(df, read_cube(dataset_path)), DuckDBBackend(dataset_path, content_hash)
+
+
+@pytest.mark.parametrize("name", list(SELECTIONS))
+def test_backends_agree(backends, name):
+    pandas_backend, duckdb_backend = backends
+    expected = outputs(pandas_backend, SELECTIONS[name])
+    RESULT_CACHE.clear()
+    got = outputs(duckdb_backend, SELECTIONS[name])
+    RESULT_CACHE.clear()
+    assert differences(expected, got) == []
+
+
+def test_differences_sees_a_changed_value(backends):
+    pandas_backend, _ = backends
+    expected = outputs(pandas_backend, SELECTIONS["default"])
+    changed = dict(expected, rows=expected["rows"].assign(Data_Value=expected["rows"]["Data_Value"] + 1e-6))
+    assert differences(expected, changed) == ["rows"]
+
+
+@pytest.mark.parametrize("name", ["default", "age_sex", "cap_outliers"])
+@pytest.mark.parametrize("query, sort_by, descending", [("", None, False), ("smok", "Data_Value", True), ("ia", "LocationDesc", False)])
+def test_table_pages_the_same_rows(backends, name, query, sort_by, descending):
+    selections = SELECTIONS[name]
+    count = {backend.name: backend.table_count(selections, query) for backend in backends}
+    assert count["pandas"] == count["duckdb"] > 0
+    for offset in (0, 250, max(count["pandas"] - 7, 0)):
+        expected, got = (backend.table_page(selections, query, sort_by, descending, offset, 100) for backend in backends)
+        assert len(got) == max(min(100, count["pandas"] - offset), 0)
+        assert differences({"page": expected}, {"page": got}) == []
+    expected, got = (b"".join(backend.table_csv(selections, query, sort_by, descending)) for backend in backends)
+    assert got == expected
+    RESULT_CACHE.clear()
+
+
+@pytest.mark.parametrize("points", [SKETCH_POINTS, 4])
+def test_duckdb_builds_the_filter_index_sketch(backends, dataset_path, monkeypatch, points):
+    pandas_backend, _ = backends
+    # few points per slice, so the 20k rows have compressed slices too
+    monkeypatch.setattr(backend, "SKETCH_POINTS", points)
+    duckdb_backend = DuckDBBackend(dataset_path, pandas_backend.df.attrs["content_hash"])
+    duckdb_backend.cap_cutoff(SELECTIONS["cap_outliers"])
+    got = duckdb_backend._sketch
+    expected = build_sketch(pandas_backend.df, get_filter_index(pandas_backend.df).ci_width, points)
+
+    def _sorted(sketch):
+        # points that tie on value and weight may come in either order; the dictionaries differ
+        keys = sketch.astype({col: str for col in SKETCH_DIMENSIONS})
+        return sketch.loc[keys.sort_values(["value", "weight", *SKETCH_DIMENSIONS]).index].reset_index(drop=True)
+
+    assert differences({"sketch": _sorted(expected)}, {"sketch": _sorted(got[expected.columns])}) == []
+    assert (got["weight"] > 1).any() == (points < SKETCH_POINTS)
@@ -0,0 +1,47 @@
+import threading
+
+import numpy as np
+
+from src.cache import ResultCache, selection_key
+
+SELECTIONS = {"AgeGroup": "All Age Groups", "Demographic": "Female", "Topic": ["B", "A"], "rt_range": (2015, 2020)}
+
+
+def test_equivalent_selections_share_a_key():
+    reordered = {**SELECTIONS, "Topic": ["A", "B"], "rt_range": [np.int64(2015), 2020], "cap_outliers": False}
+    assert selection_key(SELECTIONS, "hash") == selection_key(reordered, "hash")
+    assert selection_key(SELECTIONS, "hash") != selection_key(SELECTIONS, "other hash")
+    assert selection_key(SELECTIONS, "hash") != selection_key({**SELECTIONS, "cap_outliers": True}, "hash")
+
+
+def test_least_recently_used_values_go_first_past_the_byte_budget():
+    value = np.zeros(1_000, dtype=np.uint8)
+    cache = ResultCache(max_bytes=3 * value.nbytes)
+    for key in "abc":
+        cache.put(key, value)
+    cache.get("a")
+    cache.put("d", value)
+
+    assert [key for key, _ in cache.items()] == ["c", "a", "d"]
+    assert cache.stats()["evictions"] == 1
+    # a value larger than the whole budget is never held
+    cache.put("huge", np.zeros(4_000, dtype=np.uint8))
+    assert not cache.get("huge")[0]
+
+
+def test_concurrent_sessions_compute_once_after_the_first_result():
+    cache = ResultCache(max_bytes=2**20)
+    calls = []
+    cache.get_or_compute("key", lambda: calls.append(1) or "value")
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute("key", lambda: calls.append(1))))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["value"] * 8 and len(calls) == 1
+    assert cache.stats()["hits"] == 8
@@ -0,0 +1,35 @@
+import pandas as pd
+import plotly.graph_objects as go
+
+from src.cache import frame_digest
+from src.charts import FIGURE_STATS, show_figure
+
+
+def _yearly(percent: list[float]) -> pd.DataFrame:
+    return pd.DataFrame({"YearEnd": range(2015, 2015 + len(percent)), "Percent": percent})
+
+
+def test_equal_aggregates_share_one_figure():
+    builds = []
+
+    def _show(data: pd.DataFrame, **params) -> None:
+        show_figure("test_trend", data, lambda: builds.append(1) or go.Figure(go.Scatter(x=data["YearEnd"])), **params)
+
+    # a frame built again from the same values, as on a rerun or in another session
+    _show(_yearly([10.0, 12.5, 11.0]))
+    _show(_yearly([10.0, 12.5, 11.0]))
+    assert len(builds) == 1
+    assert FIGURE_STATS["test_trend"]["hits"] == 1 and FIGURE_STATS["test_trend"]["misses"] == 1
+
+    # other values, or other inputs than the frame, are another figure
+    _show(_yearly([10.0, 12.5, 11.5]))
+    _show(_yearly([10.0, 12.5, 11.0]), overall_avg=11.2)
+    assert len(builds) == 3
+
+
+def test_frame_digest_follows_values_and_dtypes():
+    frame = _yearly([10.0, 12.5, 11.0])
+    assert frame_digest(frame) == frame_digest(frame.copy())
+    assert frame_digest(frame) != frame_digest(frame.astype({"YearEnd": "float64"}))
+    assert frame_digest(frame) != frame_digest(frame.rename(columns={"Percent": "Count"}))
+    assert frame_digest(frame) != frame_digest(frame.iloc[::-1])
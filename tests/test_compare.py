@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.compare import compare_periods
+from src.cube import LIMITS_CONFIDENCE, build_cube, to_measures
+
+BASE, TARGET = (2015, 2015), (2020, 2020)
+
+
+def _rows(values: list[tuple[int, float, float]]) -> pd.DataFrame:
+    """Rows of one state × topic × demographic cell: (year, Data_Value, half-width of its limits)."""
+    years = [year for year, _, _ in values]
+    value = np.array([v for _, v, _ in values])
+    half = np.array([h for _, _, h in values])
+    return pd.DataFrame({
+        "YearStart": years,
+        "YearEnd": years,
+        "Class": "Overall Health",
+        "Topic": "Obesity",
+        "AgeGroup": "65 years or older",
+        "DemographicCategory": "Sex",
+        "Demographic": "Female",
+        "LocationAbbr": "CA",
+        "Data_Value": value,
+        "Low_Confidence_Limit": value - half,
+        "High_Confidence_Limit": value + half,
+    })
+
+
+@pytest.mark.parametrize("half, significant", [(1.0, True), (8.0, False)])
+def test_significance_follows_the_published_limits(half, significant):
+    # one value per window: no spread to estimate from, only the rows' limits
+    cells = compare_periods(to_measures(_rows([(2015, 20.0, half), (2020, 30.0, half)])), BASE, TARGET)
+    assert len(cells) == 1
+    assert cells["Delta"].iloc[0] == pytest.approx(10.0)
+    assert bool(cells["Significant"].iloc[0]) is significant
+
+
+def test_cube_and_raw_rows_give_the_same_interval():
+    rows = _rows([(2015, 20.0, 2.0), (2015, 22.0, 3.0), (2020, 25.0, 1.5), (2020, 27.0, 2.5)])
+    from_cube = compare_periods(build_cube(rows), BASE, TARGET)
+    from_rows = compare_periods(to_measures(rows), BASE, TARGET)
+    pd.testing.assert_frame_equal(from_cube, from_rows)
+    # the two windows' means each average two values with known standard errors
+    z = 1.959963984540054
+    se = np.sqrt((2.0**2 + 3.0**2) / z**2 + (1.5**2 + 2.5**2) / z**2) / 2
+    assert LIMITS_CONFIDENCE == 0.95
+    assert from_cube["High"].iloc[0] - from_cube["Delta"].iloc[0] == pytest.approx(z * se)
+
+
+def test_a_value_without_limits_is_never_significant():
+    rows = _rows([(2015, 20.0, 0.5), (2020, 30.0, 0.5)])
+    rows.loc[0, "Low_Confidence_Limit"] = np.nan
+    cells = compare_periods(to_measures(rows), BASE, TARGET)
+    assert not cells["Significant"].iloc[0]
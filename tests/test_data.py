@@ -0,0 +1,85 @@
+import pandas as pd
+import pytest
+
+from benchmarks.generate import write_csv
+from src.data import (
+    APP_COLUMNS,
+    TARGET_CLASSES,
+    columnar_path,
+    dataset_hash,
+    read_csv_streaming,
+    read_dataset,
+    snapshot_hash,
+)
+
+
+def _baseline(path) -> pd.DataFrame:
+    """The dashboard rows as the app read them before the Parquet copy: the whole CSV, then masks."""
+    df = pd.read_csv(path)
+    df = df[(df["AgeGroup"] != "Overall") & df["Class"].isin(TARGET_CLASSES)]
+    return df[APP_COLUMNS].reset_index(drop=True)
+
+
+def _as_values(df: pd.DataFrame) -> pd.DataFrame:
+    categorical = [col for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)]
+    return df.astype({col: object for col in categorical})
+
+
+@pytest.fixture
+def export(tmp_path):
+    return write_csv(3_000, tmp_path / "export.csv", seed=3)
+
+
+def test_parquet_copy_reads_back_the_csvs_rows(export):
+    df = read_dataset(export, APP_COLUMNS)
+    assert snapshot_hash(columnar_path(export)) == dataset_hash(export) == df.attrs["content_hash"]
+    assert isinstance(df["Topic"].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(_as_values(df), _baseline(export), check_dtype=False)
+
+
+def test_a_changed_csv_rebuilds_its_parquet_copy(export):
+    old_hash = read_dataset(export, APP_COLUMNS).attrs["content_hash"]
+
+    # keep the header and every other line: a smaller export under the same name
+    lines = export.read_text().splitlines(keepends=True)
+    export.write_text("".join(lines[:1] + lines[1::2]))
+    df = read_dataset(export, APP_COLUMNS)
+
+    assert df.attrs["content_hash"] != old_hash
+    assert snapshot_hash(columnar_path(export)) == df.attrs["content_hash"]
+    pd.testing.assert_frame_equal(_as_values(df), _baseline(export), check_dtype=False)
+
+
+def test_streaming_reader_matches_the_parquet_copy(export):
+    # chunks far smaller than the file, so the predicate and dictionaries span many of them
+    streamed = read_csv_streaming(export, ["YearStart", "Topic", "Data_Value"], chunksize=257)
+    assert list(streamed.columns) == ["YearStart", "Topic", "Data_Value"]
+    expected = read_dataset(export, ["YearStart", "Topic", "Data_Value"])
+    pd.testing.assert_frame_equal(_as_values(streamed), _as_values(expected), check_dtype=False)
+    assert list(streamed["Topic"].cat.categories) == sorted(streamed["Topic"].cat.categories)
+    assert streamed.attrs["content_hash"] == dataset_hash(export)
+
+
+def test_a_directory_of_extracts_reads_as_their_union(tmp_path):
+    # extracts of different seeds hold different subsets of each dimension
+    extracts = tmp_path / "extracts"
+    extracts.mkdir()
+    files = [write_csv(rows, extracts / f"{name}.csv", seed=seed) for name, rows, seed in (("b", 1_200, 5), ("a", 900, 4), ("c", 700, 6))]
+    expected = pd.concat([_baseline(file) for file in sorted(files)], ignore_index=True)
+
+    for spec in (extracts, extracts / "*.csv"):
+        df = read_dataset(spec, APP_COLUMNS)
+        pd.testing.assert_frame_equal(_as_values(df), expected, check_dtype=False)
+        categories = list(df["Topic"].cat.categories)
+        assert categories == sorted(categories) and set(expected["Topic"]) <= set(categories)
+        assert df.attrs["content_hash"] == dataset_hash(spec)
+    old_hash = dataset_hash(extracts)
+    assert old_hash not in {dataset_hash(file) for file in files}
+
+    # one extract changing changes the dataset's hash and its rows
+    lines = files[0].read_text().splitlines(keepends=True)
+    files[0].write_text("".join(lines[:1] + lines[1::2]))
+    df = read_dataset(extracts, APP_COLUMNS)
+    assert df.attrs["content_hash"] != old_hash
+    expected = pd.concat([_baseline(file) for file in sorted(files)], ignore_index=True)
+    pd.testing.assert_frame_equal(_as_values(df), expected, check_dtype=False)
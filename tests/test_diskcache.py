@@ -0,0 +1,58 @@
+from pathlib import Path
+
+import numpy as np
+
+from src import diskcache
+from src.diskcache import MMAP_MIN_BYTES, DiskCache, disk_cache_dir
+
+
+def test_directory_is_next_to_the_dataset(monkeypatch):
+    monkeypatch.setattr(diskcache, "DISK_CACHE_DIR", "cache")
+    assert disk_cache_dir("/srv/data/sample.csv") == Path("/srv/data/cache")
+    assert disk_cache_dir("/srv/extracts/*.csv") == Path("/srv/extracts/cache")
+    monkeypatch.setattr(diskcache, "DISK_CACHE_DIR", "/var/cache/dashboard")
+    assert disk_cache_dir("/srv/data/sample.csv") == Path("/var/cache/dashboard")
+    monkeypatch.setattr(diskcache, "DISK_CACHE_DIR", "")
+    assert disk_cache_dir("/srv/data/sample.csv") is None
+
+
+def test_queued_writes_reach_another_process(tmp_path):
+    cache = DiskCache(tmp_path, 2**30)
+    large = np.arange(MMAP_MIN_BYTES // 8 + 1, dtype=np.int64)
+    for i in range(40):
+        cache.put(("key", i), {"value": i})
+    cache.put(("key", "large"), large)
+    # nothing is read back until the writer thread has indexed it
+    cache.flush()
+
+    other = DiskCache(tmp_path, 2**30)
+    assert other.stats()["entries"] == 41
+    assert other.get(("key", 7)) == (True, {"value": 7})
+    found, value = other.get(("key", "large"))
+    assert found and isinstance(value, np.memmap)
+    np.testing.assert_array_equal(value, large)
+
+
+def test_batches_evict_past_the_budget(tmp_path):
+    cache = DiskCache(tmp_path, 64 * 2**10)
+    for i in range(50):
+        cache.put(("key", i), bytes(4 * 2**10))
+    cache.flush()
+    assert cache.stats()["bytes"] <= 64 * 2**10
+    assert cache.get(("key", 49))[0]
+    assert not cache.get(("key", 0))[0]
+
+
+def test_a_version_bump_misses_older_entries(tmp_path, monkeypatch):
+    cache = DiskCache(tmp_path, 2**30)
+    cache.put(("key", 1), {"value": 1})
+    cache.flush()
+    assert cache.get(("key", 1)) == (True, {"value": 1})
+
+    monkeypatch.setattr(diskcache, "CACHE_VERSION", diskcache.CACHE_VERSION + 1)
+    # a process of the new release, over the same directory
+    upgraded = DiskCache(tmp_path, 2**30)
+    assert upgraded.get(("key", 1)) == (False, None)
+    upgraded.put(("key", 1), {"value": "new shape"})
+    upgraded.flush()
+    assert upgraded.get(("key", 1)) == (True, {"value": "new shape"})
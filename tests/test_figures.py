@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.suite import SELECTIONS as SUITE
+from src.cube import read_cube, slice_cube, to_measures
+from src.data import APP_COLUMNS, read_dataset
+from src.figures import demographic_counts, state_counts, yearly_trend
+from src.filters import apply_filters
+
+# the cube serves every selection without the outlier cap
+SELECTIONS = {name: selections for name, selections in SUITE.items() if not selections.get("cap_outliers")}
+
+
+@pytest.fixture(scope="module")
+def sources(dataset_path):
+    return read_dataset(dataset_path, APP_COLUMNS), read_cube(dataset_path)
+
+
+@pytest.mark.parametrize("name", SELECTIONS)
+def test_chart_aggregates_match_from_the_cube_and_from_raw_rows(sources, name):
+    df, cube = sources
+    selections = SELECTIONS[name]
+    from_cube = slice_cube(cube, selections)
+    from_rows = to_measures(apply_filters(df, selections))
+    assert len(from_rows) > 0 and len(from_cube) < len(from_rows)
+
+    (yearly, overall), (yearly_raw, overall_raw) = yearly_trend(from_cube), yearly_trend(from_rows)
+    pd.testing.assert_frame_equal(yearly, yearly_raw, check_dtype=False)
+    assert np.isclose(overall, overall_raw)
+
+    for category in from_rows["DemographicCategory"].dropna().unique():
+        # equal counts may come out in either order, so compare by label
+        counts = demographic_counts(from_cube, category).sort_values("Demographic", ignore_index=True)
+        counts_raw = demographic_counts(from_rows, category).sort_values("Demographic", ignore_index=True)
+        pd.testing.assert_frame_equal(counts, counts_raw, check_dtype=False)
+
+    pd.testing.assert_frame_equal(state_counts(from_cube), state_counts(from_rows), check_dtype=False)
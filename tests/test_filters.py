@@ -0,0 +1,109 @@
+import random
+
+import numpy as np
+import pytest
+
+from src.cache import RESULT_CACHE
+from src.cube import build_cube, select_measures
+from src.data import APP_COLUMNS, compact_frame, read_dataset
+from src.filters import CAP_QUANTILE, apply_filters, build_filter_index, cap_cutoff, selected_positions
+
+CAPPED_SELECTIONS = [
+    {"AgeGroup": "All Age Groups", "Demographic": "All", "Topic": [], "rt_range": (2015, 2022), "cap_outliers": True},
+    {"AgeGroup": "50-64 years", "Demographic": "All", "Topic": [], "rt_range": (2018, 2020), "cap_outliers": True},
+    {"AgeGroup": "65 years or older", "Demographic": "Female", "Topic": [], "rt_range": (2016, 2021), "cap_outliers": True},
+]
+
+
+@pytest.fixture(scope="module")
+def tied_widths(dataset_path):
+    """The dataset with limits published to one decimal and few distinct widths, so many rows tie the cap cutoff."""
+    df = read_dataset(dataset_path, APP_COLUMNS)
+    rng = np.random.default_rng(0)
+    low = rng.uniform(5, 60, len(df)).round(1)
+    width = rng.choice([2.3, 4.7, 8.1, 12.9], len(df), p=[0.4, 0.3, 0.2, 0.1])
+    df["Low_Confidence_Limit"] = low
+    df["High_Confidence_Limit"] = (low + width).round(1)
+    return df
+
+
+@pytest.mark.parametrize("selections", CAPPED_SELECTIONS)
+def test_cap_keeps_the_same_rows_on_a_compacted_frame(tied_widths, selections):
+    raw = tied_widths.copy()
+    compact = compact_frame(tied_widths)
+    # distinct hashes, so each frame builds its own filter index and cache entries
+    raw.attrs = {"content_hash": "test-uncompacted"}
+    compact.attrs = {"content_hash": "test-compacted"}
+
+    expected = apply_filters(raw, selections)
+    got = apply_filters(compact, selections)
+    assert len(got) > 0
+    np.testing.assert_array_equal(got.index.to_numpy(), expected.index.to_numpy())
+    np.testing.assert_array_equal(got["Data_Value"].to_numpy(), expected["Data_Value"].to_numpy())
+
+
+def test_frames_without_a_content_hash_share_no_results(dataset_path):
+    df = read_dataset(dataset_path, APP_COLUMNS)
+    df.attrs = {}
+    halved = df.iloc[: len(df) // 2].reset_index(drop=True)
+    selections = CAPPED_SELECTIONS[0]
+    RESULT_CACHE.clear()
+
+    for frame in (df, halved):
+        rows = apply_filters(frame, selections)
+        measures, source = select_measures(frame, build_cube(frame), selections)
+        assert "selection_key" not in rows.attrs and "selection_key" not in measures.attrs
+        assert source == "raw" and measures["rows"].sum() == len(rows)
+    assert RESULT_CACHE.stats()["entries"] == 0
+
+
+def _copy_and_mask(df, selections, cutoff=None):
+    """apply_filters before the filter index: a copy of the frame, then one mask per filter."""
+    out = df.copy()
+    if selections["AgeGroup"] != "All Age Groups":
+        out = out[out["AgeGroup"] == selections["AgeGroup"]]
+    if selections["Demographic"] != "All":
+        out = out[out["Demographic"] == selections["Demographic"]]
+    if selections["Topic"]:
+        out = out[out["Topic"].isin(selections["Topic"])]
+    lo, hi = selections["rt_range"]
+    out = out[(out["YearStart"] >= lo) & (out["YearEnd"] <= hi)]
+    if selections.get("cap_outliers"):
+        width = (out["High_Confidence_Limit"] - out["Low_Confidence_Limit"]).abs()
+        out = out[width <= (width.quantile(CAP_QUANTILE) if cutoff is None else cutoff)]
+    return out
+
+
+def _random_selections(df, count, seed=0):
+    rng = random.Random(seed)
+    ages = ["All Age Groups"] + sorted(df["AgeGroup"].dropna().unique())
+    demographics = ["All"] + sorted(df["Demographic"].dropna().unique())
+    topics = sorted(df["Topic"].dropna().unique())
+    lo, hi = int(df["YearStart"].min()), int(df["YearEnd"].max())
+    selections = [
+        {"AgeGroup": "All Age Groups", "Demographic": "All", "Topic": [], "rt_range": (lo, hi), "cap_outliers": cap}
+        for cap in (False, True)
+    ]
+    for _ in range(count):
+        start = rng.randint(lo, hi)
+        selections.append({
+            "AgeGroup": rng.choice(ages),
+            "Demographic": rng.choice(demographics),
+            "Topic": rng.sample(topics, rng.randint(0, 3)),
+            "rt_range": (start, rng.randint(start, hi)),
+            "cap_outliers": rng.random() < 0.3,
+        })
+    return selections
+
+
+def test_index_matches_copy_and_mask_row_for_row(dataset_path):
+    df = compact_frame(read_dataset(dataset_path, APP_COLUMNS))
+    index = build_filter_index(df)
+    # nothing matches: a topic no row has
+    empty = {"AgeGroup": "All Age Groups", "Demographic": "All", "Topic": ["No such topic"], "rt_range": (2015, 2022)}
+    for selections in [empty, *_random_selections(df, 300)]:
+        positions = selected_positions(index, selections)
+        cutoff, bound = cap_cutoff(index, selections) if selections.get("cap_outliers") else (None, 0.0)
+        # a slice too large for an exact sketch caps at the sketch's cutoff (src.sketch)
+        expected = _copy_and_mask(df, selections, cutoff if bound > 0 else None)
+        np.testing.assert_array_equal(positions, expected.index.to_numpy())
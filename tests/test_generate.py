@@ -0,0 +1,37 @@
+import pandas as pd
+
+from benchmarks import generate
+from benchmarks.generate import AGE_GROUPS, generate_frame, write_csv
+from src.data import APP_COLUMNS, TARGET_CLASSES
+from src.refresh import ROW_KEY
+
+
+def test_the_same_rows_and_seed_give_the_same_file(tmp_path):
+    first = write_csv(1_500, tmp_path / "a.csv", seed=7).read_bytes()
+    assert write_csv(1_500, tmp_path / "b.csv", seed=7).read_bytes() == first
+    assert write_csv(1_500, tmp_path / "c.csv", seed=8).read_bytes() != first
+
+
+def test_blocks_written_one_at_a_time_make_one_frame(tmp_path, monkeypatch):
+    monkeypatch.setattr(generate, "BLOCK_ROWS", 400)
+    written = pd.read_csv(write_csv(1_000, tmp_path / "blocks.csv", seed=2))
+    assert written["RowId"].tolist() == list(range(1_000))
+
+    frame = generate_frame(1_000, seed=2)
+    assert list(frame.columns) == list(written.columns)
+    pd.testing.assert_frame_equal(frame[["RowId", "YearStart", "Topic"]], written[["RowId", "YearStart", "Topic"]])
+
+
+def test_rows_have_the_shape_of_the_export():
+    df = generate_frame(5_000, seed=3)
+    assert set(APP_COLUMNS + ROW_KEY) <= set(df.columns)
+    assert set(TARGET_CLASSES) <= set(df["Class"]) and set(df["AgeGroup"]) == set(AGE_GROUPS)
+    assert (df["YearStart"] <= df["YearEnd"]).all()
+
+    # a missing estimate has a footnote and no limits; the others sit inside theirs
+    missing = df["Data_Value"].isna()
+    assert 0 < missing.mean() < 0.2
+    assert df.loc[missing, "Data_Value_Footnote"].notna().all()
+    assert df.loc[missing, ["Low_Confidence_Limit", "High_Confidence_Limit"]].isna().all().all()
+    present = df[~missing]
+    assert ((present["Low_Confidence_Limit"] <= present["Data_Value"]) & (present["Data_Value"] <= present["High_Confidence_Limit"])).all()
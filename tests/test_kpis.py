@@ -0,0 +1,96 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.bench_kpis import _per_metric_kpis
+from src.cube import to_measures
+from src.data import APP_COLUMNS, read_dataset
+from src.kpis import (
+    BOOTSTRAP_MIN_CELLS,
+    COGNITIVE_CLASSES,
+    SMOKING_CLASSES,
+    KPIResult,
+    _bootstrap_corr,
+    compute_kpis,
+    paired_corr,
+)
+
+# the engine pairs the correlation by CORR_KEY cell, where header_metrics paired the nth row of each group
+_CORRELATION = {"corr", "corr_low", "corr_high", "corr_sample"}
+
+
+def _paired_measures(smoking: list[float], cognitive: list[float]) -> pd.DataFrame:
+    """One measure record per class group and cell, cells differing by state."""
+    cells = len(smoking)
+    return pd.DataFrame({
+        "Class": pd.Categorical(SMOKING_CLASSES[:1] * cells + COGNITIVE_CLASSES[:1] * cells),
+        "YearEnd": np.full(2 * cells, 2020),
+        "LocationAbbr": pd.Categorical([f"S{i:02d}" for i in range(cells)] * 2),
+        "Demographic": pd.Categorical(["Female"] * 2 * cells),
+        "count": np.ones(2 * cells, dtype=np.int64),
+        "sum": np.array(smoking + cognitive, dtype=np.float64),
+    })
+
+
+def _same(a: KPIResult, b: KPIResult) -> bool:
+    for name, x in vars(a).items():
+        if name in _CORRELATION:
+            continue
+        y = getattr(b, name)
+        if isinstance(x, float) and isinstance(y, float):
+            if not np.isclose(x, y, rtol=1e-9, atol=1e-12, equal_nan=True):
+                return False
+        elif x != y:
+            return False
+    return True
+
+
+def test_fused_engine_matches_the_per_metric_passes(dataset_path):
+    df = read_dataset(dataset_path, APP_COLUMNS)
+    for rows in (df, df[df["Topic"] == df["Topic"].iloc[0]], df.iloc[:0]):
+        assert _same(compute_kpis(to_measures(rows)), _per_metric_kpis(rows))
+
+
+def test_correlation_pairs_cells_not_row_positions():
+    smoking = [float(i % 7) for i in range(BOOTSTRAP_MIN_CELLS * 2)]
+    measures = _paired_measures(smoking, [2 * x + 1 for x in smoking])
+    r, low, high, n = paired_corr(measures.sample(frac=1, random_state=0))
+    # every cell's cognitive mean is a linear function of its smoking mean, in any row order
+    assert n == len(smoking) and r == pytest.approx(1.0) and low == pytest.approx(1.0)
+
+    # the nth smoking row against the nth cognitive one, as before, depends on how the rows happen to be sorted
+    shuffled = measures.sample(frac=1, random_state=0)
+    x = shuffled.loc[shuffled["Class"].isin(SMOKING_CLASSES), "sum"].to_numpy()
+    y = shuffled.loc[shuffled["Class"].isin(COGNITIVE_CLASSES), "sum"].to_numpy()
+    assert np.corrcoef(x, y)[0, 1] < 0.9
+
+
+def test_bootstrap_leaves_degenerate_resamples_out():
+    boot = _bootstrap_corr(np.array([1.0, 2.0, 3.0]), np.array([2.0, 1.0, 4.0]), 2000, 0)
+    finite = boot[np.isfinite(boot)]
+    # a resample repeating one or two pairs has no r; everything else is a correlation
+    assert np.isnan(boot[~np.isfinite(boot)]).all()
+    assert ((finite >= -1) & (finite <= 1)).all()
+
+
+def test_few_cells_get_no_interval():
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        r, low, high, n = paired_corr(_paired_measures([1.0, 2.0, 3.0], [2.0, 1.0, 4.0]))
+    assert n == 3 < BOOTSTRAP_MIN_CELLS
+    assert -1 <= r <= 1
+    assert low is None and high is None
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_interval_is_finite_and_holds_r(seed):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=BOOTSTRAP_MIN_CELLS).round(1)
+    y = (x + rng.normal(scale=0.5, size=len(x))).round(1)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        r, low, high, n = paired_corr(_paired_measures(x.tolist(), y.tolist()))
+    assert n == BOOTSTRAP_MIN_CELLS
+    assert -1 <= low <= r <= high <= 1
@@ -0,0 +1,74 @@
+import pandas as pd
+
+from benchmarks.generate import write_csv
+from src import data, refresh
+from src.cache import ResultCache, selection_key
+from src.data import APP_COLUMNS, TARGET_CLASSES, columnar_path, dataset_hash, read_dataset, read_manifest, read_snapshot
+from src.refresh import apply_refresh_log, refresh_dataset
+
+
+def test_refreshing_one_extract_keeps_the_datasets_untouched_results(tmp_path):
+    extracts = tmp_path / "extracts"
+    first = write_csv(2_000, extracts / "a.csv", seed=1)
+    write_csv(2_000, extracts / "b.csv", seed=2)
+    old_hash = dataset_hash(extracts)
+
+    # the new export of the first extract drops one row the dashboard shows
+    rows = pd.read_csv(first, usecols=["Class", "AgeGroup"])
+    dropped = int(((rows["AgeGroup"] != "Overall") & rows["Class"].isin(TARGET_CLASSES)).to_numpy().argmax())
+    lines = first.read_text().splitlines(keepends=True)
+    export = tmp_path / "a-new.csv"
+    export.write_text("".join(lines[: dropped + 1] + lines[dropped + 2 :]))
+    age = rows["AgeGroup"].iloc[dropped]
+    other_age = next(group for group in rows["AgeGroup"].dropna().unique() if group not in (age, "Overall"))
+
+    selection = {"Demographic": "All", "Topic": [], "rt_range": (2000, 2030), "cap_outliers": False}
+    untouched = {**selection, "AgeGroup": other_age}
+    touched = {**selection, "AgeGroup": "All Age Groups"}
+    cache = ResultCache(2**20)
+    cache.put((selection_key(untouched, old_hash), "kpis"), "kept")
+    cache.put((selection_key(touched, old_hash), "kpis"), "dropped")
+
+    result = refresh_dataset(first, export)
+    assert result.removed == 1 and not result.full_rebuild
+    new_hash = dataset_hash(extracts)
+    apply_refresh_log(extracts, new_hash, cache)
+
+    assert cache.get((selection_key(untouched, new_hash), "kpis")) == (True, "kept")
+    assert not cache.get((selection_key(touched, new_hash), "kpis"))[0]
+    assert cache.stats()["entries"] == 1
+
+
+def test_a_refresh_rewrites_only_the_parts_it_touches(tmp_path, monkeypatch):
+    monkeypatch.setattr(data, "PART_ROWS", 500)
+    monkeypatch.setattr(refresh, "PART_ROWS", 500)
+    path = write_csv(3_100, tmp_path / "data.csv", seed=4)
+    read_dataset(path, APP_COLUMNS)
+    before = [part["file"] for part in read_manifest(columnar_path(path))["parts"]]
+
+    # one row revised in place, one dropped and one brand new one at the end; all in the first part
+    df = pd.read_csv(path)
+    lines = path.read_text().splitlines(keepends=True)
+    at = int(df["Data_Value"].notna().to_numpy().argmax())
+    revised = df.iloc[[at]].assign(Data_Value=df["Data_Value"].iloc[at] + 1)
+    new_row = df.iloc[[at]].assign(YearStart=2100, YearEnd=2100)
+    lines[at + 1] = revised.to_csv(header=False, index=False)
+    del lines[at + 2]
+    export = tmp_path / "export.csv"
+    export.write_text("".join(lines) + new_row.to_csv(header=False, index=False))
+
+    result = refresh_dataset(path, export)
+    assert (result.changed, result.added, result.removed) == (1, 1, 1) and not result.full_rebuild
+    after = [part["file"] for part in read_manifest(columnar_path(path))["parts"]]
+    assert after[1:-1] == before[1:-1]
+    assert after[0] != before[0] and after[-1] != before[-1]
+
+    # the same rows as the export, the revised one still in its place and the new one last
+    rows = read_snapshot(columnar_path(path))
+    expected = pd.read_csv(export)
+    assert rows["Data_Value"].iloc[at] == expected["Data_Value"].iloc[at]
+    assert rows["YearStart"].iloc[-1] == 2100
+    def _sorted(df):
+        return df.astype(object).where(df.notna(), "").astype(str).sort_values(list(df.columns), ignore_index=True)
+
+    pd.testing.assert_frame_equal(_sorted(rows), _sorted(expected))
@@ -0,0 +1,31 @@
+import pytest
+
+from src.cube import read_cube
+from src.data import APP_COLUMNS, compact_frame, read_dataset
+from src.filters import CAP_QUANTILE, build_filter_index, year_bounds
+from src.report import compute_view
+
+
+@pytest.fixture(scope="module")
+def loaded(dataset_path):
+    df = compact_frame(read_dataset(dataset_path, APP_COLUMNS))
+    return df, read_cube(dataset_path), build_filter_index(df)
+
+
+def test_a_view_without_years_covers_the_dataset(loaded):
+    df, cube, index = loaded
+    report = compute_view("all", {}, df, cube, index)
+    assert report.view["rt_range"] == year_bounds(index)
+    assert report.rows == len(df)
+
+
+def test_a_state_view_caps_at_its_own_percentile(loaded):
+    df, cube, index = loaded
+    state = df["LocationAbbr"].value_counts().index[0]
+    report = compute_view("state", {"LocationAbbr": state, "cap_outliers": True}, df, cube, index)
+
+    rows = df[(df["LocationAbbr"] == state).to_numpy()]
+    width = (rows["High_Confidence_Limit"] - rows["Low_Confidence_Limit"]).abs()
+    assert report.rows == int((width <= width.quantile(CAP_QUANTILE)).sum())
+    # the KPIs count the same rows
+    assert report.source == "raw" and report.kpis.total == report.rows
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_quantile import _rank_error
+from src.sketch import SKETCH_POINTS, build_sketch, merged_quantile, select_points
+
+TOPICS = ["Current smoking", "Frequent mental distress", "Lifetime diagnosis of depression"]
+AGES = ["50-64 years", "65 years or older"]
+
+
+def _slices(sizes: list[int], seed: int = 0) -> tuple[pd.DataFrame, np.ndarray]:
+    """One slice per (topic, age) pair, of the given sizes, with skewed values and a few missing."""
+    rng = np.random.default_rng(seed)
+    pairs = [(topic, age) for topic in TOPICS for age in AGES]
+    df = pd.DataFrame(
+        [{"Topic": topic, "AgeGroup": age, "Demographic": "Female", "YearStart": 2019, "YearEnd": 2020}
+         for (topic, age), size in zip(pairs, sizes) for _ in range(size)]
+    )
+    values = rng.lognormal(sigma=1.0, size=len(df))
+    values[rng.random(len(df)) < 0.05] = np.nan
+    return df, values
+
+
+def _selection(topics: list[str], age: str = "All Age Groups") -> dict:
+    return {"AgeGroup": age, "Demographic": "All", "Topic": topics, "rt_range": (2019, 2020)}
+
+
+def _selected(df: pd.DataFrame, values: np.ndarray, selections: dict) -> np.ndarray:
+    mask = np.ones(len(df), dtype=bool)
+    if selections["Topic"]:
+        mask &= df["Topic"].isin(selections["Topic"]).to_numpy()
+    if selections["AgeGroup"] != "All Age Groups":
+        mask &= (df["AgeGroup"] == selections["AgeGroup"]).to_numpy()
+    return values[mask]
+
+
+def test_small_slices_give_the_exact_quantile():
+    df, values = _slices([SKETCH_POINTS, 40, 1, 17, SKETCH_POINTS, 3])
+    sketch = build_sketch(df, values)
+    for selections in (_selection([]), _selection(TOPICS[:2]), _selection([TOPICS[2]], AGES[1])):
+        value, bound = merged_quantile(*select_points(sketch, selections), 0.9)
+        assert bound == 0.0
+        assert value == pd.Series(_selected(df, values, selections)).quantile(0.9)
+
+
+def test_compressed_slices_stay_within_their_rank_error_bound():
+    df, values = _slices([5_000, 800, 2_000, 65, 12_000, 30], seed=1)
+    sketch = build_sketch(df, values)
+    assert len(sketch) < np.isfinite(values).sum() / 10
+
+    selections = [_selection([]), *(_selection([topic]) for topic in TOPICS), *(_selection(TOPICS, age) for age in AGES)]
+    for q in (0.05, 0.5, 0.95):
+        for selection in selections:
+            value, bound = merged_quantile(*select_points(sketch, selection), q)
+            widths = np.sort(_selected(df, values, selection))
+            widths = widths[np.isfinite(widths)]
+            assert 0 < bound <= 1 / SKETCH_POINTS
+            assert _rank_error(widths, value, q) <= bound
@@ -0,0 +1,44 @@
+from dataclasses import replace
+
+import pytest
+
+from benchmarks.generate import write_csv
+from src.cache import RESULT_CACHE, selection_key
+from src.snapshot import SNAPSHOT_VERSION, build_snapshot, load_snapshot, snapshot_path, write_snapshot
+
+
+@pytest.fixture(scope="module")
+def built(tmp_path_factory):
+    path = str(write_csv(2_000, tmp_path_factory.mktemp("snapshot") / "export.csv", seed=7))
+    return path, build_snapshot(path)
+
+
+def _load(path: str, content_hash: str):
+    # load_snapshot is a cached resource; each case reads the file afresh
+    load_snapshot.clear()
+    RESULT_CACHE.clear()
+    return load_snapshot(path, content_hash)
+
+
+def test_a_current_snapshot_loads_and_seeds_the_result_cache(built):
+    path, snapshot = built
+    write_snapshot(snapshot, snapshot_path(path))
+    loaded = _load(path, snapshot.content_hash)
+    assert loaded is not None and loaded.version == SNAPSHOT_VERSION
+    key = selection_key(snapshot.selections, snapshot.content_hash)
+    cached = {cache_key for cache_key, _ in RESULT_CACHE.items()}
+    assert snapshot.results and cached >= {(key, stage) for stage in snapshot.results}
+
+
+@pytest.mark.parametrize("version", [SNAPSHOT_VERSION - 1, SNAPSHOT_VERSION + 1])
+def test_a_snapshot_of_another_version_is_ignored(built, version):
+    path, snapshot = built
+    write_snapshot(replace(snapshot, version=version), snapshot_path(path))
+    assert _load(path, snapshot.content_hash) is None
+    assert RESULT_CACHE.items() == []
+
+
+def test_a_snapshot_of_another_dataset_version_is_ignored(built):
+    path, snapshot = built
+    write_snapshot(snapshot, snapshot_path(path))
+    assert _load(path, "another-content-hash") is None
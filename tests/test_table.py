@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data import APP_COLUMNS, compact_frame, read_dataset
+from src.filters import filtered_positions
+from src.table import TABLE_COLUMNS, csv_chunks, table_positions
+
+SELECTIONS = {"AgeGroup": "All Age Groups", "Demographic": "All", "Topic": [], "rt_range": (2015, 2020), "cap_outliers": False}
+
+
+@pytest.fixture(scope="module")
+def df(dataset_path):
+    return compact_frame(read_dataset(dataset_path, APP_COLUMNS))
+
+
+def _expected(df: pd.DataFrame, query: str, sort_by: str, descending: bool) -> pd.DataFrame:
+    # search and sort the selection's rows the plain pandas way
+    rows = df.take(filtered_positions(df, SELECTIONS))
+    text = rows[TABLE_COLUMNS].astype(str).where(rows[TABLE_COLUMNS].notna(), "")
+    rows = rows[text.apply(lambda col: col.str.contains(query, case=False, regex=False)).any(axis=1)]
+    return rows.sort_values(sort_by, ascending=not descending, kind="stable", na_position="last")
+
+
+@pytest.mark.parametrize("query, sort_by, descending", [
+    ("", "Data_Value", False),
+    ("SMOK", "Data_Value", True),
+    ("female", "LocationDesc", False),
+    ("nothing matches this", "YearStart", True),
+])
+def test_search_and_sort_cover_every_matching_row(df, query, sort_by, descending):
+    positions = table_positions(df, SELECTIONS, query, sort_by, descending)
+    expected = _expected(df, query, sort_by, descending)
+    assert sorted(positions.tolist()) == sorted(expected.index.tolist())
+    np.testing.assert_array_equal(
+        df[sort_by].take(positions).astype(str).to_numpy(), expected[sort_by].astype(str).to_numpy()
+    )
+
+
+def test_csv_download_holds_every_matching_row_once(df):
+    positions = table_positions(df, SELECTIONS, "smok", "YearStart")
+    text = b"".join(csv_chunks(df, positions, TABLE_COLUMNS, chunk_rows=97)).decode()
+    lines = text.splitlines()
+    assert lines[0] == ",".join(TABLE_COLUMNS)
+    assert len(lines) == len(positions) + 1
@@ -0,0 +1,50 @@
+import json
+
+from src import timing
+from src.cache import ResultCache
+from src.timing import finish_trace, span, start_trace
+
+
+def test_spans_nest_and_count_this_threads_cache_lookups():
+    cache = ResultCache(2**20)
+    start_trace(True)
+    with span("outer", rows_in=100) as outer:
+        cache.get_or_compute("key", lambda: "value")
+        with span("inner") as inner:
+            cache.get("key")
+            inner.rows_out = 5
+        outer.rows_out = 10
+    with span("memoized", memoized=True):
+        pass
+    trace = finish_trace("session")
+
+    assert [(r["span"], r["depth"]) for r in trace] == [("outer", 0), ("inner", 1), ("memoized", 0)]
+    outer, inner, memoized = trace
+    assert (outer["rows_in"], outer["rows_out"], inner["rows_out"]) == (100, 10, 5)
+    # the outer span takes in its child's lookups: one miss and then two hits
+    assert (outer["cache_hits"], outer["cache_misses"]) == (1, 1)
+    assert (inner["cache_hits"], inner["cache_misses"]) == (1, 0)
+    # a st.cache_* call that missed nothing was a hit
+    assert (memoized["cache_hits"], memoized["cache_misses"]) == (1, 0)
+    assert inner["start_ms"] >= outer["start_ms"] and outer["ms"] >= inner["ms"]
+
+
+def test_nothing_is_recorded_while_tracing_is_off():
+    start_trace(False)
+    with span("stage", rows_in=3) as s:
+        s.rows_out = 1
+    assert s is span("other") and finish_trace("session") == []
+
+
+def test_each_rerun_appends_its_spans_to_the_trace_log(tmp_path, monkeypatch):
+    log = tmp_path / "trace.jsonl"
+    monkeypatch.setattr(timing, "TRACE_LOG", str(log))
+    for session in ("first", "second"):
+        start_trace(True)
+        with span("render_filters"):
+            pass
+        finish_trace(session)
+
+    records = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [(r["session"], r["span"]) for r in records] == [("first", "render_filters"), ("second", "render_filters")]
+    assert {"ts", "ms", "depth", "cache_hits"} <= set(records[0])